@@ -0,0 +1,284 @@
+"""Admission control.
+
+Two kinds of limits protect the shared LLM endpoint, Neo4j pool and
+event loop from bursts:
+
+* every heavy tool has a concurrency limit and a bounded wait queue
+  (``admit``): a call that finds the queue full is rejected at once with
+  ``Busy`` and a retry delay estimated from the recent service time;
+* the LLM calls of the KGrag instance share a pool of
+  ``LLM_MAX_CONCURRENCY`` slots (``with_llm_priority``) in which answer
+  generation for queries is served before the graph extraction of
+  ingestion and ``extract``, so that bulk work waits instead of queries.
+"""
+
+import asyncio
+import functools
+import inspect
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable
+from metrics import Counter, Gauge, Histogram
+
+INTERACTIVE = 0
+BULK = 1
+
+# Weight of the last call in the moving average of the service time
+SERVICE_TIME_ALPHA = 0.2
+
+ADMISSION_IN_FLIGHT = Gauge(
+    "kgrag_admission_in_flight",
+    "Calls holding a slot of an admission pool.",
+    ("pool",)
+)
+ADMISSION_QUEUE_DEPTH = Gauge(
+    "kgrag_admission_queue_depth",
+    "Calls waiting for a slot of an admission pool.",
+    ("pool",)
+)
+ADMISSION_WAIT = Histogram(
+    "kgrag_admission_wait_seconds",
+    "Time spent waiting for a slot of an admission pool.",
+    ("pool",)
+)
+ADMISSION_REJECTED = Counter(
+    "kgrag_admission_rejected_total",
+    "Calls rejected because the wait queue of a pool was full.",
+    ("pool",)
+)
+
+
+class Busy(Exception):
+    """
+    Raised when a call is rejected because the server is overloaded.
+    """
+
+    def __init__(self, pool: str, retry_after: int):
+        self.pool = pool
+        self.retry_after = retry_after
+        super().__init__(
+            f"Server busy ({pool}): retry after {retry_after}s."
+        )
+
+
+class PriorityLimiter:
+    """
+    Concurrency limit whose waiters are served by priority (lowest
+    first), then in arrival order.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        limit: int,
+        max_waiting: int | None = None
+    ):
+        """
+        Args:
+            name (str): Name of the pool, used as metrics label.
+            limit (int): Calls holding a slot at the same time.
+            max_waiting (int, optional): Calls allowed to wait for a
+                slot; None for no bound.
+        """
+        self.name = name
+        self.limit = max(1, limit)
+        self.max_waiting = max_waiting
+        self.active = 0
+        self._waiters: dict[int, deque[asyncio.Future]] = {}
+        self._waiting = 0
+        self._service_time = 0.0
+
+    @property
+    def waiting(self) -> int:
+        return self._waiting
+
+    def retry_after(self) -> int:
+        """
+        Estimate when a slot should be available, in whole seconds.
+        """
+        rounds = (self._waiting + 1) / self.limit
+        return max(1, math.ceil(self._service_time * rounds))
+
+    def _next_waiter(self) -> asyncio.Future | None:
+        for priority in sorted(self._waiters):
+            queue = self._waiters[priority]
+            while queue:
+                future = queue.popleft()
+                self._waiting -= 1
+                if not future.done():
+                    return future
+            del self._waiters[priority]
+        return None
+
+    def _wake(self) -> None:
+        while self.active < self.limit:
+            future = self._next_waiter()
+            if future is None:
+                return
+            self.active += 1
+            future.set_result(None)
+
+    async def acquire(self, priority: int = INTERACTIVE) -> None:
+        """
+        Take a slot, waiting behind the calls of equal or higher
+        priority.
+        Args:
+            priority (int): ``INTERACTIVE`` or ``BULK``.
+        Raises:
+            Busy: If the wait queue is full.
+        """
+        if self.active < self.limit and not self._waiting:
+            self.active += 1
+            return
+        if self.max_waiting is not None and self._waiting >= self.max_waiting:
+            ADMISSION_REJECTED.inc(pool=self.name)
+            raise Busy(self.name, self.retry_after())
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(priority, deque()).append(future)
+        self._waiting += 1
+        ADMISSION_QUEUE_DEPTH.inc(pool=self.name)
+        started = time.perf_counter()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was granted as the waiter was cancelled
+                self.release()
+            else:
+                self._remove(priority, future)
+            raise
+        finally:
+            ADMISSION_QUEUE_DEPTH.dec(pool=self.name)
+            ADMISSION_WAIT.observe(
+                time.perf_counter() - started,
+                pool=self.name
+            )
+
+    def _remove(self, priority: int, future: asyncio.Future) -> None:
+        queue = self._waiters.get(priority)
+        if queue is not None and future in queue:
+            queue.remove(future)
+            self._waiting -= 1
+
+    def release(self, service_time: float | None = None) -> None:
+        """
+        Give back a slot.
+        Args:
+            service_time (float, optional): How long the slot was held,
+                for the retry delay estimate.
+        """
+        if service_time is not None:
+            self._service_time += SERVICE_TIME_ALPHA * (
+                service_time - self._service_time
+            )
+        self.active -= 1
+        self._wake()
+
+    @asynccontextmanager
+    async def slot(self, priority: int = INTERACTIVE) -> AsyncIterator[None]:
+        """
+        Hold a slot for the enclosed block.
+        Args:
+            priority (int): ``INTERACTIVE`` or ``BULK``.
+        Raises:
+            Busy: If the wait queue is full.
+        """
+        await self.acquire(priority)
+        ADMISSION_IN_FLIGHT.inc(pool=self.name)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            ADMISSION_IN_FLIGHT.dec(pool=self.name)
+            self.release(time.perf_counter() - started)
+
+
+class Admission:
+    """
+    Per-tool limiters, built from the limits of the settings.
+    """
+
+    def __init__(self, limits: dict[str, int], max_waiting: int):
+        """
+        Args:
+            limits (dict[str, int]): Concurrent calls allowed per tool;
+                tools without a limit are not restricted.
+            max_waiting (int): Calls of a tool allowed to wait.
+        """
+        self.limiters = {
+            tool: PriorityLimiter(tool, limit, max_waiting)
+            for tool, limit in limits.items()
+            if limit > 0
+        }
+
+    def admit(self, name: str) -> Callable:
+        """
+        Decorate an async MCP tool to run it within the limit of
+        ``name``, rejecting it with ``Busy`` when the queue is full.
+        Args:
+            name (str): The tool name.
+        Returns:
+            Callable: The decorator.
+        """
+        def decorator(func: Callable) -> Callable:
+            limiter = self.limiters.get(name)
+            if limiter is None:
+                return func
+
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                async with limiter.slot():
+                    return await func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+
+def _with_slot(
+    obj: Any,
+    attr: str,
+    limiter: PriorityLimiter,
+    priority: int
+) -> None:
+    """
+    Replace a method (coroutine function or async generator) of an
+    object with a version holding a slot of ``limiter`` while it runs.
+    """
+    method = getattr(obj, attr, None)
+    if method is None:
+        return
+
+    if inspect.isasyncgenfunction(method):
+        @functools.wraps(method)
+        async def stream(*args, **kwargs):
+            async with limiter.slot(priority):
+                async for item in method(*args, **kwargs):
+                    yield item
+        setattr(obj, attr, stream)
+    else:
+        @functools.wraps(method)
+        async def call(*args, **kwargs):
+            async with limiter.slot(priority):
+                return await method(*args, **kwargs)
+        setattr(obj, attr, call)
+
+
+def with_llm_priority(kgrag: Any, limit: int) -> Any:
+    """
+    Route the LLM calls of a KGrag instance through one pool of ``limit``
+    slots, where answer generation goes before graph extraction.
+    Args:
+        kgrag (Any): The KGrag instance.
+        limit (int): LLM calls in flight; 0 leaves the instance as is.
+    Returns:
+        Any: The same instance.
+    """
+    if limit <= 0:
+        return kgrag
+    limiter = PriorityLimiter("llm", limit)
+    _with_slot(kgrag, "_run", limiter, INTERACTIVE)
+    _with_slot(kgrag, "_stream", limiter, INTERACTIVE)
+    _with_slot(kgrag, "extract_graph_components", limiter, BULK)
+    return kgrag
@@ -0,0 +1,477 @@
+"""Answer cache for the ``query`` tool.
+
+Answers are cached in two tiers: an exact match on the normalized
+prompt and a near-duplicate match on the cosine similarity between
+prompt embeddings. Entries are evicted by size (least recently used) and
+by age, and the whole cache is versioned so that a successful ingestion
+invalidates every answer computed before it.
+
+The semantic tier searches an in-process matrix of the normalized
+embeddings of the current version (``SemanticIndex``) with one matrix
+product. The matrix is rebuilt when the version changes and otherwise
+refreshed at most every ``refresh_seconds`` with the entries stored since
+the last refresh, so a lookup does not read the whole cache from Redis.
+"""
+
+import asyncio
+import hashlib
+import json
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Callable
+from config import settings
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_prompt(prompt: str) -> str:
+    """
+    Normalize a prompt for the exact-match tier.
+    Args:
+        prompt (str): The prompt.
+    Returns:
+        str: The prompt, case folded with collapsed whitespace.
+    """
+    return _WHITESPACE.sub(" ", prompt).strip().casefold()
+
+
+class MemoryAnswerBackend:
+    """
+    In-process LRU storage of cached answers.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        """
+        Args:
+            max_size (int): Maximum number of entries.
+            ttl (float): Time to live of an entry, in seconds.
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self._version = 0
+        self._entries: OrderedDict[str, dict[str, Any]] = OrderedDict()
+
+    def _expired(self, entry: dict[str, Any]) -> bool:
+        return time.time() - entry["created_at"] > self.ttl
+
+    async def version(self) -> int:
+        return self._version
+
+    async def bump(self) -> int:
+        self._version += 1
+        self._entries.clear()
+        return self._version
+
+    async def get(self, key: str) -> dict[str, Any] | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if self._expired(entry):
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    async def put(self, key: str, entry: dict[str, Any]) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    async def keys(self, since: float = 0.0) -> list[str]:
+        return [
+            k for k, e in self._entries.items()
+            if e["created_at"] >= since and not self._expired(e)
+        ]
+
+    async def get_many(self, keys: list[str]) -> list[dict[str, Any] | None]:
+        return [self._entries.get(k) for k in keys]
+
+
+class RedisAnswerBackend:
+    """
+    Redis storage of cached answers, shared by every server process.
+
+    Entries are stored under the current cache version with a TTL, and
+    a sorted set indexed by last access time enforces the LRU size limit.
+    """
+
+    def __init__(
+        self,
+        redis_config: dict[str, Any],
+        max_size: int,
+        ttl: float
+    ):
+        """
+        Args:
+            redis_config (dict): Redis connection parameters.
+            max_size (int): Maximum number of entries.
+            ttl (float): Time to live of an entry, in seconds.
+        """
+        # Imported here: the redis client is only needed by this backend
+        from redis.asyncio import Redis
+        self.redis = Redis(**redis_config, decode_responses=True)
+        self.max_size = max_size
+        self.ttl = int(ttl)
+        self.prefix = f"kgrag:answers:{settings.COLLECTION_NAME}"
+
+    async def version(self) -> int:
+        return int(await self.redis.get(f"{self.prefix}:version") or 0)
+
+    async def bump(self) -> int:
+        return await self.redis.incr(f"{self.prefix}:version")
+
+    async def get(self, key: str) -> dict[str, Any] | None:
+        version = await self.version()
+        data = await self.redis.get(f"{self.prefix}:{version}:{key}")
+        if data is None:
+            return None
+        await self.redis.zadd(
+            f"{self.prefix}:{version}:index",
+            {key: time.time()}
+        )
+        return json.loads(data)
+
+    async def put(self, key: str, entry: dict[str, Any]) -> None:
+        version = await self.version()
+        index = f"{self.prefix}:{version}:index"
+        await self.redis.set(
+            f"{self.prefix}:{version}:{key}",
+            json.dumps(entry),
+            ex=self.ttl
+        )
+        await self.redis.zadd(index, {key: time.time()})
+        await self.redis.expire(index, self.ttl)
+        excess = await self.redis.zcard(index) - self.max_size
+        if excess > 0:
+            evicted = await self.redis.zpopmin(index, excess)
+            await self.redis.delete(
+                *[f"{self.prefix}:{version}:{k}" for k, _ in evicted]
+            )
+
+    async def keys(self, since: float = 0.0) -> list[str]:
+        """
+        Get the keys stored or read since a time, from the LRU index.
+        """
+        version = await self.version()
+        return await self.redis.zrangebyscore(
+            f"{self.prefix}:{version}:index",
+            since,
+            "+inf"
+        )
+
+    async def get_many(self, keys: list[str]) -> list[dict[str, Any] | None]:
+        if not keys:
+            return []
+        version = await self.version()
+        values = await self.redis.mget(
+            [f"{self.prefix}:{version}:{k}" for k in keys]
+        )
+        return [json.loads(v) if v is not None else None for v in values]
+
+
+class SemanticIndex:
+    """
+    Normalized prompt embeddings of one cache version, in a matrix that
+    grows by doubling.
+    """
+
+    def __init__(self, version: int):
+        """
+        Args:
+            version (int): The cache version of the entries.
+        """
+        self.version = version
+        self.refreshed_at = 0.0
+        self.keys: list[str] = []
+        self.positions: dict[str, int] = {}
+        self._matrix: Any = None
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.positions
+
+    def add(self, key: str, embedding: list[float]) -> None:
+        """
+        Add the embedding of an entry, if not indexed yet.
+        """
+        import numpy as np
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if key in self.positions or norm == 0:
+            return
+        if self._matrix is None or self._matrix.shape[1] != len(vector):
+            self._matrix = np.empty((16, len(vector)), dtype=np.float32)
+            self.keys, self.positions = [], {}
+        elif len(self.keys) == len(self._matrix):
+            self._matrix = np.concatenate(
+                [self._matrix, np.empty_like(self._matrix)]
+            )
+        self._matrix[len(self.keys)] = vector / norm
+        self.positions[key] = len(self.keys)
+        self.keys.append(key)
+
+    def remove(self, key: str) -> None:
+        """
+        Remove an entry, moving the last one in its place.
+        """
+        position = self.positions.pop(key, None)
+        if position is None:
+            return
+        last = len(self.keys) - 1
+        if position != last:
+            self._matrix[position] = self._matrix[last]
+            self.keys[position] = self.keys[last]
+            self.positions[self.keys[position]] = position
+        self.keys.pop()
+
+    def search(self, embedding: list[float]) -> tuple[str, float] | None:
+        """
+        Find the entry most similar to an embedding.
+        Returns:
+            tuple | None: The key of the entry and its cosine similarity,
+                or None if the index is empty.
+        """
+        if not self.keys:
+            return None
+        import numpy as np
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if norm == 0 or len(vector) != self._matrix.shape[1]:
+            return None
+        scores = self._matrix[:len(self.keys)] @ (vector / norm)
+        best = int(np.argmax(scores))
+        return self.keys[best], float(scores[best])
+
+
+class AnswerCache:
+    """
+    Two-tier (exact and semantic) cache of query answers.
+    """
+
+    # Maximum age of the semantic index before it reads new entries
+    refresh_seconds: float = 1.0
+
+    def __init__(
+        self,
+        backend: MemoryAnswerBackend | RedisAnswerBackend,
+        embed: Callable[[str], list[float]] | None = None,
+        similarity: float | None = None
+    ):
+        """
+        Initialize the cache.
+        Args:
+            backend: Storage of the cached answers.
+            embed (Callable, optional): Synchronous function embedding a
+                prompt, used by the semantic tier.
+            similarity (float, optional): Minimum cosine similarity of a
+                near-duplicate hit. Defaults to
+                ``settings.ANSWER_CACHE_SIMILARITY``; 0 disables the
+                semantic tier.
+        """
+        self.backend = backend
+        self.embed = embed
+        self.similarity = (
+            settings.ANSWER_CACHE_SIMILARITY
+            if similarity is None
+            else similarity
+        )
+        self.hits_exact = 0
+        self.hits_semantic = 0
+        self.misses = 0
+        # Embeddings of recent misses, reused when the answer is stored
+        self._embeddings: OrderedDict[str, list[float]] = OrderedDict()
+        self._index: SemanticIndex | None = None
+
+    @staticmethod
+    def _key(normalized: str) -> str:
+        return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+    async def _embedding(self, normalized: str) -> list[float] | None:
+        if self.embed is None or self.similarity <= 0:
+            return None
+        embedding = self._embeddings.get(normalized)
+        if embedding is None:
+            embedding = await asyncio.to_thread(self.embed, normalized)
+            self._embeddings[normalized] = embedding
+            while len(self._embeddings) > 256:
+                self._embeddings.popitem(last=False)
+        return embedding
+
+    async def _semantic_index(self) -> SemanticIndex:
+        """
+        Get the semantic index of the current version, reading the
+        entries stored since its last refresh.
+        """
+        version = await self.backend.version()
+        index = self._index
+        now = time.time()
+        if (
+            index is None
+            or index.version != version
+            # Entries evicted by the backend are only dropped on a hit
+            or len(index) > 2 * self.backend.max_size
+        ):
+            index = self._index = SemanticIndex(version)
+            since = 0.0
+        elif now - index.refreshed_at < self.refresh_seconds:
+            return index
+        else:
+            # Overlap the last refresh, for entries stored meanwhile
+            since = index.refreshed_at - self.refresh_seconds
+        index.refreshed_at = now
+
+        keys = [k for k in await self.backend.keys(since) if k not in index]
+        for key, entry in zip(keys, await self.backend.get_many(keys)):
+            if entry is not None and entry.get("embedding"):
+                index.add(key, entry["embedding"])
+        return index
+
+    async def prime(
+        self,
+        prompts: list[str],
+        embed_many: Callable[[list[str]], list[list[float]]]
+    ) -> None:
+        """
+        Embed a batch of prompts in a single call ahead of their lookups,
+        so that the semantic tier of a batch costs one embedding request.
+        Args:
+            prompts (list[str]): The prompts of the batch.
+            embed_many (Callable): Synchronous function embedding a list
+                of texts, such as ``Embeddings.embed_documents``.
+        """
+        if self.embed is None or self.similarity <= 0:
+            return
+        missing = list(dict.fromkeys(
+            n for n in map(normalize_prompt, prompts)
+            if n not in self._embeddings
+        ))
+        if not missing:
+            return
+        embeddings = await asyncio.to_thread(embed_many, missing)
+        self._embeddings.update(zip(missing, embeddings))
+        while len(self._embeddings) > max(256, len(missing)):
+            self._embeddings.popitem(last=False)
+
+    async def get(self, prompt: str) -> str | None:
+        """
+        Look up the answer of a prompt.
+        Args:
+            prompt (str): The prompt.
+        Returns:
+            str | None: The cached answer, or None on a miss.
+        """
+        normalized = normalize_prompt(prompt)
+        entry = await self.backend.get(self._key(normalized))
+        if entry is not None:
+            self.hits_exact += 1
+            return entry["answer"]
+
+        embedding = await self._embedding(normalized)
+        if embedding is not None:
+            index = await self._semantic_index()
+            found = index.search(embedding)
+            if found is not None and found[1] >= self.similarity:
+                entry = await self.backend.get(found[0])
+                if entry is not None:
+                    self.hits_semantic += 1
+                    return entry["answer"]
+                # Expired or evicted since it was indexed
+                index.remove(found[0])
+
+        self.misses += 1
+        return None
+
+    async def version(self) -> int:
+        """
+        Get the current cache version.
+        Returns:
+            int: The version, bumped by every invalidation.
+        """
+        return await self.backend.version()
+
+    async def set(
+        self,
+        prompt: str,
+        answer: str,
+        version: int | None = None
+    ) -> None:
+        """
+        Store the answer of a prompt.
+        Args:
+            prompt (str): The prompt.
+            answer (str): The answer.
+            version (int, optional): Cache version read before the answer
+                was computed. The answer is dropped if the cache was
+                invalidated in the meantime.
+        """
+        normalized = normalize_prompt(prompt)
+        key = self._key(normalized)
+        embedding = await self._embedding(normalized)
+        self._embeddings.pop(normalized, None)
+        current = await self.version()
+        if version is not None and version != current:
+            return
+        await self.backend.put(key, {
+            "prompt": normalized,
+            "answer": answer,
+            "embedding": embedding,
+            "created_at": time.time(),
+        })
+        index = self._index
+        if embedding and index is not None and index.version == current:
+            index.add(key, embedding)
+
+    async def invalidate(self) -> int:
+        """
+        Invalidate every cached answer by moving to a new cache version.
+        Returns:
+            int: The new cache version.
+        """
+        self._index = None
+        return await self.backend.bump()
+
+    def stats(self) -> dict[str, int]:
+        """
+        Get the hit and miss counters of this process.
+        Returns:
+            dict: The counters.
+        """
+        return {
+            "hits_exact": self.hits_exact,
+            "hits_semantic": self.hits_semantic,
+            "misses": self.misses,
+        }
+
+
+def create_answer_cache(
+    redis_config: dict[str, Any],
+    embed: Callable[[str], list[float]] | None = None
+) -> AnswerCache | None:
+    """
+    Create the answer cache described by the settings.
+    Args:
+        redis_config (dict): Redis connection parameters.
+        embed (Callable, optional): Function embedding a prompt.
+    Returns:
+        AnswerCache | None: The cache, or None if disabled.
+    """
+    if not settings.ANSWER_CACHE_ENABLED:
+        return None
+
+    backend: MemoryAnswerBackend | RedisAnswerBackend
+    if settings.ANSWER_CACHE_BACKEND == "redis":
+        backend = RedisAnswerBackend(
+            redis_config,
+            max_size=settings.ANSWER_CACHE_MAX_SIZE,
+            ttl=settings.ANSWER_CACHE_TTL_SECONDS
+        )
+    else:
+        backend = MemoryAnswerBackend(
+            max_size=settings.ANSWER_CACHE_MAX_SIZE,
+            ttl=settings.ANSWER_CACHE_TTL_SECONDS
+        )
+    return AnswerCache(backend, embed=embed)
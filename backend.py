@@ -0,0 +1,255 @@
+"""KGrag backend lifecycle.
+
+The KGrag instance is built lazily, off the event loop, so that the
+ASGI server binds its port immediately. A background warm-up opens the
+Neo4j, Qdrant and Redis connections, loads the sentence model and runs
+a dummy embedding before the first real request pays for it, and a
+readiness report checks every dependency.
+"""
+
+import asyncio
+import os
+import time
+from typing import Any
+from redis.asyncio import Redis
+from admission import with_llm_priority
+from config import settings
+from graph_writer import ensure_graph_schema, with_batched_graph_writes
+from ingestion import start_parse_pool
+from kgrag_config import neo4j_auth, redis_config
+from log import logger
+from metrics import instrument_kgrag
+from retries import with_llm_retries
+
+SUPPORTED_MODEL_TYPES = ("ollama", "openai")
+
+
+def create_kgrag() -> Any:
+    """
+    Build the KGrag instance for the configured ``LLM_MODEL_TYPE``, with
+    the embedding cache in front of its embedding model, batched graph
+    writes and the vector collection sized and tuned. Only the module of
+    the selected backend is imported, and the heavy libraries are loaded
+    here rather than with the server.
+    Returns:
+        Any: The KGrag instance.
+    Raises:
+        RuntimeError: If ``LLM_MODEL_TYPE`` is not supported.
+    """
+    from embedding_cache import with_embedding_cache
+    from vector_collection import configure_collection
+
+    # Created on first use, not when the settings are loaded
+    os.makedirs(settings.PATH_DOWNLOAD, exist_ok=True)
+    if settings.LLM_MODEL_TYPE == "ollama":
+        from kgrag_ollama import create_kgrag_ollama
+        kgrag = create_kgrag_ollama()
+    elif settings.LLM_MODEL_TYPE == "openai":
+        from kgrag_openai import create_kgrag_openai
+        kgrag = create_kgrag_openai()
+    else:
+        raise RuntimeError(
+            "Unsupported LLM_MODEL_TYPE: "
+            + f"{settings.LLM_MODEL_TYPE!r}. Expected 'ollama' or 'openai'."
+        )
+    kgrag = with_batched_graph_writes(
+        with_embedding_cache(kgrag, redis_config)
+    )
+    return configure_collection(kgrag)
+
+
+class Backend:
+    """
+    Lazily built KGrag instance with warm-up and readiness checks.
+    """
+
+    def __init__(self, redis_config: dict[str, Any]):
+        """
+        Args:
+            redis_config (dict): Redis connection parameters, used by
+                the readiness check.
+        Raises:
+            RuntimeError: If ``LLM_MODEL_TYPE`` is not supported.
+        """
+        if settings.LLM_MODEL_TYPE not in SUPPORTED_MODEL_TYPES:
+            raise RuntimeError(
+                "Unsupported LLM_MODEL_TYPE: "
+                + f"{settings.LLM_MODEL_TYPE!r}. "
+                + "Expected 'ollama' or 'openai'."
+            )
+        self.redis = Redis(**redis_config)
+        self._kgrag: Any = None
+        self._lock = asyncio.Lock()
+        self._warm_up_task: asyncio.Task | None = None
+        self._readiness: tuple[float, dict[str, Any]] | None = None
+        self.warm_up_status: dict[str, str] = {}
+
+    @property
+    def kgrag(self) -> Any:
+        """
+        The KGrag instance, once built.
+        Raises:
+            RuntimeError: If the instance is not built yet.
+        """
+        if self._kgrag is None:
+            raise RuntimeError("KGrag backend is not initialized yet.")
+        return self._kgrag
+
+    async def get(self) -> Any:
+        """
+        Get the KGrag instance, building it on first use. The stages
+        of its pipelines are timed by the ``/metrics`` histograms, its
+        LLM calls share the ``LLM_MAX_CONCURRENCY`` slots, generation
+        first, and extraction is retried on transient errors.
+        Returns:
+            Any: The KGrag instance.
+        """
+        if self._kgrag is None:
+            async with self._lock:
+                if self._kgrag is None:
+                    started = time.perf_counter()
+                    kgrag = await asyncio.to_thread(create_kgrag)
+                    self._kgrag = with_llm_retries(with_llm_priority(
+                        instrument_kgrag(kgrag),
+                        settings.LLM_MAX_CONCURRENCY
+                    ))
+                    logger.info(
+                        "KGrag backend initialized in "
+                        f"{time.perf_counter() - started:.2f}s"
+                    )
+        return self._kgrag
+
+    def start_warm_up(self) -> None:
+        """
+        Start the background warm-up, if not already started.
+        """
+        if self._warm_up_task is None:
+            self._warm_up_task = asyncio.create_task(self.warm_up())
+
+    async def stop(self) -> None:
+        """
+        Cancel a warm-up still in progress.
+        """
+        if self._warm_up_task is not None and not self._warm_up_task.done():
+            self._warm_up_task.cancel()
+            await asyncio.gather(self._warm_up_task, return_exceptions=True)
+
+    async def _step(self, name: str, func, *args) -> None:
+        """
+        Run a warm-up step in a worker thread and record its outcome.
+        Args:
+            name (str): Name of the step.
+            func (Callable): Synchronous function to run.
+        """
+        started = time.perf_counter()
+        try:
+            await asyncio.to_thread(func, *args)
+            self.warm_up_status[name] = "ok"
+        except Exception as e:
+            logger.warning(f"Warm-up step {name} failed: {e}")
+            self.warm_up_status[name] = f"error: {e}"
+        logger.info(
+            f"Warm-up step {name}: {self.warm_up_status[name]} "
+            f"({time.perf_counter() - started:.2f}s)"
+        )
+
+    async def warm_up(self) -> None:
+        """
+        Build the backend, open the connection pools, create the graph
+        constraints and indexes, load the sentence model, run a dummy
+        embedding and start the parse pool.
+        """
+        try:
+            kgrag = await self.get()
+            self.warm_up_status["backend"] = "ok"
+        except Exception as e:
+            logger.error(f"KGrag backend initialization failed: {e}")
+            self.warm_up_status["backend"] = f"error: {e}"
+            return
+
+        await self._step("neo4j", kgrag.neo4j_driver.verify_connectivity)
+        await self._step(
+            "graph_schema",
+            ensure_graph_schema,
+            kgrag.neo4j_driver
+        )
+        if neo4j_auth["database"]:
+            # Target of the extract tool with persist
+            await self._step(
+                "graph_schema_database",
+                ensure_graph_schema,
+                kgrag.neo4j_driver,
+                neo4j_auth["database"]
+            )
+        await self._step("qdrant", kgrag.qdrant_client.get_collections)
+        await self._step("sentence_model", self._load_sentence_model, kgrag)
+        await self._step("embedding", kgrag.embed_query, "warm up")
+        await self._step("parse_pool", start_parse_pool)
+
+    @staticmethod
+    def _load_sentence_model(kgrag: Any) -> None:
+        """
+        Load the ``VECTORDB_SENTENCE_MODEL`` and embed a dummy text.
+        Args:
+            kgrag (Any): The KGrag instance.
+        """
+        if kgrag.model_embedding_vs is None:
+            kgrag.model_embedding_vs = kgrag.get_embedding_model_vs()
+        list(kgrag.model_embedding_vs.embed(["warm up"]))
+
+    async def _check(self, coro) -> str:
+        """
+        Await a readiness check with a timeout.
+        Args:
+            coro (Awaitable): The check.
+        Returns:
+            str: ``ok`` or the error.
+        """
+        try:
+            await asyncio.wait_for(coro, settings.READINESS_TIMEOUT_SECONDS)
+            return "ok"
+        except asyncio.TimeoutError:
+            return "error: timeout"
+        except Exception as e:
+            return f"error: {e}"
+
+    async def readiness(self) -> dict[str, Any]:
+        """
+        Check every dependency. The report is cached for
+        ``settings.READINESS_CACHE_SECONDS``.
+        Returns:
+            dict: ``ready`` and the status of each dependency.
+        """
+        now = time.monotonic()
+        if (
+            self._readiness is not None
+            and now - self._readiness[0] < settings.READINESS_CACHE_SECONDS
+        ):
+            return self._readiness[1]
+
+        checks: dict[str, str] = {}
+        if self._kgrag is None:
+            checks["backend"] = self.warm_up_status.get("backend", "starting")
+        else:
+            kgrag = self._kgrag
+            neo4j, qdrant, redis = await asyncio.gather(
+                self._check(asyncio.to_thread(
+                    kgrag.neo4j_driver.verify_connectivity
+                )),
+                self._check(kgrag.qdrant_client_async.get_collections()),
+                self._check(self.redis.ping()),
+            )
+            checks.update(
+                backend="ok",
+                neo4j=neo4j,
+                qdrant=qdrant,
+                redis=redis,
+                embedding=self.warm_up_status.get("embedding", "starting"),
+            )
+
+        report = {
+            "ready": all(v == "ok" for v in checks.values()),
+            "checks": checks,
+        }
+        self._readiness = (now, report)
+        return report
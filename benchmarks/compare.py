@@ -0,0 +1,91 @@
+"""Compare two benchmark reports written by ``benchmarks/run.py``.
+
+Prints the relative change of every tracked metric and exits with status 1
+when one regresses by more than the threshold, so that it can gate a
+deploy:
+
+    python benchmarks/compare.py baseline.json current.json --threshold 0.1
+"""
+
+import argparse
+import json
+import sys
+from typing import Any
+
+# (path in the report, True if higher is better)
+METRICS: list[tuple[str, bool]] = [
+    ("ingestion.docs_per_sec", True),
+    ("ingestion.chunks_per_sec", True),
+    ("query.queries_per_sec", True),
+    ("query.p50_ms", False),
+    ("query.p95_ms", False),
+    ("query.p99_ms", False),
+    ("peak_rss_mb", False),
+    ("startup_seconds", False),
+]
+
+
+def lookup(report: dict[str, Any], path: str) -> float | None:
+    value: Any = report
+    for key in path.split("."):
+        if not isinstance(value, dict) or key not in value:
+            return None
+        value = value[key]
+    return value if isinstance(value, (int, float)) else None
+
+
+def compare(
+    baseline: dict[str, Any],
+    current: dict[str, Any],
+    threshold: float
+) -> list[str]:
+    """
+    Compare two reports.
+    Args:
+        baseline (dict): The reference report.
+        current (dict): The report to check.
+        threshold (float): Tolerated relative regression.
+    Returns:
+        list[str]: The metrics that regressed beyond the threshold.
+    """
+    regressions = []
+    print(f"{'metric':<28}{'baseline':>12}{'current':>12}{'change':>10}")
+    for path, higher_is_better in METRICS:
+        before, after = lookup(baseline, path), lookup(current, path)
+        if before is None or after is None or before == 0:
+            continue
+        change = (after - before) / before
+        worse = -change if higher_is_better else change
+        flag = ""
+        if worse > threshold:
+            regressions.append(path)
+            flag = "  REGRESSION"
+        print(
+            f"{path:<28}{before:>12.3f}{after:>12.3f}{change:>+10.1%}{flag}"
+        )
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compare two benchmark reports."
+    )
+    parser.add_argument("baseline", help="reference JSON report")
+    parser.add_argument("current", help="JSON report to check")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="tolerated relative regression (default: 0.1)"
+    )
+    args = parser.parse_args()
+
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(args.current, encoding="utf-8") as f:
+        current = json.load(f)
+
+    regressions = compare(baseline, current, args.threshold)
+    if regressions:
+        print(f"Regressions: {', '.join(regressions)}")
+        sys.exit(1)
@@ -0,0 +1,503 @@
+"""Offline stand-ins for the KGrag dependencies.
+
+``BenchKGrag`` follows the ingestion and query pipelines of
+``memory_agent.kgrag.MemoryGraph`` (extract with the LLM, write the graph,
+embed every line and upsert to Qdrant; embed the query, search Qdrant,
+expand the graph and generate) on top of local stand-ins: a deterministic
+fake LLM and embedder with configurable latency, Qdrant in local in-memory
+mode and a dictionary graph store behind a Neo4j-like driver.
+"""
+
+import asyncio
+import hashlib
+import re
+import time
+import uuid
+from typing import Any, AsyncGenerator
+import numpy as np
+from langchain_core.documents import Document
+from qdrant_client import QdrantClient, models
+from kgrag_config import collection_config
+
+_ENTITY = re.compile(r"\b[A-Z][a-z]+(?: [A-Z][a-z]+)*\b")
+_TOKEN = re.compile(r"\w+")
+
+
+class FakeLLM:
+    """
+    Deterministic LLM: entities are the capitalized words of the text and
+    consecutive entities of a line are related.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        """
+        Args:
+            latency (float): Simulated latency of a call, in seconds.
+        """
+        self.latency = latency
+        self.calls = 0
+
+    async def extract(self, text: str) -> list[dict[str, Any]]:
+        """
+        Extract graph entries shaped like the structured LLM output.
+        Args:
+            text (str): The text.
+        Returns:
+            list[dict]: ``node``, ``relationship`` and ``target_node``
+                entries.
+        """
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        entries = []
+        for line in text.splitlines():
+            entities = _ENTITY.findall(line)
+            for source, target in zip(entities, entities[1:]):
+                entries.append({
+                    "node": source,
+                    "relationship": "RELATED_TO",
+                    "target_node": [target],
+                })
+        return entries
+
+    async def generate(self, nodes: list[str], edges: list[str]) -> str:
+        """
+        Generate an answer from a graph context.
+        Args:
+            nodes (list[str]): Names of the context nodes.
+            edges (list[str]): Formatted context edges.
+        Returns:
+            str: The answer.
+        """
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        return (
+            f"Answer based on {len(nodes)} nodes and {len(edges)} edges: "
+            + ", ".join(sorted(nodes)[:5])
+        )
+
+
+class FakeEmbeddings:
+    """
+    Deterministic embedder hashing the tokens of a text into a fixed
+    number of dimensions, so that texts sharing words are similar.
+    Mirrors the LangChain ``Embeddings`` interface.
+    """
+
+    def __init__(self, size: int, latency: float = 0.0):
+        """
+        Args:
+            size (int): Dimension of the vectors.
+            latency (float): Simulated latency of a call, in seconds.
+        """
+        self.size = size
+        self.latency = latency
+        self.calls = 0
+
+    def _embed(self, text: str) -> list[float]:
+        vector = np.zeros(self.size, dtype=np.float32)
+        for token in _TOKEN.findall(text.lower()):
+            digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8)
+            value = int.from_bytes(digest.digest(), "little")
+            vector[value % self.size] += 1.0 if value & 1 << 63 else -1.0
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            vector[0] = 1.0
+            norm = 1.0
+        return (vector / norm).tolist()
+
+    def embed_query(self, text: str) -> list[float]:
+        self.calls += 1
+        time.sleep(self.latency)
+        return self._embed(text)
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        self.calls += 1
+        time.sleep(self.latency)
+        return [self._embed(text) for text in texts]
+
+
+class StubGraphStore:
+    """
+    In-memory graph of entities and relationships.
+    """
+
+    def __init__(self):
+        self.nodes: dict[str, str] = {}
+        self.edges: dict[str, list[tuple[str, str]]] = {}
+        # Directed ``(source, type, target)`` ids, as exported
+        self.relationships: list[tuple[str, str, str]] = []
+
+    def add_node(self, node_id: str, name: str) -> None:
+        self.nodes[node_id] = name
+        self.edges.setdefault(node_id, [])
+
+    def add_edge(self, source: str, target: str, type_: str) -> None:
+        if source in self.nodes and target in self.nodes:
+            self.edges[source].append((type_, target))
+            self.edges[target].append((type_, source))
+            self.relationships.append((source, type_, target))
+
+    def delete(self, node_ids: list[str]) -> None:
+        for node_id in node_ids:
+            self.nodes.pop(node_id, None)
+            for _, other in self.edges.pop(node_id, []):
+                self.edges[other] = [
+                    e for e in self.edges.get(other, []) if e[1] != node_id
+                ]
+        deleted = set(node_ids)
+        self.relationships = [
+            r for r in self.relationships
+            if r[0] not in deleted and r[2] not in deleted
+        ]
+
+    def related(self, node_ids: list[str]) -> list[tuple[str, str, str]]:
+        """
+        Get the relationships of the nodes up to two hops.
+        Returns:
+            list[tuple]: ``(source, type, target)`` names.
+        """
+        result = []
+        for node_id in node_ids:
+            for type_, other in self.edges.get(node_id, []):
+                result.append((self.nodes[node_id], type_, self.nodes[other]))
+                for type2, other2 in self.edges.get(other, []):
+                    if other2 != node_id:
+                        result.append(
+                            (self.nodes[other], type2, self.nodes[other2])
+                        )
+        return result
+
+
+class _StubRecord(dict):
+    """
+    Neo4j-like record, read by key or by position.
+    """
+
+    def __getitem__(self, key: str | int) -> Any:
+        if isinstance(key, int):
+            return list(self.values())[key]
+        return super().__getitem__(key)
+
+
+class _StubResult:
+    """
+    Neo4j-like result, with its records and the counters of its summary.
+    """
+
+    def __init__(
+        self,
+        nodes_created: int = 0,
+        relationships_created: int = 0,
+        records: list[dict[str, Any]] | None = None
+    ):
+        self.nodes_created = nodes_created
+        self.relationships_created = relationships_created
+        self.records = [_StubRecord(r) for r in records or []]
+
+    @property
+    def counters(self) -> "_StubResult":
+        return self
+
+    def consume(self) -> "_StubResult":
+        return self
+
+    def single(self) -> _StubRecord | None:
+        return self.records[0] if self.records else None
+
+    def __iter__(self):
+        return iter(self.records)
+
+
+class _StubSession:
+    """
+    Neo4j-like session running the Cypher statements of the pipelines and
+    of the snapshots against a ``StubGraphStore``. It is its own
+    transaction.
+    """
+
+    def __init__(self, driver: "StubGraphDriver"):
+        self.driver = driver
+
+    def __enter__(self) -> "_StubSession":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        return None
+
+    def run(self, query: str, **params: Any) -> _StubResult:
+        graph = self.driver.graph
+        time.sleep(self.driver.latency)
+        rows = params.get("rows", [])
+        if "DETACH DELETE" in query and "LIMIT" in query:
+            ids = list(graph.nodes)[:params["limit"]]
+            graph.delete(ids)
+            return _StubResult(records=[{"deleted": len(ids)}])
+        elif "DETACH DELETE" in query:
+            graph.delete(params.get("ids", []))
+        elif "count(n)" in query:
+            return _StubResult(records=[{"count": len(graph.nodes)}])
+        elif "RETURN n.id AS id, n.name AS name" in query:
+            return _StubResult(records=[
+                {"id": node_id, "name": name}
+                for node_id, name in graph.nodes.items()
+            ])
+        elif "RETURN a.id AS source" in query:
+            return _StubResult(records=[
+                {"source": source, "target": target, "type": type_}
+                for source, type_, target in graph.relationships
+            ])
+        elif "MERGE (n:Entity" in query:
+            created = [
+                {"id": row["id"]} for row in rows
+                if row["id"] not in graph.nodes
+            ]
+            for row in rows:
+                graph.add_node(row["id"], row["name"])
+            return _StubResult(nodes_created=len(created), records=created)
+        elif "UNWIND" in query and "CREATE (n:Entity" in query:
+            for row in rows:
+                graph.add_node(row["id"], row["name"])
+            return _StubResult(nodes_created=len(rows))
+        elif "UNWIND" in query and "(a)-[:RELATIONSHIP" in query:
+            for row in rows:
+                graph.add_edge(row["source"], row["target"], row["type"])
+            return _StubResult(relationships_created=len(rows))
+        elif "CREATE (n:Entity" in query:
+            graph.add_node(params["id"], params["name"])
+        elif "[:RELATIONSHIP" in query:
+            graph.add_edge(
+                params["source_id"],
+                params["target_id"],
+                params["type"]
+            )
+        return _StubResult()
+
+    def execute_write(self, func, *args: Any) -> Any:
+        return func(self, *args)
+
+
+class StubGraphDriver:
+    """
+    Neo4j-like driver over a ``StubGraphStore``.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        """
+        Args:
+            latency (float): Simulated latency of a statement, in seconds.
+        """
+        self.graph = StubGraphStore()
+        self.latency = latency
+
+    def session(self, **kwargs: Any) -> _StubSession:
+        return _StubSession(self)
+
+    def verify_connectivity(self) -> None:
+        return None
+
+    def close(self) -> None:
+        return None
+
+
+class _AsyncQdrant:
+    """
+    Async facade over the local Qdrant client, so that the sync and async
+    clients of ``BenchKGrag`` share the same in-memory storage.
+    """
+
+    def __init__(self, client: QdrantClient):
+        self._client = client
+
+    def __getattr__(self, name: str) -> Any:
+        method = getattr(self._client, name)
+
+        async def call(*args: Any, **kwargs: Any) -> Any:
+            return method(*args, **kwargs)
+
+        return call
+
+
+class BenchKGrag:
+    """
+    KGrag stand-in running the ingestion and query pipelines offline.
+    """
+
+    def __init__(
+        self,
+        llm_latency: float = 0.0,
+        embedding_latency: float = 0.0,
+        graph_latency: float = 0.0
+    ):
+        """
+        Args:
+            llm_latency (float): Latency of an LLM call, in seconds.
+            embedding_latency (float): Latency of an embedding call.
+            graph_latency (float): Latency of a graph statement.
+        """
+        vectors_config = collection_config["vectors_config"]
+        self.collection_name = collection_config["collection_name"]
+        self.collection_dim = vectors_config["size"]
+        self.distance = vectors_config["distance"]
+        self.llm = FakeLLM(llm_latency)
+        self.model_embedding = FakeEmbeddings(
+            self.collection_dim,
+            embedding_latency
+        )
+        self.neo4j_driver = StubGraphDriver(graph_latency)
+        self.qdrant_client = QdrantClient(location=":memory:")
+        self.qdrant_client_async = _AsyncQdrant(self.qdrant_client)
+        self.documents = 0
+
+    def _get_collection_name(self) -> str:
+        return self.collection_name
+
+    def _get_collection_dim(self) -> int:
+        return self.collection_dim
+
+    async def create_collection_async(self, name: str, dim: int) -> bool:
+        if self.qdrant_client.collection_exists(name):
+            return False
+        self.qdrant_client.create_collection(
+            collection_name=name,
+            vectors_config=models.VectorParams(
+                size=dim,
+                distance=self.distance
+            )
+        )
+        return True
+
+    def embed_query(self, query: str) -> list[float]:
+        return self.model_embedding.embed_query(query)
+
+    def embeddings(self, raw_data: str) -> list:
+        return [self.embed_query(p) for p in raw_data.split("\n")]
+
+    async def extract_graph_components(
+        self,
+        raw_data: str
+    ) -> tuple[dict[str, str], list[dict[str, str]]]:
+        nodes: dict[str, str] = {}
+        relationships: list[dict[str, str]] = []
+        for entry in await self.llm.extract(raw_data):
+            node = entry["node"]
+            if node not in nodes:
+                nodes[node] = str(uuid.uuid4())
+            for target in entry["target_node"]:
+                if target not in nodes:
+                    nodes[target] = str(uuid.uuid4())
+                relationships.append({
+                    "source": nodes[node],
+                    "target": nodes[target],
+                    "type": entry["relationship"],
+                })
+        return nodes, relationships
+
+    def ingest_to_neo4j(
+        self,
+        nodes: dict[str, str],
+        relationships: list[dict[str, str]]
+    ) -> dict[str, str]:
+        with self.neo4j_driver.session() as session:
+            for name, node_id in nodes.items():
+                session.run(
+                    "CREATE (n:Entity {id: $id, name: $name})",
+                    id=node_id,
+                    name=name
+                )
+            for relationship in relationships:
+                session.run(
+                    "MATCH (a:Entity {id: $source_id}), "
+                    "(b:Entity {id: $target_id}) "
+                    "CREATE (a)-[:RELATIONSHIP {type: $type}]->(b)",
+                    source_id=relationship["source"],
+                    target_id=relationship["target"],
+                    type=relationship["type"]
+                )
+        return nodes
+
+    async def ingest_to_qdrant(
+        self,
+        raw_data: str,
+        node_id_mapping: dict[str, str],
+        metadata: dict | None = None
+    ) -> None:
+        await self.create_collection_async(
+            self.collection_name,
+            self.collection_dim
+        )
+        vectors = self.embeddings(raw_data)
+        points = [
+            models.PointStruct(
+                id=str(uuid.uuid4()),
+                vector=vector,
+                payload={"id": node_id, **(metadata or {})}
+            )
+            for node_id, vector in zip(node_id_mapping.values(), vectors)
+        ]
+        await self.qdrant_client_async.upsert(
+            collection_name=self.collection_name,
+            points=points
+        )
+
+    async def process_documents(
+        self,
+        documents: list[Document]
+    ) -> AsyncGenerator[str, None]:
+        for document in documents:
+            try:
+                yield "Analyzing raw data for graph components."
+                nodes, relationships = await self.extract_graph_components(
+                    document.page_content
+                )
+                yield "Saving nodes and relationships"
+                mapping = self.ingest_to_neo4j(nodes, relationships)
+                yield "Vectorizing raw data and ingesting data"
+                await self.ingest_to_qdrant(
+                    document.page_content,
+                    mapping,
+                    document.metadata
+                )
+                self.documents += 1
+            except Exception:
+                yield "ERROR"
+
+    def retriever_search(self, query: str, neo4j_driver: Any) -> list[str]:
+        if not self.qdrant_client.collection_exists(self.collection_name):
+            return []
+        result = self.qdrant_client.query_points(
+            collection_name=self.collection_name,
+            query=self.embed_query(query),
+            limit=5,
+            with_payload=["id"]
+        )
+        return [p.payload["id"] for p in result.points if p.payload]
+
+    def _fetch_related_graph(self, entity_ids: list[str]) -> list:
+        time.sleep(self.neo4j_driver.latency)
+        return self.neo4j_driver.graph.related(entity_ids)
+
+    def _get_graph_context(self, query: str) -> dict[str, list[str]]:
+        ids = self.retriever_search(query, self.neo4j_driver)
+        subgraph = self._fetch_related_graph(ids)
+        nodes = sorted({n for s, _, t in subgraph for n in (s, t)})
+        edges = [f"{s} {r} {t}" for s, r, t in subgraph]
+        return {"nodes": nodes, "edges": edges}
+
+    async def _run(self, graph_context: dict, user_query: str) -> str:
+        return await self.llm.generate(
+            graph_context["nodes"],
+            graph_context["edges"]
+        )
+
+    async def _stream(
+        self,
+        graph_context: dict,
+        user_query: str
+    ) -> AsyncGenerator[str, None]:
+        answer = await self._run(graph_context, user_query)
+        for token in re.findall(r"\S+\s*", answer):
+            yield token
+
+    async def query(self, query: str) -> str:
+        graph_context = self._get_graph_context(query)
+        return await self._run(graph_context=graph_context, user_query=query)
@@ -0,0 +1,290 @@
+"""Offline benchmark of the ingestion and query pipelines.
+
+Generates a synthetic CSV corpus, ingests it with ``ingestion.ingest_paths``
+and answers a set of prompts, all against the stand-ins of
+``benchmarks.fakes``, then writes a JSON report with ingestion throughput,
+query latency percentiles, per-stage latency, peak RSS and server startup
+time. Compare two reports with ``benchmarks/compare.py``.
+
+    python benchmarks/run.py --output baseline.json
+"""
+
+import argparse
+import asyncio
+import csv
+import json
+import os
+import platform
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+# Ensure project root is on sys.path BEFORE imports from project
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+# Project imports must follow the sys.path manipulation above
+import numpy as np  # noqa: E402
+from benchmarks.fakes import BenchKGrag  # noqa: E402
+from embedding_cache import CachedEmbeddings  # noqa: E402
+from graph_writer import with_batched_graph_writes  # noqa: E402
+from ingestion import (  # noqa: E402
+    ingest_paths,
+    shutdown_parse_pool,
+    start_parse_pool
+)
+from metrics import STAGE_LATENCY, instrument_kgrag  # noqa: E402
+
+ENTITIES = [
+    "Alice", "Bob", "Carol", "Dave", "Erin", "Frank", "Grace", "Heidi",
+    "Ivan", "Judy", "Mallory", "Niaj", "Olivia", "Peggy", "Rupert",
+    "Sybil", "Trent", "Victor", "Walter", "Acme", "Globex", "Initech",
+    "Umbrella", "Hooli", "Rome", "Paris", "Berlin", "Madrid", "Lisbon",
+    "Vienna",
+]
+VERBS = ["works with", "lives in", "founded", "acquired", "visited", "knows"]
+
+
+def make_corpus(
+    directory: str,
+    files: int,
+    rows: int,
+    seed: int
+) -> list[str]:
+    """
+    Write a deterministic corpus of CSV files, one chunk per row.
+    Args:
+        directory (str): Destination directory.
+        files (int): Number of files.
+        rows (int): Rows per file.
+        seed (int): Random seed.
+    Returns:
+        list[str]: Paths of the files.
+    """
+    rng = random.Random(seed)
+    paths = []
+    for i in range(files):
+        path = os.path.join(directory, f"doc_{i:04d}.csv")
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["id", "text"])
+            for j in range(rows):
+                sentences = [
+                    f"{rng.choice(ENTITIES)} {rng.choice(VERBS)} "
+                    f"{rng.choice(ENTITIES)} and {rng.choice(ENTITIES)}."
+                    for _ in range(3)
+                ]
+                writer.writerow([j, " ".join(sentences)])
+        paths.append(path)
+    return paths
+
+
+def percentiles(samples: list[float]) -> dict[str, float]:
+    """
+    Summarize latency samples.
+    Args:
+        samples (list[float]): Latencies in seconds.
+    Returns:
+        dict: Mean, p50, p95 and p99 in milliseconds.
+    """
+    if not samples:
+        return {}
+    p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+    return {
+        "mean_ms": round(statistics.fmean(samples) * 1000, 3),
+        "p50_ms": round(float(p50) * 1000, 3),
+        "p95_ms": round(float(p95) * 1000, 3),
+        "p99_ms": round(float(p99) * 1000, 3),
+    }
+
+
+def measure_startup(runs: int) -> float | None:
+    """
+    Measure the time to import the server module in a fresh interpreter.
+    Args:
+        runs (int): Number of runs; the median is returned.
+    Returns:
+        float | None: Median startup time in seconds, or None if the
+            server cannot be imported in this environment.
+    """
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, "-c", "import server"],
+            cwd=ROOT,
+            capture_output=True
+        )
+        if result.returncode != 0:
+            return None
+        timings.append(time.perf_counter() - started)
+    return round(statistics.median(timings), 4) if timings else None
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def bench_ingestion(
+    kgrag: BenchKGrag,
+    files: list[str],
+    workers: int
+) -> dict:
+    started = time.perf_counter()
+    failed = 0
+    async for event in ingest_paths(kgrag, files, workers=workers):
+        if event["status"] == "error":
+            failed += 1
+    elapsed = time.perf_counter() - started
+    return {
+        "files": len(files),
+        "chunks": kgrag.documents,
+        "failed": failed,
+        "seconds": round(elapsed, 4),
+        "docs_per_sec": round(len(files) / elapsed, 3),
+        "chunks_per_sec": round(kgrag.documents / elapsed, 3),
+    }
+
+
+async def bench_query(
+    kgrag: BenchKGrag,
+    queries: int,
+    concurrency: int,
+    seed: int
+) -> dict:
+    rng = random.Random(seed + 1)
+    prompts = [
+        f"What is the relation between {rng.choice(ENTITIES)} "
+        f"and {rng.choice(ENTITIES)}?"
+        for _ in range(queries)
+    ]
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+
+    async def run(prompt: str) -> None:
+        async with semaphore:
+            started = time.perf_counter()
+            await kgrag.query(prompt)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(run(p) for p in prompts))
+    elapsed = time.perf_counter() - started
+    return {
+        "queries": queries,
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 4),
+        "queries_per_sec": round(queries / elapsed, 3),
+        **percentiles(latencies),
+    }
+
+
+def stage_latency() -> dict[str, dict[str, float]]:
+    return {
+        key[0]: {
+            "count": count,
+            "mean_ms": round(total / count * 1000, 3),
+        }
+        for key, (count, total) in sorted(STAGE_LATENCY.snapshot().items())
+        if count
+    }
+
+
+async def main(args: argparse.Namespace) -> dict:
+    kgrag = instrument_kgrag(with_batched_graph_writes(BenchKGrag(
+        llm_latency=args.llm_latency,
+        embedding_latency=args.embedding_latency,
+        graph_latency=args.graph_latency
+    )))
+    if args.embedding_cache:
+        # In-process tier only: the benchmark runs without Redis
+        kgrag.model_embedding = CachedEmbeddings(
+            kgrag.model_embedding,
+            model_name="fake"
+        )
+    with tempfile.TemporaryDirectory() as directory:
+        files = make_corpus(directory, args.files, args.rows, args.seed)
+        try:
+            # Measure the steady state, as after the server warm-up
+            await asyncio.to_thread(start_parse_pool)
+            ingestion = await bench_ingestion(kgrag, files, args.workers)
+        finally:
+            shutdown_parse_pool()
+    query = await bench_query(
+        kgrag,
+        args.queries,
+        args.query_concurrency,
+        args.seed
+    )
+    return {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": {
+            k: v for k, v in vars(args).items() if k != "output"
+        },
+        "ingestion": ingestion,
+        "query": query,
+        "stages": stage_latency(),
+        # ru_maxrss is in kilobytes on Linux and bytes on macOS
+        "peak_rss_mb": round(
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            / (1024 * 1024 if sys.platform == "darwin" else 1024),
+            1
+        ),
+        "startup_seconds": measure_startup(args.startup_runs),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Run the offline ingestion and query benchmark."
+    )
+    parser.add_argument("--files", type=int, default=20,
+                        help="files of the synthetic corpus")
+    parser.add_argument("--rows", type=int, default=25,
+                        help="rows (chunks) per file")
+    parser.add_argument("--workers", type=int, default=4,
+                        help="documents ingested concurrently")
+    parser.add_argument("--queries", type=int, default=200,
+                        help="number of queries")
+    parser.add_argument("--query-concurrency", type=int, default=4,
+                        help="queries in flight")
+    parser.add_argument("--llm-latency", type=float, default=0.02,
+                        help="latency of a fake LLM call, in seconds")
+    parser.add_argument("--embedding-latency", type=float, default=0.002,
+                        help="latency of a fake embedding call, in seconds")
+    parser.add_argument("--graph-latency", type=float, default=0.0,
+                        help="latency of a graph statement, in seconds")
+    parser.add_argument("--embedding-cache", action="store_true",
+                        help="put the embedding cache (LRU tier) in front "
+                        "of the fake embedder")
+    parser.add_argument("--startup-runs", type=int, default=3,
+                        help="server imports timed for startup (0 to skip)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default=None,
+                        help="write the JSON report to this file")
+    args = parser.parse_args()
+
+    report = asyncio.run(main(args))
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    print(text)
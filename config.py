@@ -76,53 +76,52 @@ def get_environment() -> Environment:
 
 
 # Load appropriate .env file based on environment
-def load_env_file():
+def load_env_file() -> str | None:
     """
     Load environment-specific .env file.
+    Returns:
+        str | None: The path of the file, None if there is none.
     """
     env = get_environment()
-    print(f"Loading environment: {env}")
     path_env = os.path.dirname(os.path.abspath(__file__))
     env_file = os.path.join(path_env, f".env.{env.value}")
     if os.path.exists(env_file):
         load_dotenv(dotenv_path=env_file)
-        print(f"Loaded environment from {env_file}")
+        return env_file
+    return None
 
 
-def load_env_llm(model: str):
+def load_env_llm(model: str) -> str | None:
     """
     Load environment variables for LLM configuration.
     Args:
         model (str): The LLM model type (e.g., "openai", "ollama").
+    Returns:
+        str | None: The path of the file, None if there is none.
     """
     env = get_environment()
     env_file_llm = f".env.{model}.{env.value}"
-    print(f"Loading LLM environment: {env_file_llm}")
 
     # leggi la cartella corrente del file
     path_env = os.path.dirname(os.path.abspath(__file__))
     env_llm = os.path.join(path_env, env_file_llm)
     if os.path.exists(env_llm):
         load_dotenv(dotenv_path=env_llm)
-        print(f"Loaded LLM environment from {env_llm}")
+        return env_llm
+    return None
 
 
 def get_path_ingestion(collection_name: str) -> str:
     """
-    Get the path for data ingestion.
+    Get the path for data ingestion. The directory is created on first
+    use, not here, so that importing the settings writes nothing.
     Args:
         collection_name (str): The name of the collection.
     Returns:
         str: The path for data ingestion.
     """
     current_path = os.path.dirname(os.path.abspath(__file__))
-    p = os.path.join(current_path, "tmp")
-    if not os.path.exists(p):
-        os.makedirs(p)
-    p = os.path.join(p, collection_name)
-    if not os.path.exists(p):
-        os.makedirs(p)
-    return p
+    return os.path.join(current_path, "tmp", collection_name)
 
 
 # Parse list values from environment variables
@@ -191,7 +190,10 @@ class Settings:
         environment-specific overrides based on the current environment.
         """
         # Set the environment
-        load_env_file()
+        self.ENV_FILES: list[str] = []
+        env_file = load_env_file()
+        if env_file:
+            self.ENV_FILES.append(env_file)
         self.ENVIRONMENT = get_environment()
         self.APP_VERSION = os.getenv("APP_VERSION", "1.0.0")
         self.API_KEY = os.getenv("API_KEY", None)
@@ -201,92 +203,338 @@ class Settings:
         self.AWS_BUCKET_NAME = os.getenv('AWS_BUCKET_NAME')
         self.AWS_REGION = os.getenv('AWS_REGION')
 
+        # S3 settings
+        self.S3_DOWNLOAD_CONCURRENCY = int(
+            os.getenv("S3_DOWNLOAD_CONCURRENCY", 4)
+        )
+        self.S3_MAX_CONCURRENCY = int(os.getenv("S3_MAX_CONCURRENCY", 8))
+        self.S3_MULTIPART_CHUNK_MB = int(os.getenv("S3_MULTIPART_CHUNK_MB", 8))
+
         self.COLLECTION_NAME = os.getenv('COLLECTION_NAME', 'kgrag_data')
-        logger.info(f"Collection Name: {self.COLLECTION_NAME}")
 
         self.PATH_DOWNLOAD = get_path_ingestion(
             f"{self.COLLECTION_NAME}"
         )
-        logger.info(f"Path Download: {self.PATH_DOWNLOAD}")
 
         self.TEMPERATURE = float(os.getenv('TEMPERATURE', 0.5))
-        logger.info(f"Temperature: {self.TEMPERATURE}")
 
         # Neo4j settings
         self.NEO4J_URL = os.getenv('NEO4J_URL', 'neo4j://localhost:7687')
         self.NEO4J_USERNAME = os.getenv('NEO4J_USERNAME', None)
         self.NEO4J_PASSWORD = os.getenv('NEO4J_PASSWORD', None)
         self.NEO4J_DB_NAME = os.getenv('NEO4J_DB_NAME', None)
-        logger.info(f"Neo4j URL: {self.NEO4J_URL}")
-        logger.info(f"Neo4j Username: {self.NEO4J_USERNAME}")
-        if self.NEO4J_DB_NAME:
-            logger.info(f"Neo4j DB Name: {self.NEO4J_DB_NAME}")
+        self.NEO4J_WRITE_BATCH_SIZE = int(
+            os.getenv("NEO4J_WRITE_BATCH_SIZE", 1000)
+        )
 
         # Redis settings
         self.REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
         self.REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
         self.REDIS_PORT = os.getenv("REDIS_PORT", 6379)
         self.REDIS_DB = os.getenv("REDIS_DB", 4)
-        logger.info(f"Redis URL: {self.REDIS_URL}")
-        logger.info(f"Redis Host: {self.REDIS_HOST}")
-        logger.info(f"Redis Port: {self.REDIS_PORT}")
-        logger.info(f"Redis DB: {self.REDIS_DB}")
 
         self.QDRANT_URL = os.getenv('QDRANT_URL', 'http://localhost:6333')
-        logger.info(f"Qdrant URL: {self.QDRANT_URL}")
+
+        # Vector collection settings
+        # 0 detects the size from the embedding model at startup
+        self.COLLECTION_DIMENSION = int(os.getenv("COLLECTION_DIMENSION", 0))
+        self.COLLECTION_DISTANCE = os.getenv("COLLECTION_DISTANCE", "Cosine")
+        self.COLLECTION_ON_DISK = os.getenv(
+            "COLLECTION_ON_DISK",
+            "false"
+        ).lower() in ("1", "true", "yes")
+        self.COLLECTION_ON_DISK_PAYLOAD = os.getenv(
+            "COLLECTION_ON_DISK_PAYLOAD",
+            "false"
+        ).lower() in ("1", "true", "yes")
+        self.COLLECTION_QUANTIZATION = os.getenv(
+            "COLLECTION_QUANTIZATION",
+            "none"
+        ).lower()
+        self.COLLECTION_QUANTIZATION_ALWAYS_RAM = os.getenv(
+            "COLLECTION_QUANTIZATION_ALWAYS_RAM",
+            "true"
+        ).lower() in ("1", "true", "yes")
+        self.COLLECTION_QUANTIZATION_RESCORE = os.getenv(
+            "COLLECTION_QUANTIZATION_RESCORE",
+            "true"
+        ).lower() in ("1", "true", "yes")
+        self.COLLECTION_QUANTIZATION_OVERSAMPLING = float(
+            os.getenv("COLLECTION_QUANTIZATION_OVERSAMPLING", 2.0)
+        )
+        self.COLLECTION_HNSW_M = int(os.getenv("COLLECTION_HNSW_M", 16))
+        self.COLLECTION_HNSW_EF_CONSTRUCT = int(
+            os.getenv("COLLECTION_HNSW_EF_CONSTRUCT", 100)
+        )
+        # 0 leaves the search beam to Qdrant (ef_construct)
+        self.COLLECTION_HNSW_EF = int(os.getenv("COLLECTION_HNSW_EF", 0))
 
         self.LOKI_URL = os.getenv(
             'LOKI_URL',
             'http://localhost:3100/loki/api/v1/push'
         )
-        logger.info(f"Loki URL: {self.LOKI_URL}")
 
         self.LLM_MODEL_TYPE = os.getenv('LLM_MODEL_TYPE', 'openai')
-        load_env_llm(self.LLM_MODEL_TYPE)
-        logger.info(f"LLM Model Type: {self.LLM_MODEL_TYPE}")
+        env_file = load_env_llm(self.LLM_MODEL_TYPE)
+        if env_file:
+            self.ENV_FILES.append(env_file)
         self.LLM_MODEL_NAME = os.getenv('LLM_MODEL_NAME', 'gpt-4.1-mini')
-        logger.info(f"LLM Model Name: {self.LLM_MODEL_NAME}")
         self.LLM_EMBEDDING_URL = os.getenv(
             "LLM_EMBEDDING_URL",
             None
         )
-        if self.LLM_EMBEDDING_URL:
-            logger.info(f"LLM Embedding URL: {self.LLM_EMBEDDING_URL}")
         self.MODEL_EMBEDDING = os.getenv(
             "MODEL_EMBEDDING",
             "text-embedding-3-small"
         )
-        logger.info(f"Model Embedding: {self.MODEL_EMBEDDING}")
         # LLM settings
         self.LLM_URL = os.getenv("LLM_URL", None)
-        if self.LLM_URL:
-            logger.info(f"LLM URL: {self.LLM_URL}")
 
         self.VECTORDB_SENTENCE_MODEL = os.getenv(
             "VECTORDB_SENTENCE_MODEL",
             "BAAI/bge-small-en-v1.5"
         )
-        logger.info(f"VectorDB Sentence Model: {self.VECTORDB_SENTENCE_MODEL}")
         self.VECTORDB_SENTENCE_TYPE = os.getenv(
             "VECTORDB_SENTENCE_TYPE",
             "hf"
         )
-        logger.info(f"VectorDB Sentence Type: {self.VECTORDB_SENTENCE_TYPE}")
         self.VECTORDB_SENTENCE_PATH = os.getenv("VECTORDB_SENTENCE_PATH", None)
-        if self.VECTORDB_SENTENCE_PATH:
-            logger.info(
-                f"VectorDB Sentence Path: {self.VECTORDB_SENTENCE_PATH}"
-            )
 
         self.MCP_ORIGIN = os.getenv(
             "MCP_ORIGIN",
             "https://caribou-modest-fully.ngrok-free.app"
         )
-        logger.info(f"MCP Origin: {self.MCP_ORIGIN}")
+
+        # Transport settings
+        self.MCP_TRANSPORT = os.getenv("MCP_TRANSPORT", "all").lower()
+        self.MCP_STATELESS_HTTP = os.getenv(
+            "MCP_STATELESS_HTTP",
+            "true"
+        ).lower() in ("1", "true", "yes")
+        # Read by uvicorn as the default of --workers
+        self.WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", 1))
+
+        # Ingestion settings
+        self.INGESTION_WORKERS = int(os.getenv("INGESTION_WORKERS", 4))
+        # Processes parsing and chunking documents, 0 to use a thread
+        self.PARSE_WORKERS = int(
+            os.getenv("PARSE_WORKERS", os.cpu_count() or 1)
+        )
+        self.JOB_WORKERS = int(os.getenv("JOB_WORKERS", 2))
+        self.JOB_RETENTION_SECONDS = int(
+            os.getenv("JOB_RETENTION_SECONDS", 7 * 24 * 3600)
+        )
+        self.JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", 30))
+
+        # Graph extraction settings
+        self.EXTRACT_CHUNK_SIZE = int(os.getenv("EXTRACT_CHUNK_SIZE", 4000))
+        self.EXTRACT_CHUNK_OVERLAP = int(
+            os.getenv("EXTRACT_CHUNK_OVERLAP", 200)
+        )
+        self.EXTRACT_CONCURRENCY = int(os.getenv("EXTRACT_CONCURRENCY", 4))
+
+        # Batch tools settings
+        self.BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", 4))
+        self.BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", 100))
+
+        # Query settings
+        self.QUERY_STREAM = os.getenv(
+            "QUERY_STREAM",
+            "true"
+        ).lower() in ("1", "true", "yes")
+
+        # Retrieval settings
+        self.RETRIEVE_TOP_K = int(os.getenv("RETRIEVE_TOP_K", 5))
+        self.RETRIEVE_MAX_TOKENS = int(os.getenv("RETRIEVE_MAX_TOKENS", 2000))
+        self.RETRIEVE_MAX_FACTS = int(os.getenv("RETRIEVE_MAX_FACTS", 100))
+        # Characters of a chunk stored with its vectors at ingestion
+        self.RETRIEVE_EXCERPT_CHARS = int(
+            os.getenv("RETRIEVE_EXCERPT_CHARS", 1000)
+        )
+
+        # Admission control settings
+        # Concurrent calls per tool, overridden with ADMISSION_LIMIT_<TOOL>
+        # (0 removes the limit)
+        self.ADMISSION_LIMITS = {
+            "query": 32,
+            "query_many": 4,
+            "retrieve": 64,
+            "extract": 8,
+            "extract_many": 2,
+            "ingestion": 2,
+            "snapshot": 1,
+        }
+        for tool, values in parse_dict_of_lists_from_env(
+            "ADMISSION_LIMIT_"
+        ).items():
+            self.ADMISSION_LIMITS[tool] = int(values[0])
+        self.ADMISSION_QUEUE_SIZE = int(os.getenv("ADMISSION_QUEUE_SIZE", 64))
+        self.LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 8))
+
+        # LLM retry settings
+        self.LLM_RETRY_ATTEMPTS = int(os.getenv("LLM_RETRY_ATTEMPTS", 4))
+        self.LLM_RETRY_BASE_SECONDS = float(
+            os.getenv("LLM_RETRY_BASE_SECONDS", 1)
+        )
+        self.LLM_RETRY_MAX_SECONDS = float(
+            os.getenv("LLM_RETRY_MAX_SECONDS", 30)
+        )
+
+        # Readiness settings
+        self.READINESS_CACHE_SECONDS = float(
+            os.getenv("READINESS_CACHE_SECONDS", 5)
+        )
+        self.READINESS_TIMEOUT_SECONDS = float(
+            os.getenv("READINESS_TIMEOUT_SECONDS", 2)
+        )
+
+        # Snapshot settings
+        self.SNAPSHOT_PATH = os.getenv(
+            "SNAPSHOT_PATH",
+            os.path.join(
+                os.path.dirname(os.path.abspath(__file__)),
+                "snapshots"
+            )
+        )
+
+        # Tracing settings
+        self.TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "none").lower()
+        self.TRACE_FILE = os.getenv("TRACE_FILE", "traces.jsonl")
+        self.TRACE_OTLP_ENDPOINT = os.getenv(
+            "TRACE_OTLP_ENDPOINT",
+            "http://localhost:4318/v1/traces"
+        )
+        self.TRACE_SAMPLE_RATIO = float(os.getenv("TRACE_SAMPLE_RATIO", 1))
+
+        # Startup settings
+        self.STARTUP_BUDGET_SECONDS = float(
+            os.getenv("STARTUP_BUDGET_SECONDS", 2)
+        )
+
+        # Answer cache settings
+        self.ANSWER_CACHE_ENABLED = os.getenv(
+            "ANSWER_CACHE_ENABLED",
+            "true"
+        ).lower() in ("1", "true", "yes")
+        # The workers and replicas of a deployment must share the cache
+        # for an ingestion to invalidate it everywhere: only a single
+        # development process keeps it in memory
+        self.ANSWER_CACHE_BACKEND = os.getenv(
+            "ANSWER_CACHE_BACKEND",
+            "memory"
+            if self.ENVIRONMENT in (Environment.DEVELOPMENT, Environment.TEST)
+            and self.WEB_CONCURRENCY == 1
+            else "redis"
+        ).lower()
+        self.ANSWER_CACHE_MAX_SIZE = int(
+            os.getenv("ANSWER_CACHE_MAX_SIZE", 1024)
+        )
+        self.ANSWER_CACHE_TTL_SECONDS = float(
+            os.getenv("ANSWER_CACHE_TTL_SECONDS", 3600)
+        )
+        self.ANSWER_CACHE_SIMILARITY = float(
+            os.getenv("ANSWER_CACHE_SIMILARITY", 0.95)
+        )
+
+        # Embedding cache settings
+        self.EMBEDDING_CACHE_BACKEND = os.getenv(
+            "EMBEDDING_CACHE_BACKEND",
+            "redis"
+        ).lower()
+        self.EMBEDDING_CACHE_MAX_SIZE = int(
+            os.getenv("EMBEDDING_CACHE_MAX_SIZE", 10000)
+        )
+        self.EMBEDDING_CACHE_TTL_SECONDS = int(
+            os.getenv("EMBEDDING_CACHE_TTL_SECONDS", 30 * 24 * 3600)
+        )
 
         # Apply environment-specific settings
         self.apply_environment_settings()
 
+    def log_summary(self) -> None:
+        """
+        Log the effective settings, once per process at startup (see the
+        lifespan of ``server``), rather than whenever the module is
+        imported.
+        """
+        logger.info(f"Environment: {self.ENVIRONMENT.value}")
+        for env_file in self.ENV_FILES:
+            logger.info(f"Loaded environment from {env_file}")
+        logger.info(f"S3 Download Concurrency: {self.S3_DOWNLOAD_CONCURRENCY}")
+        logger.info(f"S3 Max Concurrency: {self.S3_MAX_CONCURRENCY}")
+        logger.info(f"S3 Multipart Chunk MB: {self.S3_MULTIPART_CHUNK_MB}")
+        logger.info(f"Collection Name: {self.COLLECTION_NAME}")
+        logger.info(f"Path Download: {self.PATH_DOWNLOAD}")
+        logger.info(f"Temperature: {self.TEMPERATURE}")
+        logger.info(f"Neo4j URL: {self.NEO4J_URL}")
+        logger.info(f"Neo4j Username: {self.NEO4J_USERNAME}")
+        if self.NEO4J_DB_NAME:
+            logger.info(f"Neo4j DB Name: {self.NEO4J_DB_NAME}")
+        logger.info(f"Neo4j Write Batch Size: {self.NEO4J_WRITE_BATCH_SIZE}")
+        logger.info(f"Redis URL: {self.REDIS_URL}")
+        logger.info(f"Redis Host: {self.REDIS_HOST}")
+        logger.info(f"Redis Port: {self.REDIS_PORT}")
+        logger.info(f"Redis DB: {self.REDIS_DB}")
+        logger.info(f"Qdrant URL: {self.QDRANT_URL}")
+        logger.info(
+            "Collection Dimension: "
+            f"{self.COLLECTION_DIMENSION or 'auto'}"
+        )
+        logger.info(f"Collection Distance: {self.COLLECTION_DISTANCE}")
+        logger.info(
+            f"Collection On Disk: vectors={self.COLLECTION_ON_DISK}, "
+            f"payload={self.COLLECTION_ON_DISK_PAYLOAD}"
+        )
+        logger.info(
+            f"Collection Quantization: {self.COLLECTION_QUANTIZATION}"
+        )
+        logger.info(
+            f"Collection HNSW: m={self.COLLECTION_HNSW_M}, "
+            f"ef_construct={self.COLLECTION_HNSW_EF_CONSTRUCT}, "
+            f"ef={self.COLLECTION_HNSW_EF or 'default'}"
+        )
+        logger.info(f"Loki URL: {self.LOKI_URL}")
+        logger.info(f"LLM Model Type: {self.LLM_MODEL_TYPE}")
+        logger.info(f"LLM Model Name: {self.LLM_MODEL_NAME}")
+        if self.LLM_EMBEDDING_URL:
+            logger.info(f"LLM Embedding URL: {self.LLM_EMBEDDING_URL}")
+        logger.info(f"Model Embedding: {self.MODEL_EMBEDDING}")
+        if self.LLM_URL:
+            logger.info(f"LLM URL: {self.LLM_URL}")
+        logger.info(f"VectorDB Sentence Model: {self.VECTORDB_SENTENCE_MODEL}")
+        logger.info(f"VectorDB Sentence Type: {self.VECTORDB_SENTENCE_TYPE}")
+        if self.VECTORDB_SENTENCE_PATH:
+            logger.info(
+                f"VectorDB Sentence Path: {self.VECTORDB_SENTENCE_PATH}"
+            )
+        logger.info(f"MCP Origin: {self.MCP_ORIGIN}")
+        logger.info(f"MCP Transport: {self.MCP_TRANSPORT}")
+        logger.info(f"MCP Stateless HTTP: {self.MCP_STATELESS_HTTP}")
+        logger.info(f"Web Concurrency: {self.WEB_CONCURRENCY}")
+        logger.info(f"Ingestion Workers: {self.INGESTION_WORKERS}")
+        logger.info(f"Parse Workers: {self.PARSE_WORKERS}")
+        logger.info(f"Job Workers: {self.JOB_WORKERS}")
+        logger.info(f"Job Retention Seconds: {self.JOB_RETENTION_SECONDS}")
+        logger.info(f"Extract Chunk Size: {self.EXTRACT_CHUNK_SIZE}")
+        logger.info(f"Extract Concurrency: {self.EXTRACT_CONCURRENCY}")
+        logger.info(f"Batch Concurrency: {self.BATCH_CONCURRENCY}")
+        logger.info(f"Query Stream: {self.QUERY_STREAM}")
+        logger.info(f"Retrieve Top K: {self.RETRIEVE_TOP_K}")
+        logger.info(f"Retrieve Max Tokens: {self.RETRIEVE_MAX_TOKENS}")
+        logger.info(f"Retrieve Excerpt Chars: {self.RETRIEVE_EXCERPT_CHARS}")
+        logger.info(f"Admission Limits: {self.ADMISSION_LIMITS}")
+        logger.info(f"Admission Queue Size: {self.ADMISSION_QUEUE_SIZE}")
+        logger.info(f"LLM Max Concurrency: {self.LLM_MAX_CONCURRENCY}")
+        logger.info(f"LLM Retry Attempts: {self.LLM_RETRY_ATTEMPTS}")
+        logger.info(f"Snapshot Path: {self.SNAPSHOT_PATH}")
+        logger.info(f"Trace Exporter: {self.TRACE_EXPORTER}")
+        logger.info(f"Trace Sample Ratio: {self.TRACE_SAMPLE_RATIO}")
+        logger.info(f"Answer Cache Enabled: {self.ANSWER_CACHE_ENABLED}")
+        logger.info(f"Answer Cache Backend: {self.ANSWER_CACHE_BACKEND}")
+        logger.info(
+            f"Embedding Cache Backend: {self.EMBEDDING_CACHE_BACKEND}"
+        )
+
     def apply_environment_settings(self):
         """
         Apply environment-specific settings based
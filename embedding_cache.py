@@ -0,0 +1,251 @@
+"""Content-addressed embedding cache.
+
+Embeddings are keyed by the embedding model name and the SHA-256 of the
+text, and cached in two tiers: an in-process LRU and Redis, where vectors
+are stored as packed float32. The cache wraps the LangChain embedding
+model of the KGrag instance, so ingestion (``KGrag.embeddings``), query
+(``KGrag.embed_query``) and the answer cache all go through it.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from redis import Redis
+from redis.exceptions import RedisError
+from config import settings
+from log import logger
+from metrics import Counter
+
+EMBEDDING_CACHE_REQUESTS = Counter(
+    "kgrag_embedding_cache_requests_total",
+    "Embedding cache lookups by result.",
+    ("result",)
+)
+
+
+def pack_vector(vector: list[float]) -> bytes:
+    """
+    Pack a vector as float32 bytes.
+    Args:
+        vector (list[float]): The vector.
+    Returns:
+        bytes: The packed vector.
+    """
+    return np.asarray(vector, dtype=np.float32).tobytes()
+
+
+def unpack_vector(data: bytes) -> list[float]:
+    """
+    Unpack a vector packed by ``pack_vector``.
+    Args:
+        data (bytes): The packed vector.
+    Returns:
+        list[float]: The vector.
+    """
+    return np.frombuffer(data, dtype=np.float32).tolist()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    LangChain embedding model with an LRU and a Redis cache in front.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        model_name: str,
+        redis_config: dict[str, Any] | None = None,
+        max_size: int | None = None,
+        ttl: int | None = None
+    ):
+        """
+        Args:
+            embeddings (Embeddings): The wrapped embedding model.
+            model_name (str): Name of the model, part of the cache key.
+            redis_config (dict, optional): Redis connection parameters of
+                the persistent tier. None keeps the LRU tier only.
+            max_size (int, optional): Entries of the LRU tier. Defaults
+                to ``settings.EMBEDDING_CACHE_MAX_SIZE``.
+            ttl (int, optional): Time to live of a Redis entry in
+                seconds, 0 for none. Defaults to
+                ``settings.EMBEDDING_CACHE_TTL_SECONDS``.
+        """
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.max_size = max_size or settings.EMBEDDING_CACHE_MAX_SIZE
+        self.ttl = settings.EMBEDDING_CACHE_TTL_SECONDS if ttl is None else ttl
+        self.redis = (
+            Redis(
+                **redis_config,
+                socket_timeout=0.5,
+                socket_connect_timeout=0.5
+            )
+            if redis_config is not None
+            else None
+        )
+        self._lru: OrderedDict[str, list[float]] = OrderedDict()
+        self._lock = threading.Lock()
+        # After a Redis error the persistent tier is skipped for a while,
+        # so that an unreachable Redis does not slow down every call
+        self._redis_retry_at = 0.0
+
+    def __getattr__(self, name: str) -> Any:
+        # Expose the attributes of the wrapped model (e.g. ``model``)
+        embeddings = self.__dict__.get("embeddings")
+        if embeddings is None:
+            raise AttributeError(name)
+        return getattr(embeddings, name)
+
+    def _key(self, text: str) -> str:
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return f"kgrag:emb:{self.model_name}:{digest}"
+
+    def _lru_get(self, key: str) -> list[float] | None:
+        with self._lock:
+            vector = self._lru.get(key)
+            if vector is not None:
+                self._lru.move_to_end(key)
+            return vector
+
+    def _lru_put(self, key: str, vector: list[float]) -> None:
+        with self._lock:
+            self._lru[key] = vector
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.max_size:
+                self._lru.popitem(last=False)
+
+    def _redis_available(self) -> bool:
+        return (
+            self.redis is not None
+            and time.monotonic() >= self._redis_retry_at
+        )
+
+    def _redis_failed(self, e: Exception) -> None:
+        logger.warning(f"Embedding cache unavailable: {e}")
+        self._redis_retry_at = time.monotonic() + 30
+
+    def _redis_get(self, keys: list[str]) -> list[bytes | None]:
+        if not keys or not self._redis_available():
+            return [None] * len(keys)
+        try:
+            return self.redis.mget(keys)
+        except RedisError as e:
+            self._redis_failed(e)
+            return [None] * len(keys)
+
+    def _redis_put(self, items: dict[str, list[float]]) -> None:
+        if not items or not self._redis_available():
+            return
+        try:
+            pipeline = self.redis.pipeline(transaction=False)
+            for key, vector in items.items():
+                pipeline.set(key, pack_vector(vector), ex=self.ttl or None)
+            pipeline.execute()
+        except RedisError as e:
+            self._redis_failed(e)
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        """
+        Embed texts, computing only the ones missing from the cache in a
+        single call of the wrapped model.
+        Args:
+            texts (list[str]): The texts.
+        Returns:
+            list[list[float]]: The embeddings, in input order.
+        """
+        keys = [self._key(text) for text in texts]
+        vectors: dict[str, list[float]] = {}
+        for key in keys:
+            vector = self._lru_get(key)
+            if vector is not None:
+                vectors[key] = vector
+                EMBEDDING_CACHE_REQUESTS.inc(result="memory_hit")
+
+        missing = list(dict.fromkeys(k for k in keys if k not in vectors))
+        for key, data in zip(missing, self._redis_get(missing)):
+            if data is not None:
+                vectors[key] = unpack_vector(data)
+                self._lru_put(key, vectors[key])
+                EMBEDDING_CACHE_REQUESTS.inc(result="redis_hit")
+
+        pending = {
+            key: text
+            for key, text in zip(keys, texts)
+            if key not in vectors
+        }
+        if pending:
+            EMBEDDING_CACHE_REQUESTS.inc(len(pending), result="miss")
+            computed = dict(zip(
+                pending,
+                self.embeddings.embed_documents(list(pending.values()))
+            ))
+            for key, vector in computed.items():
+                self._lru_put(key, vector)
+            self._redis_put(computed)
+            vectors.update(computed)
+
+        return [vectors[key] for key in keys]
+
+    def embed_query(self, text: str) -> list[float]:
+        """
+        Embed a query.
+        Args:
+            text (str): The query.
+        Returns:
+            list[float]: The embedding.
+        """
+        key = self._key(text)
+        vector = self._lru_get(key)
+        if vector is not None:
+            EMBEDDING_CACHE_REQUESTS.inc(result="memory_hit")
+            return vector
+
+        data = self._redis_get([key])[0]
+        if data is not None:
+            EMBEDDING_CACHE_REQUESTS.inc(result="redis_hit")
+            vector = unpack_vector(data)
+        else:
+            EMBEDDING_CACHE_REQUESTS.inc(result="miss")
+            vector = self.embeddings.embed_query(text)
+            self._redis_put({key: vector})
+        self._lru_put(key, vector)
+        return vector
+
+
+def with_embedding_cache(
+    kgrag: Any,
+    redis_config: dict[str, Any]
+) -> Any:
+    """
+    Put the embedding cache in front of the embedding model of a KGrag
+    instance, as configured by the settings.
+    Args:
+        kgrag (Any): The KGrag instance.
+        redis_config (dict): Redis connection parameters.
+    Returns:
+        Any: The same instance.
+    """
+    if settings.EMBEDDING_CACHE_BACKEND == "none":
+        return kgrag
+    model = kgrag.model_embedding
+    model_name = (
+        getattr(model, "model", None) or settings.MODEL_EMBEDDING
+    )
+    kgrag.model_embedding = CachedEmbeddings(
+        model,
+        model_name=model_name,
+        redis_config=(
+            redis_config
+            if settings.EMBEDDING_CACHE_BACKEND == "redis"
+            else None
+        )
+    )
+    logger.info(
+        f"Embedding cache enabled for {model_name} "
+        f"({settings.EMBEDDING_CACHE_BACKEND})"
+    )
+    return kgrag
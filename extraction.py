@@ -0,0 +1,175 @@
+"""Chunked graph extraction.
+
+Large inputs are split into overlapping chunks that are sent to the LLM
+concurrently, and the partial graphs are merged back into one: nodes are
+deduplicated by normalized name and relationships collapsed on
+(source, target, type). The indexes of the chunks the LLM failed on are
+returned with the graph, so a partial graph is never mistaken for a
+complete one.
+"""
+
+import asyncio
+import re
+from typing import Any
+from config import settings
+from log import logger
+from tracing import current_span, span
+
+Nodes = dict[str, str]
+Relationships = list[dict[str, str]]
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_name(name: str) -> str:
+    """
+    Normalize a node name for deduplication.
+    Args:
+        name (str): The node name.
+    Returns:
+        str: The name, case folded with collapsed whitespace.
+    """
+    return _WHITESPACE.sub(" ", name).strip().casefold()
+
+
+def split_text(
+    text: str,
+    chunk_size: int | None = None,
+    overlap: int | None = None
+) -> list[str]:
+    """
+    Split a text into overlapping chunks.
+    Args:
+        text (str): The text to split.
+        chunk_size (int, optional): Maximum chunk size in characters.
+            Defaults to ``settings.EXTRACT_CHUNK_SIZE``.
+        overlap (int, optional): Characters shared by consecutive
+            chunks. Defaults to ``settings.EXTRACT_CHUNK_OVERLAP``.
+    Returns:
+        list[str]: The chunks.
+    """
+    chunk_size = chunk_size or settings.EXTRACT_CHUNK_SIZE
+    if overlap is None:
+        overlap = settings.EXTRACT_CHUNK_OVERLAP
+    if len(text) <= chunk_size:
+        return [text]
+
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=min(overlap, chunk_size // 2)
+    )
+    return splitter.split_text(text)
+
+
+def merge_components(
+    parts: list[tuple[Nodes, Relationships]]
+) -> tuple[Nodes, Relationships]:
+    """
+    Merge the graphs extracted from several chunks.
+    Args:
+        parts (list): ``(nodes, relationships)`` pairs as returned by
+            ``KGrag.extract_graph_components``.
+    Returns:
+        tuple: The merged nodes (name -> id) and relationships. The
+            first spelling and id seen for a node are kept.
+    """
+    nodes: Nodes = {}
+    ids_by_name: dict[str, str] = {}
+    relationships: Relationships = []
+    seen: set[tuple[str, str, str]] = set()
+
+    for part_nodes, part_relationships in parts:
+        remap: dict[str, str] = {}
+        for name, node_id in part_nodes.items():
+            key = normalize_name(name)
+            if key not in ids_by_name:
+                ids_by_name[key] = node_id
+                nodes[name] = node_id
+            remap[node_id] = ids_by_name[key]
+
+        for relationship in part_relationships:
+            source = remap.get(relationship["source"], relationship["source"])
+            target = remap.get(relationship["target"], relationship["target"])
+            edge = (source, target, normalize_name(relationship["type"]))
+            if edge in seen:
+                continue
+            seen.add(edge)
+            relationships.append({
+                "source": source,
+                "target": target,
+                "type": relationship["type"]
+            })
+
+    return nodes, relationships
+
+
+async def extract_graph(
+    kgrag: Any,
+    text: str,
+    concurrency: int | None = None,
+    chunk_size: int | None = None,
+    overlap: int | None = None
+) -> tuple[Nodes, Relationships, list[int]]:
+    """
+    Extract graph components from a text of any size.
+
+    Chunks are extracted concurrently, at most ``concurrency`` at a
+    time. A chunk the LLM fails on is logged, skipped and reported in
+    the result; an error is raised only if every chunk fails.
+    Args:
+        kgrag (Any): The KGrag instance.
+        text (str): The text to extract the graph from.
+        concurrency (int, optional): Maximum number of concurrent LLM
+            calls. Defaults to ``settings.EXTRACT_CONCURRENCY``.
+        chunk_size (int, optional): Maximum chunk size in characters.
+        overlap (int, optional): Characters shared by consecutive chunks.
+    Returns:
+        tuple: The merged nodes (name -> id), the relationships and the
+            0-based indexes of the chunks that failed.
+    """
+    chunks = split_text(text, chunk_size=chunk_size, overlap=overlap)
+    with span("extract_graph", chars=len(text), chunks=len(chunks)):
+        return await _extract_chunks(kgrag, chunks, concurrency)
+
+
+async def _extract_chunks(
+    kgrag: Any,
+    chunks: list[str],
+    concurrency: int | None
+) -> tuple[Nodes, Relationships, list[int]]:
+    if len(chunks) == 1:
+        nodes, relationships = await kgrag.extract_graph_components(
+            chunks[0]
+        )
+        return nodes, relationships, []
+
+    semaphore = asyncio.Semaphore(concurrency or settings.EXTRACT_CONCURRENCY)
+
+    async def extract_chunk(chunk: str) -> tuple[Nodes, Relationships]:
+        async with semaphore:
+            return await kgrag.extract_graph_components(chunk)
+
+    results = await asyncio.gather(
+        *(extract_chunk(chunk) for chunk in chunks),
+        return_exceptions=True
+    )
+
+    parts = []
+    failed: list[int] = []
+    errors: list[BaseException] = []
+    for index, result in enumerate(results):
+        if isinstance(result, BaseException):
+            logger.warning(
+                f"Graph extraction failed on chunk {index + 1}/"
+                f"{len(chunks)}: {result}"
+            )
+            failed.append(index)
+            errors.append(result)
+        else:
+            parts.append(result)
+    current_span().set_attributes(failed_chunks=len(failed))
+
+    if not parts:
+        raise errors[0]
+    return (*merge_components(parts), failed)
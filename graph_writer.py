@@ -0,0 +1,273 @@
+"""Batched graph writes.
+
+``KGrag.ingest_to_neo4j`` runs one ``CREATE`` per node and one
+``MATCH ... CREATE`` per relationship, a round-trip each. ``write_graph``
+sends them as ``UNWIND ... MERGE`` statements instead, one transaction
+per batch of ``NEO4J_WRITE_BATCH_SIZE`` rows, and ``ensure_graph_schema``
+creates the constraint and index that the ``MERGE`` lookups rely on.
+``load_graph`` bulk loads rows into an empty graph with ``UNWIND ...
+CREATE`` (see ``snapshot``).
+
+The ids of the entities created by ``ingest_to_neo4j``, not those merged
+into entities that already existed, are appended to the list held by
+``written_entities``, if any, as each batch commits, so that ingestion
+can undo the graph writes of a chunk whose vectors were never stored.
+"""
+
+import itertools
+import time
+from contextvars import ContextVar
+from typing import Any, Iterable, Iterator
+from config import settings
+from log import logger
+from tracing import current_span
+
+# Ids of the entities created in the current context, see ingestion
+written_entities: ContextVar[list[str] | None] = ContextVar(
+    "kgrag_written_entities",
+    default=None
+)
+
+# Statements run once at startup; the uniqueness constraint also backs
+# the lookups of entities by id
+GRAPH_SCHEMA: tuple[str, ...] = (
+    "CREATE CONSTRAINT entity_id IF NOT EXISTS "
+    "FOR (n:Entity) REQUIRE n.id IS UNIQUE",
+    "CREATE INDEX entity_name IF NOT EXISTS "
+    "FOR (n:Entity) ON (n.name)",
+)
+
+# Returns the ids of the entities created, not of those merged into
+MERGE_NODES = (
+    "UNWIND $rows AS row "
+    "MERGE (n:Entity {id: row.id}) "
+    "ON CREATE SET n._created = true "
+    "SET n.name = row.name "
+    "WITH n WHERE n._created "
+    "REMOVE n._created "
+    "RETURN n.id AS id"
+)
+MERGE_RELATIONSHIPS = (
+    "UNWIND $rows AS row "
+    "MATCH (a:Entity {id: row.source}) "
+    "MATCH (b:Entity {id: row.target}) "
+    "MERGE (a)-[:RELATIONSHIP {type: row.type}]->(b)"
+)
+CREATE_NODES = (
+    "UNWIND $rows AS row "
+    "CREATE (n:Entity {id: row.id, name: row.name})"
+)
+CREATE_RELATIONSHIPS = (
+    "UNWIND $rows AS row "
+    "MATCH (a:Entity {id: row.source}) "
+    "MATCH (b:Entity {id: row.target}) "
+    "CREATE (a)-[:RELATIONSHIP {type: row.type}]->(b)"
+)
+DELETE_NODES = (
+    "MATCH (n:Entity) "
+    "WITH n LIMIT $limit "
+    "DETACH DELETE n "
+    "RETURN count(*) AS deleted"
+)
+
+
+def ensure_graph_schema(driver: Any, database: str | None = None) -> None:
+    """
+    Create the constraints and indexes of the graph, if missing.
+    Args:
+        driver (Driver): The Neo4j driver.
+        database (str, optional): The database, None for the default.
+    """
+    with driver.session(database=database) as session:
+        for statement in GRAPH_SCHEMA:
+            session.run(statement).consume()
+    logger.info(
+        f"Graph schema ready on {database or 'the default database'}"
+    )
+
+
+def _batches(rows: Iterable[dict], size: int) -> Iterator[list[dict]]:
+    rows = iter(rows)
+    while batch := list(itertools.islice(rows, size)):
+        yield batch
+
+
+def _run_batch(
+    tx: Any,
+    query: str,
+    rows: list[dict]
+) -> tuple[int, int, list[str]]:
+    result = tx.run(query, rows=rows)
+    created = [record["id"] for record in result]
+    counters = result.consume().counters
+    return counters.nodes_created, counters.relationships_created, created
+
+
+def _write(
+    driver: Any,
+    statements: Iterable[tuple[str, Iterable[dict]]],
+    database: str | None,
+    size: int,
+    created: list[str] | None = None
+) -> dict[str, Any]:
+    """
+    Run statements on their rows in batches, one transaction per batch,
+    adding the ids returned by a committed batch to ``created``.
+    """
+    created_nodes = created_relationships = transactions = 0
+    with driver.session(database=database) as session:
+        for query, rows in statements:
+            for batch in _batches(rows, size):
+                n, r, ids = session.execute_write(_run_batch, query, batch)
+                if created is not None:
+                    created.extend(ids)
+                created_nodes += n
+                created_relationships += r
+                transactions += 1
+    return {
+        "nodes": created_nodes,
+        "relationships": created_relationships,
+        "transactions": transactions,
+    }
+
+
+def write_graph(
+    driver: Any,
+    nodes: dict[str, str],
+    relationships: list[dict[str, str]],
+    database: str | None = None,
+    batch_size: int | None = None,
+    created: list[str] | None = None
+) -> dict[str, Any]:
+    """
+    Write graph components to Neo4j with batched ``UNWIND ... MERGE``
+    statements, one transaction per batch. Nodes are written before the
+    relationships that reference them.
+    Args:
+        driver (Driver): The Neo4j driver.
+        nodes (dict[str, str]): Node names and ids.
+        relationships (list[dict[str, str]]): Relationships with
+            ``source``, ``target`` and ``type``.
+        database (str, optional): The database, None for the default.
+        batch_size (int, optional): Rows per transaction. Defaults to
+            ``settings.NEO4J_WRITE_BATCH_SIZE``.
+        created (list[str], optional): Receives the ids of the entities
+            created, not merged, as their batch commits.
+    Returns:
+        dict: Created ``nodes`` and ``relationships``, the number of
+            ``transactions`` and the duration in ``seconds``.
+    """
+    started = time.perf_counter()
+    size = batch_size or settings.NEO4J_WRITE_BATCH_SIZE
+    node_rows = [{"id": i, "name": name} for name, i in nodes.items()]
+    relationship_rows = [
+        {
+            "source": r["source"],
+            "target": r["target"],
+            "type": r["type"]
+        }
+        for r in relationships
+    ]
+
+    stats = _write(
+        driver,
+        ((MERGE_NODES, node_rows), (MERGE_RELATIONSHIPS, relationship_rows)),
+        database,
+        size,
+        created
+    )
+    current_span().set_attributes(
+        batch_size=size,
+        node_rows=len(node_rows),
+        relationship_rows=len(relationship_rows),
+        transactions=stats["transactions"]
+    )
+    stats["seconds"] = round(time.perf_counter() - started, 4)
+    return stats
+
+
+def load_graph(
+    driver: Any,
+    nodes: Iterable[dict[str, str]],
+    relationships: Iterable[dict[str, str]],
+    database: str | None = None,
+    batch_size: int | None = None
+) -> dict[str, Any]:
+    """
+    Bulk load an exported graph with ``UNWIND ... CREATE`` statements,
+    one transaction per batch. Entities are created without the lookup
+    of ``MERGE``, so the graph is expected to be empty (see
+    ``clear_graph``).
+    Args:
+        driver (Driver): The Neo4j driver.
+        nodes (Iterable[dict]): Nodes with ``id`` and ``name``, read
+            lazily.
+        relationships (Iterable[dict]): Relationships with ``source``,
+            ``target`` and ``type``, read lazily after the nodes.
+        database (str, optional): The database, None for the default.
+        batch_size (int, optional): Rows per transaction. Defaults to
+            ``settings.NEO4J_WRITE_BATCH_SIZE``.
+    Returns:
+        dict: Created ``nodes`` and ``relationships`` and the number of
+            ``transactions``.
+    """
+    return _write(
+        driver,
+        ((CREATE_NODES, nodes), (CREATE_RELATIONSHIPS, relationships)),
+        database,
+        batch_size or settings.NEO4J_WRITE_BATCH_SIZE
+    )
+
+
+def clear_graph(
+    driver: Any,
+    database: str | None = None,
+    batch_size: int | None = None
+) -> int:
+    """
+    Delete every entity and its relationships, in batches so that a
+    large graph does not need one huge transaction.
+    Args:
+        driver (Driver): The Neo4j driver.
+        database (str, optional): The database, None for the default.
+        batch_size (int, optional): Entities per transaction. Defaults
+            to ``settings.NEO4J_WRITE_BATCH_SIZE``.
+    Returns:
+        int: The number of deleted entities.
+    """
+    limit = batch_size or settings.NEO4J_WRITE_BATCH_SIZE
+    deleted = 0
+    with driver.session(database=database) as session:
+        while True:
+            count = session.execute_write(
+                lambda tx: tx.run(DELETE_NODES, limit=limit).single()[0]
+            )
+            deleted += count
+            if count < limit:
+                return deleted
+
+
+def with_batched_graph_writes(kgrag: Any) -> Any:
+    """
+    Replace ``KGrag.ingest_to_neo4j`` with ``write_graph``. Writes go to
+    the default database of the driver, where the KGrag retriever reads
+    the graph from.
+    Args:
+        kgrag (Any): The KGrag instance.
+    Returns:
+        Any: The same instance.
+    """
+    def ingest_to_neo4j(
+        nodes: dict[str, str],
+        relationships: list[dict[str, str]]
+    ) -> dict[str, str]:
+        write_graph(
+            kgrag.neo4j_driver,
+            nodes,
+            relationships,
+            created=written_entities.get()
+        )
+        return nodes
+
+    kgrag.ingest_to_neo4j = ingest_to_neo4j
+    return kgrag
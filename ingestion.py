@@ -0,0 +1,682 @@
+"""Batch ingestion helpers.
+
+This module expands a file, directory or glob pattern into the list of
+documents to ingest and fans them out across a bounded pool of asyncio
+workers, so that documents overlap on LLM and embedding round-trips
+instead of running one after the other. Documents are ingested chunk by
+chunk against the ``manifest`` so that unchanged content is never sent
+through the LLM again, and checkpointed there after every chunk so that an
+interrupted ingestion resumes where it stopped. ``s3://`` paths are
+expanded into objects that are downloaded ahead of the workers (see
+``s3``).
+"""
+
+import asyncio
+import glob
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, AsyncGenerator, Iterable
+from config import settings
+from graph_writer import written_entities
+from log import logger
+from manifest import IngestionManifest
+from metrics import STAGE_ERRORS, STAGE_LATENCY
+from parsing import parse_document, preload, read_chunks
+from s3 import S3Object, download_object, is_s3_uri, list_objects
+from tracing import current_span, span
+
+_parse_pool: ProcessPoolExecutor | None = None
+_parse_pool_lock = threading.Lock()
+
+
+def collect_files(path: str) -> list[str | S3Object]:
+    """
+    Expand a path into the sorted list of files to ingest. S3 paths are
+    listed from the bucket, so call it off the event loop.
+    Args:
+        path (str): A file path, a directory (walked recursively), a
+            glob pattern such as ``/data/**/*.pdf`` or the same forms
+            on S3 (``s3://bucket/key``, ``s3://bucket/prefix/``,
+            ``s3://bucket/**/*.pdf``).
+    Returns:
+        list[str | S3Object]: Absolute paths of the files, or the S3
+            objects, to ingest. Files found through a directory or a
+            glob are kept if a loader handles them; an explicit
+            file path is always returned so that unsupported formats
+            surface as an error.
+    """
+    # Loaded on first use, like the document libraries behind it
+    from loaders import is_supported
+
+    if is_s3_uri(path):
+        return list_objects(path, is_supported)
+
+    if os.path.isfile(path):
+        return [os.path.abspath(path)]
+
+    if glob.has_magic(path):
+        candidates = glob.glob(path, recursive=True)
+    elif os.path.isdir(path):
+        candidates = [
+            os.path.join(root, name)
+            for root, _, names in os.walk(path)
+            for name in names
+        ]
+    else:
+        return []
+
+    return sorted(
+        os.path.abspath(p)
+        for p in candidates
+        if os.path.isfile(p)
+        and is_supported(p)
+    )
+
+
+def get_parse_pool() -> ProcessPoolExecutor | None:
+    """
+    Get the process pool that parses documents, started on first use.
+    Returns:
+        ProcessPoolExecutor | None: The pool, or None if
+            ``PARSE_WORKERS`` is 0 and documents are parsed in a thread.
+    """
+    global _parse_pool
+    if settings.PARSE_WORKERS <= 0:
+        return None
+    with _parse_pool_lock:
+        if _parse_pool is None:
+            # Forking the server would copy its threads and connections
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context(
+                "forkserver" if "forkserver" in methods else "spawn"
+            )
+            _parse_pool = ProcessPoolExecutor(
+                max_workers=settings.PARSE_WORKERS,
+                mp_context=context
+            )
+            logger.info(
+                f"Parse pool started with {settings.PARSE_WORKERS} workers"
+            )
+        return _parse_pool
+
+
+def start_parse_pool() -> None:
+    """
+    Start the processes of the parse pool and load the document
+    libraries in them (in this process if documents are parsed in a
+    thread), so that the first ingestion does not pay for them.
+    """
+    pool = get_parse_pool()
+    if pool is None:
+        preload()
+    else:
+        list(pool.map(preload, range(settings.PARSE_WORKERS)))
+
+
+def shutdown_parse_pool() -> None:
+    """
+    Stop the parse pool, if started.
+    """
+    global _parse_pool
+    with _parse_pool_lock:
+        if _parse_pool is not None:
+            _parse_pool.shutdown(cancel_futures=True)
+            _parse_pool = None
+
+
+async def parse(path: str) -> tuple[str, list[str], str]:
+    """
+    Hash, load and chunk a document off the event loop, in the parse
+    pool (or the default thread pool if there is none), and time the
+    ``parse`` and ``chunk`` stages.
+    Args:
+        path (str): Path of the document.
+    Returns:
+        tuple: The content hash of the document, the hashes of its
+            chunks and the spill file holding them (see
+            ``parsing.read_chunks``), to be deleted by the caller.
+    """
+    global _parse_pool
+    pool = get_parse_pool()
+    loop = asyncio.get_running_loop()
+    try:
+        sha256, chunks, spill, timings = await loop.run_in_executor(
+            pool,
+            parse_document,
+            path,
+            settings.EXTRACT_CHUNK_SIZE
+        )
+    except BrokenProcessPool:
+        # A worker died (e.g. out of memory): start a new pool on the
+        # next document
+        with _parse_pool_lock:
+            if _parse_pool is pool:
+                _parse_pool = None
+        STAGE_ERRORS.inc(stage="parse")
+        raise
+    except Exception:
+        STAGE_ERRORS.inc(stage="parse")
+        raise
+    for name, seconds in timings.items():
+        STAGE_LATENCY.observe(seconds, stage=name)
+    # The parse pool runs out of the trace: report its timings on the
+    # span of the document
+    current_span().set_attributes(
+        chunks=len(chunks),
+        **{f"{name}_seconds": round(s, 4) for name, s in timings.items()}
+    )
+    return sha256, chunks, spill
+
+
+def _delete_entities(neo4j_driver: Any, entity_ids: list[str]) -> None:
+    """
+    Delete graph entities and their relationships from Neo4j.
+    Args:
+        neo4j_driver (Driver): The Neo4j driver.
+        entity_ids (list[str]): Ids of the entities to delete.
+    """
+    with neo4j_driver.session() as session:
+        session.run(
+            "MATCH (e:Entity) WHERE e.id IN $ids DETACH DELETE e",
+            ids=entity_ids
+        )
+
+
+def _chunk_filter(
+    chunk_hashes: list[str],
+    document: str,
+    local_path: str | None
+) -> Any:
+    """
+    Build the Qdrant filter of the points of some chunks of a document,
+    see ``purge_chunks``.
+    """
+    # qdrant_client is slow to import and only needed on updates
+    from qdrant_client import models
+
+    return models.Filter(must=[
+        models.FieldCondition(
+            key="chunk_hash",
+            match=models.MatchAny(any=chunk_hashes)
+        ),
+        models.Filter(should=[
+            models.FieldCondition(
+                key="document",
+                match=models.MatchValue(value=document)
+            ),
+            models.Filter(must=[
+                models.IsEmptyCondition(
+                    is_empty=models.PayloadField(key="document")
+                ),
+                models.FieldCondition(
+                    key="local_path",
+                    match=models.MatchValue(value=local_path or document)
+                ),
+            ]),
+        ]),
+    ])
+
+
+async def purge_chunks(
+    kgrag: Any,
+    chunk_hashes: Iterable[str],
+    document: str,
+    local_path: str | None = None
+) -> int:
+    """
+    Remove the vectors and graph entities written for a set of chunks of
+    a document.
+
+    Every Qdrant point carries the ``chunk_hash`` of the chunk it was
+    built from, the ``document`` it belongs to and the ``id`` of a Neo4j
+    entity, so the entities are collected from the points before both
+    are deleted. The purge is scoped to the document, so another
+    document with an identical chunk keeps its points and entities.
+    Points written before ``document`` was recorded are matched by
+    ``local_path``.
+    Args:
+        kgrag (Any): The KGrag instance.
+        chunk_hashes (Iterable[str]): Hashes of the chunks to remove.
+        document (str): Manifest key of the document (local path or S3
+            URI).
+        local_path (str, optional): Path the document was read from.
+            Defaults to ``document``.
+    Returns:
+        int: Number of graph entities deleted.
+    """
+    hashes = list(chunk_hashes)
+    if not hashes:
+        return 0
+
+    from qdrant_client import models
+
+    collection_name = settings.COLLECTION_NAME
+    chunk_filter = _chunk_filter(hashes, document, local_path)
+
+    entity_ids: set[str] = set()
+    offset = None
+    while True:
+        points, offset = await kgrag.qdrant_client_async.scroll(
+            collection_name=collection_name,
+            scroll_filter=chunk_filter,
+            limit=256,
+            offset=offset,
+            with_payload=["id"],
+            with_vectors=False
+        )
+        entity_ids.update(
+            p.payload["id"] for p in points if p.payload and "id" in p.payload
+        )
+        if offset is None:
+            break
+
+    if entity_ids:
+        await asyncio.to_thread(
+            _delete_entities,
+            kgrag.neo4j_driver,
+            list(entity_ids)
+        )
+    await kgrag.qdrant_client_async.delete(
+        collection_name=collection_name,
+        points_selector=models.FilterSelector(filter=chunk_filter)
+    )
+    return len(entity_ids)
+
+
+async def undo_chunk(
+    kgrag: Any,
+    chunk_hash: str,
+    entity_ids: list[str],
+    document: str,
+    local_path: str | None = None
+) -> None:
+    """
+    Remove what an interrupted ingestion wrote for a chunk: the graph
+    entities it created, recorded in its checkpoint, which may have no
+    vector yet, and the vectors already stored for it. The entities it
+    merged into, which existed before, are kept.
+    Args:
+        kgrag (Any): The KGrag instance.
+        chunk_hash (str): Hash of the chunk.
+        entity_ids (list[str]): Ids of the entities created for it.
+        document (str): Manifest key of the document.
+        local_path (str, optional): Path the document was read from.
+    """
+    from qdrant_client import models
+
+    if entity_ids:
+        await asyncio.to_thread(
+            _delete_entities,
+            kgrag.neo4j_driver,
+            entity_ids
+        )
+    client = kgrag.qdrant_client_async
+    if await client.collection_exists(settings.COLLECTION_NAME):
+        await client.delete(
+            collection_name=settings.COLLECTION_NAME,
+            points_selector=models.FilterSelector(
+                filter=_chunk_filter([chunk_hash], document, local_path)
+            )
+        )
+
+
+def _remove_file(path: str) -> None:
+    """
+    Delete a temporary file (a spill file or a downloaded S3 object),
+    ignoring a file already gone.
+    """
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logger.warning(f"Error removing {path}: {e}")
+
+
+async def ingest_file(
+    kgrag: Any,
+    path: str,
+    manifest: IngestionManifest | None = None,
+    force: bool = False,
+    key: str | None = None,
+    etag: str = ""
+) -> AsyncGenerator[str, None]:
+    """
+    Ingest a single document, yielding the progress messages
+    emitted by the KGrag pipeline.
+
+    The document is split into chunks (pages or records) that are
+    hashed individually, and read back one at a time from the spill file
+    of the parse pool. Only chunks missing from the manifest entry
+    are sent through the pipeline, and chunks that disappeared from the
+    document are purged from Neo4j and Qdrant.
+
+    Progress is checkpointed in the manifest after every chunk, and
+    when the graph of a chunk is written, before its vectors. A new
+    attempt first undoes the chunk that was in flight, then resumes
+    after the committed chunks of the same content, also when
+    ``force`` is set.
+    Args:
+        kgrag (Any): The KGrag instance used for ingestion.
+        path (str): Path of the document to ingest.
+        manifest (IngestionManifest, optional): Manifest of the
+            documents already ingested.
+        force (bool): Reprocess every chunk of the document.
+        key (str, optional): Manifest key of the document, e.g. the
+            URI of the S3 object it was downloaded from. Defaults to
+            ``path``.
+        etag (str): ETag of the S3 object, recorded in the manifest.
+    Raises:
+        RuntimeError: If the KGrag pipeline reports an error.
+    """
+    key = key or path
+    stat = os.stat(path)
+    sha256, chunks, spill = await parse(path)
+    try:
+        async for message in _ingest_chunks(
+            kgrag, path, key, sha256, chunks, spill, manifest, force
+        ):
+            yield message
+    finally:
+        _remove_file(spill)
+
+    if manifest:
+        await manifest.save(
+            key,
+            sha256,
+            stat.st_size,
+            stat.st_mtime,
+            chunks,
+            etag=etag
+        )
+
+
+async def _ingest_chunks(
+    kgrag: Any,
+    path: str,
+    key: str,
+    sha256: str,
+    chunks: list[str],
+    spill: str,
+    manifest: IngestionManifest | None,
+    force: bool
+) -> AsyncGenerator[str, None]:
+    """
+    Send the changed chunks of a parsed document through the KGrag
+    pipeline, read back one at a time from its spill file, with the
+    checkpoints described in ``ingest_file``.
+    """
+    from langchain_core.documents import Document
+
+    entry = await manifest.get(key) if manifest else None
+    previous: set[str] = set(entry["chunks"]) if entry else set()
+    checkpoint = entry.get("checkpoint") if entry else None
+
+    if checkpoint and checkpoint.get("pending"):
+        yield "Undoing the interrupted chunk of the last attempt"
+        await undo_chunk(
+            kgrag,
+            checkpoint["pending"],
+            checkpoint.get("entities", []),
+            key,
+            path
+        )
+
+    # An interrupted ingestion of the same content resumes, even forced
+    resuming = checkpoint is not None and checkpoint.get("sha256") == sha256
+    stale = previous - set(chunks) if resuming or not force else previous
+    committed = previous - stale
+    skipped = frozenset(committed)
+    pending = sum(1 for chunk_hash in chunks if chunk_hash not in skipped)
+    attempt = checkpoint.get("attempt", 1) + 1 if resuming else 1
+
+    current_span().set_attributes(
+        pending_chunks=pending,
+        stale_chunks=len(stale),
+        attempt=attempt
+    )
+    if stale:
+        yield f"Removing {len(stale)} outdated chunks"
+        await purge_chunks(kgrag, stale, key, path)
+
+    async def save_checkpoint(
+        chunk_hash: str | None = None,
+        entities: list[str] | None = None
+    ) -> None:
+        if manifest:
+            await manifest.checkpoint(key, sorted(committed), {
+                "sha256": sha256,
+                "attempt": attempt,
+                "parsed": len(chunks),
+                "committed": len(committed),
+                "pending": chunk_hash,
+                "entities": entities or [],
+            })
+
+    if resuming and committed:
+        yield (
+            f"Resuming after {len(committed)}/{len(chunks)} committed "
+            f"chunks (attempt {attempt})"
+        )
+    yield f"Ingesting {pending}/{len(chunks)} changed chunks"
+    reader = read_chunks(spill)
+    written: list[str] = []
+    chunk_hash: str | None = None
+    try:
+        while parsed := await asyncio.to_thread(next, reader, None):
+            text, metadata = parsed
+            if metadata["chunk_hash"] in skipped:
+                continue
+            # The document key scopes purges to this document
+            metadata = {**metadata, "document": key}
+            if settings.RETRIEVE_EXCERPT_CHARS > 0:
+                # Returned by retrieve along with the source of the chunk
+                metadata["text"] = text[:settings.RETRIEVE_EXCERPT_CHARS]
+            doc = Document(page_content=text, metadata=metadata)
+            chunk_hash = metadata["chunk_hash"]
+            # Filled by the graph writer, checkpointed before the vectors
+            # are stored
+            written = []
+            written_entities.set(written)
+            saved = 0
+            with span(
+                "process_documents",
+                chunk_chars=len(doc.page_content)
+            ):
+                async for d in kgrag.process_documents(documents=[doc]):
+                    if d == "ERROR":
+                        raise RuntimeError(
+                            f"Error processing document {path}."
+                        )
+                    if len(written) > saved:
+                        await save_checkpoint(chunk_hash, written)
+                        saved = len(written)
+                    yield f"{d}"
+            committed.add(chunk_hash)
+            chunk_hash, written = None, []
+            await save_checkpoint()
+    except BaseException:
+        if manifest:
+            # Record the writes of the failed chunk, undone by the next
+            # attempt before it resumes
+            await save_checkpoint(chunk_hash, written)
+        raise
+    finally:
+        written_entities.set(None)
+        reader.close()
+
+
+def _event(
+    status: str,
+    path: str,
+    index: int,
+    total: int,
+    message: str = ""
+) -> dict[str, Any]:
+    """
+    Build a progress event for a file of the batch.
+    Args:
+        status (str): One of ``started``, ``progress``, ``skipped``,
+            ``done`` or ``error``.
+        path (str): Path of the file the event refers to.
+        index (int): 1-based position of the file in the batch.
+        total (int): Number of files in the batch.
+        message (str): Human readable detail.
+    Returns:
+        dict: The event.
+    """
+    return {
+        "status": status,
+        "path": path,
+        "index": index,
+        "total": total,
+        "message": message,
+    }
+
+
+async def ingest_paths(
+    kgrag: Any,
+    files: list[str | S3Object],
+    workers: int | None = None,
+    manifest: IngestionManifest | None = None,
+    force: bool = False
+) -> AsyncGenerator[dict[str, Any], None]:
+    """
+    Ingest a batch of files with a bounded pool of concurrent workers.
+
+    Progress and errors of every file are yielded as soon as they are
+    produced, interleaved across workers. A failing file is reported
+    with an ``error`` event and does not abort the rest of the batch.
+    S3 objects are downloaded ``S3_DOWNLOAD_CONCURRENCY`` at a time
+    ahead of the workers, so parsing starts with the first object on
+    disk, and objects whose ETag is in the manifest are skipped without
+    being downloaded. At most ``2 * workers`` downloads wait for a
+    worker, and each one is deleted once ingested.
+    Args:
+        kgrag (Any): The KGrag instance used for ingestion.
+        files (list[str | S3Object]): Files or S3 objects to ingest.
+        workers (int, optional): Number of documents processed at the
+            same time. Defaults to ``settings.INGESTION_WORKERS``.
+        manifest (IngestionManifest, optional): Manifest used to skip
+            unchanged documents and unchanged chunks.
+        force (bool): Reprocess every document, ignoring the manifest.
+    Yields:
+        dict: Progress events, see ``_event``. S3 objects are reported
+            by URI.
+    """
+    total = len(files)
+    if total == 0:
+        return
+
+    workers = max(1, min(workers or settings.INGESTION_WORKERS, total))
+    ready: asyncio.Queue = asyncio.Queue(maxsize=workers * 2)
+    events: asyncio.Queue = asyncio.Queue()
+
+    async def fetch(index: int, item: str | S3Object) -> None:
+        if not isinstance(item, S3Object):
+            await ready.put((index, item, item, ""))
+            return
+        try:
+            if (
+                manifest is not None
+                and not force
+                and await manifest.etag_matches(item.uri, item.etag)
+            ):
+                await events.put(_event("skipped", item.uri, index, total))
+                return
+            path = await asyncio.to_thread(download_object, item)
+        except Exception as e:
+            logger.error(f"Error downloading {item.uri}: {e}")
+            await events.put(_event("error", item.uri, index, total, str(e)))
+            return
+        await ready.put((index, item.uri, path, item.etag))
+
+    async def prefetch():
+        # A fetch keeps its slot until its file is queued, so downloads
+        # stop while the workers are behind
+        slots = asyncio.Semaphore(settings.S3_DOWNLOAD_CONCURRENCY)
+        fetches: set[asyncio.Task] = set()
+
+        async def fetch_in_slot(index: int, item: str | S3Object) -> None:
+            try:
+                await fetch(index, item)
+            finally:
+                slots.release()
+
+        try:
+            for index, item in enumerate(files, start=1):
+                await slots.acquire()
+                task = asyncio.create_task(fetch_in_slot(index, item))
+                fetches.add(task)
+                task.add_done_callback(fetches.discard)
+            await asyncio.gather(*fetches)
+        except asyncio.CancelledError:
+            for task in fetches:
+                task.cancel()
+            raise
+        except Exception as e:
+            logger.error(f"Error fetching the batch: {e}")
+        for _ in range(workers):
+            await ready.put(None)
+
+    async def worker():
+        try:
+            while True:
+                entry = await ready.get()
+                if entry is None:
+                    return
+                index, key, path, etag = entry
+                try:
+                    if (
+                        manifest is not None
+                        and not force
+                        and not etag
+                        and await manifest.is_unchanged(path)
+                    ):
+                        await events.put(
+                            _event("skipped", key, index, total)
+                        )
+                        continue
+                    await events.put(_event("started", key, index, total))
+                    with span("ingest_file", path=key):
+                        async for step in ingest_file(
+                            kgrag,
+                            path,
+                            manifest=manifest,
+                            force=force,
+                            key=key,
+                            etag=etag
+                        ):
+                            await events.put(
+                                _event("progress", key, index, total, step)
+                            )
+                except Exception as e:
+                    logger.error(f"Error ingesting {key}: {e}")
+                    await events.put(
+                        _event("error", key, index, total, str(e))
+                    )
+                    continue
+                finally:
+                    if path != key:
+                        _remove_file(path)
+                await events.put(_event("done", key, index, total))
+        finally:
+            events.put_nowait(None)
+
+    tasks = [asyncio.create_task(prefetch())]
+    tasks += [asyncio.create_task(worker()) for _ in range(workers)]
+    try:
+        running = workers
+        while running:
+            event = await events.get()
+            if event is None:
+                running -= 1
+                continue
+            yield event
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,429 @@
+"""Background ingestion jobs.
+
+Ingestion requests are submitted as jobs that return an id immediately
+and are executed by a pool of asyncio workers. Jobs, the queue and the
+cancellation flags live in Redis, so any server process can submit,
+poll or cancel a job and the workers of every process share the queue.
+A running job holds a lease renewed by its worker; the job of a process
+that died is queued again once its lease expires.
+"""
+
+import asyncio
+import json
+import os
+import socket
+import time
+import uuid
+from typing import Any, AsyncGenerator, Callable
+from redis.asyncio import Redis
+from config import settings
+from log import logger
+from tracing import span
+
+JobHandler = Callable[[dict[str, Any]], AsyncGenerator[dict[str, Any], None]]
+
+ACTIVE_STATUSES = ("queued", "running")
+FINAL_STATUSES = ("done", "failed", "cancelled")
+
+
+def _new_progress() -> dict[str, int]:
+    return {
+        "total": 0,
+        "completed": 0,
+        "skipped": 0,
+        "failed": 0,
+    }
+
+
+class JobQueue:
+    """
+    Queue of ingestion jobs shared through Redis by every server process.
+
+    A job runs a ``handler`` that receives the job parameters and yields
+    the ingestion events produced by ``ingestion.ingest_paths``; the
+    events are folded into the per-file progress stored with the job.
+    """
+
+    key_prefix: str = "kgrag:job"
+    # Minimum interval between two progress writes of the same job
+    save_interval: float = 1.0
+    # Jobs read per Redis round-trip when listing
+    batch_size: int = 500
+
+    def __init__(
+        self,
+        redis_config: dict[str, Any],
+        handler: JobHandler,
+        workers: int | None = None
+    ):
+        """
+        Initialize the job queue.
+        Args:
+            redis_config (dict): Redis connection parameters.
+            handler (JobHandler): Coroutine generator executing a job.
+            workers (int, optional): Number of jobs executed at the same
+                time by this process. Defaults to ``settings.JOB_WORKERS``.
+        """
+        self.redis = Redis(**redis_config, decode_responses=True)
+        self.handler = handler
+        self.workers = workers or settings.JOB_WORKERS
+        self.lease_seconds = settings.JOB_LEASE_SECONDS
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._workers: list[asyncio.Task] = []
+        self._running: dict[str, asyncio.Task] = {}
+        self._cancelled: set[str] = set()
+
+    def _key(self, job_id: str) -> str:
+        return f"{self.key_prefix}:{job_id}"
+
+    def _lease_key(self, job_id: str) -> str:
+        return f"{self._key(job_id)}:lease"
+
+    def _cancel_key(self, job_id: str) -> str:
+        return f"{self._key(job_id)}:cancel"
+
+    @property
+    def _index_key(self) -> str:
+        return f"{self.key_prefix}s:{settings.COLLECTION_NAME}"
+
+    @property
+    def _queue_key(self) -> str:
+        return f"{self._index_key}:queue"
+
+    async def _save(self, job: dict[str, Any]) -> None:
+        """
+        Persist a job. Finished jobs expire after
+        ``settings.JOB_RETENTION_SECONDS``.
+        Args:
+            job (dict): The job to persist.
+        """
+        job["updated_at"] = time.time()
+        ex = (
+            settings.JOB_RETENTION_SECONDS
+            if job["status"] in FINAL_STATUSES
+            else None
+        )
+        await self.redis.set(self._key(job["id"]), json.dumps(job), ex=ex)
+
+    async def get(self, job_id: str) -> dict[str, Any] | None:
+        """
+        Get a job by id.
+        Args:
+            job_id (str): The job id.
+        Returns:
+            dict | None: The job, or None if unknown or expired.
+        """
+        data = await self.redis.get(self._key(job_id))
+        return json.loads(data) if data else None
+
+    async def list_jobs(
+        self,
+        status: str | None = None,
+        limit: int = 50
+    ) -> list[dict[str, Any]]:
+        """
+        List the most recent jobs.
+        Args:
+            status (str, optional): Only return jobs in this status.
+            limit (int): Maximum number of jobs returned.
+        Returns:
+            list[dict]: The jobs, newest first.
+        """
+        ids = await self.redis.zrevrange(self._index_key, 0, -1)
+        jobs: list[dict[str, Any]] = []
+        for start in range(0, len(ids), self.batch_size):
+            batch = ids[start:start + self.batch_size]
+            values = await self.redis.mget(
+                [self._key(job_id) for job_id in batch]
+            )
+            expired = [i for i, v in zip(batch, values) if v is None]
+            if expired:
+                # Expired: drop them from the index as well
+                await self.redis.zrem(self._index_key, *expired)
+            for data in values:
+                if data is None:
+                    continue
+                job = json.loads(data)
+                if status is None or job["status"] == status:
+                    jobs.append(job)
+                if len(jobs) >= limit:
+                    return jobs
+        return jobs
+
+    async def submit(self, kind: str, params: dict[str, Any]) -> str:
+        """
+        Submit a new job.
+        Args:
+            kind (str): Kind of job, e.g. ``ingestion``.
+            params (dict): Parameters passed to the handler.
+        Returns:
+            str: The id of the job.
+        """
+        now = time.time()
+        job = {
+            "id": str(uuid.uuid4()),
+            "kind": kind,
+            "params": params,
+            "status": "queued",
+            "created_at": now,
+            "started_at": None,
+            "finished_at": None,
+            "progress": _new_progress(),
+            "running": {},
+            "errors": [],
+            "error": None,
+        }
+        await self._save(job)
+        await self.redis.zadd(self._index_key, {job["id"]: now})
+        await self.redis.rpush(self._queue_key, job["id"])
+        return job["id"]
+
+    def _cancel_local(self, job_id: str) -> None:
+        """
+        Interrupt a job if it runs in this process.
+        Args:
+            job_id (str): The job id.
+        """
+        task = self._running.get(job_id)
+        if task is not None and job_id not in self._cancelled:
+            self._cancelled.add(job_id)
+            task.cancel()
+
+    async def cancel(self, job_id: str) -> dict[str, Any] | None:
+        """
+        Cancel a queued or running job. A job running in another process
+        is interrupted by its worker at the next lease renewal.
+        Args:
+            job_id (str): The job id.
+        Returns:
+            dict | None: The job after the cancellation request,
+                or None if unknown.
+        """
+        job = await self.get(job_id)
+        if job is None or job["status"] in FINAL_STATUSES:
+            return job
+
+        await self.redis.set(
+            self._cancel_key(job_id),
+            1,
+            ex=settings.JOB_RETENTION_SECONDS
+        )
+        if job["status"] == "running":
+            self._cancel_local(job_id)
+            job["cancel_requested"] = True
+            return job
+
+        job["status"] = "cancelled"
+        job["finished_at"] = time.time()
+        await self._save(job)
+        return job
+
+    async def recover(self) -> None:
+        """
+        Queue again the jobs whose worker died: running jobs without a
+        lease and queued jobs missing from the queue. Jobs and leases are
+        read in batches, a few round-trips per call.
+        """
+        running = await self.list_jobs(status="running", limit=10_000)
+        pipe = self.redis.pipeline(transaction=False)
+        for job in running:
+            pipe.exists(self._lease_key(job["id"]))
+        leased = await pipe.execute() if running else []
+        for job, has_lease in zip(running, leased):
+            if has_lease:
+                continue
+            logger.info(f"Resuming job {job['id']} (running)")
+            job["status"] = "queued"
+            job["running"] = {}
+            await self._save(job)
+            await self.redis.rpush(self._queue_key, job["id"])
+
+        queued = await self.list_jobs(status="queued", limit=10_000)
+        in_queue = set(await self.redis.lrange(self._queue_key, 0, -1))
+        for job in queued:
+            if job["id"] not in in_queue:
+                logger.info(f"Resuming job {job['id']} (queued)")
+                await self.redis.rpush(self._queue_key, job["id"])
+
+    async def start(self) -> None:
+        """
+        Start the workers of this process and the periodic recovery of
+        the jobs left behind by a stopped or crashed process.
+        """
+        self._workers = [asyncio.create_task(self._recover_loop())] + [
+            asyncio.create_task(self._worker())
+            for _ in range(self.workers)
+        ]
+
+    async def stop(self) -> None:
+        """
+        Stop the workers. Running jobs are put back in the queue and
+        resumed by another process or by the next ``start``.
+        """
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def _recover_loop(self) -> None:
+        """
+        Run ``recover`` every ``lease_seconds`` until cancelled.
+        """
+        while True:
+            try:
+                await self.recover()
+            except Exception as e:
+                logger.error(f"Unable to resume pending jobs: {e}")
+            await asyncio.sleep(self.lease_seconds)
+
+    async def _heartbeat(self, job_id: str) -> None:
+        """
+        Renew the lease of a running job and poll its cancellation flag.
+        Args:
+            job_id (str): The job id.
+        """
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                await self.redis.set(
+                    self._lease_key(job_id),
+                    self.owner,
+                    ex=max(1, int(self.lease_seconds))
+                )
+                if await self.redis.exists(self._cancel_key(job_id)):
+                    self._cancel_local(job_id)
+            except Exception as e:
+                logger.warning(f"Unable to renew the lease of {job_id}: {e}")
+
+    async def _claim(self) -> str | None:
+        """
+        Pop a job from the queue and take its lease.
+        Returns:
+            str | None: The id of a job to run, or None.
+        """
+        item = await self.redis.blpop([self._queue_key], timeout=1)
+        if item is None:
+            return None
+        job_id = item[1]
+        claimed = await self.redis.set(
+            self._lease_key(job_id),
+            self.owner,
+            nx=True,
+            ex=max(1, int(self.lease_seconds))
+        )
+        return job_id if claimed else None
+
+    async def _worker(self) -> None:
+        """
+        Execute queued jobs until cancelled.
+        """
+        while True:
+            try:
+                job_id = await self._claim()
+            except Exception as e:
+                logger.error(f"Unable to read the job queue: {e}")
+                await asyncio.sleep(self.lease_seconds / 3)
+                continue
+            if job_id is None:
+                continue
+
+            try:
+                job = await self.get(job_id)
+                if (
+                    job is None
+                    or job["status"] != "queued"
+                    or await self.redis.exists(self._cancel_key(job_id))
+                ):
+                    continue
+                task = asyncio.create_task(self._traced_run(job))
+                self._running[job_id] = task
+                heartbeat = asyncio.create_task(self._heartbeat(job_id))
+                try:
+                    await asyncio.shield(task)
+                except asyncio.CancelledError:
+                    if not task.done():
+                        # Worker shutdown: interrupt the job as well
+                        task.cancel()
+                        await asyncio.gather(task, return_exceptions=True)
+                        raise
+                finally:
+                    heartbeat.cancel()
+                    self._running.pop(job_id, None)
+                    self._cancelled.discard(job_id)
+            finally:
+                await self.redis.delete(self._lease_key(job_id))
+
+    async def _traced_run(self, job: dict[str, Any]) -> None:
+        """
+        Execute a job in a trace of its own.
+        Args:
+            job (dict): The job to execute.
+        """
+        with span(
+            f"job_{job['kind']}",
+            root=True,
+            job_id=job["id"]
+        ) as current:
+            await self._run(job)
+            current.set_attributes(status=job["status"], **job["progress"])
+
+    async def _run(self, job: dict[str, Any]) -> None:
+        """
+        Execute a job, folding its events into the persisted progress.
+        A resumed job starts counting again, as ``ingest_paths`` reports
+        every file anew (documents already ingested as ``skipped``).
+        Args:
+            job (dict): The job to execute.
+        """
+        job["status"] = "running"
+        job["started_at"] = time.time()
+        job["progress"] = _new_progress()
+        job["running"] = {}
+        job["errors"] = []
+        await self._save(job)
+
+        progress = job["progress"]
+        last_save = 0.0
+        try:
+            async for event in self.handler(job["params"]):
+                status = event["status"]
+                path = event["path"]
+                progress["total"] = event["total"]
+                if status in ("started", "progress"):
+                    job["running"][path] = event["message"] or status
+                else:
+                    job["running"].pop(path, None)
+                    progress["completed"] += 1
+                if status == "skipped":
+                    progress["skipped"] += 1
+                elif status == "error":
+                    progress["failed"] += 1
+                    job["errors"].append(
+                        {"path": path, "error": event["message"]}
+                    )
+
+                now = time.monotonic()
+                if now - last_save >= self.save_interval:
+                    last_save = now
+                    await self._save(job)
+        except asyncio.CancelledError:
+            if job["id"] not in self._cancelled:
+                # Server shutdown: hand the job back to the queue so that
+                # another process, or the next start, resumes it
+                job["status"] = "queued"
+                job["running"] = {}
+                await self._save(job)
+                await self.redis.delete(self._lease_key(job["id"]))
+                await self.redis.rpush(self._queue_key, job["id"])
+                raise
+            job["status"] = "cancelled"
+        except Exception as e:
+            logger.error(f"Job {job['id']} failed: {e}")
+            job["status"] = "failed"
+            job["error"] = str(e)
+        else:
+            job["status"] = "done"
+
+        job["running"] = {}
+        job["finished_at"] = time.time()
+        await self._save(job)
@@ -1,4 +1,3 @@
-from qdrant_client.http.models import Distance
 from typing import Any
 from config import settings
 
@@ -32,12 +31,16 @@ model_embedding_vs_config = {
 collection_config = {
     "collection_name": settings.COLLECTION_NAME,
     "vectors_config": {
-        "size": 1536,
+        # Replaced at startup by the size of the embedding model unless
+        # COLLECTION_DIMENSION is set (see vector_collection.py)
+        "size": settings.COLLECTION_DIMENSION or 1536,
         # COSINE = "Cosine"
         # EUCLID = "Euclid"
         # DOT = "Dot"
         # MANHATTAN = "Manhattan"
-        "distance": Distance.COSINE
+        # A qdrant_client Distance value, kept as a string so that
+        # importing the configuration does not load qdrant_client
+        "distance": settings.COLLECTION_DISTANCE
     }
 }
 
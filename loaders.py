@@ -0,0 +1,393 @@
+"""Document loaders.
+
+A loader turns a file into a stream of documents (pages, records or
+sections) and is selected by file extension or, failing that, by the
+MIME type guessed from the file name. Loaders are generators: a large
+file is read incrementally and never materialized as a whole (except a
+JSON document, parsed whole by the stdlib; JSONL is read by line). Register
+a new format with ``register_loader``:
+
+    @register_loader((".rst",), ("text/x-rst",))
+    def load_rst(path: str, max_chars: int) -> Iterator[Document]:
+        ...
+
+Loaders run in the parse pool workers (see ``parsing``), so they must
+be defined in this module or in one it imports. The libraries of a
+format are imported by its loader, on first use.
+"""
+
+import json
+import mimetypes
+import os
+import re
+import zipfile
+from html.parser import HTMLParser
+from typing import Any, Callable, Iterable, Iterator
+from xml.etree.ElementTree import iterparse
+from langchain_core.documents import Document
+
+Loader = Callable[[str, int], Iterator[Document]]
+
+READ_BLOCK_SIZE = 64 * 1024
+
+_LOADERS: dict[str, Loader] = {}
+_MIME_LOADERS: dict[str, Loader] = {}
+
+
+def register_loader(
+    extensions: tuple[str, ...],
+    mime_types: tuple[str, ...] = ()
+) -> Callable[[Loader], Loader]:
+    """
+    Register a loader for file extensions and MIME types.
+    Args:
+        extensions (tuple[str, ...]): Extensions, with the dot.
+        mime_types (tuple[str, ...]): MIME types.
+    Returns:
+        Callable: The decorator.
+    """
+    def decorator(loader: Loader) -> Loader:
+        for ext in extensions:
+            _LOADERS[ext.lower()] = loader
+        for mime_type in mime_types:
+            _MIME_LOADERS[mime_type] = loader
+        return loader
+    return decorator
+
+
+def get_loader(path: str) -> Loader | None:
+    """
+    Select the loader of a file.
+    Args:
+        path (str): Path or name of the file.
+    Returns:
+        Loader | None: The loader, None if the format is not supported.
+    """
+    loader = _LOADERS.get(os.path.splitext(path)[1].lower())
+    if loader is None:
+        mime_type, _ = mimetypes.guess_type(path)
+        loader = _MIME_LOADERS.get(mime_type or "")
+    return loader
+
+
+def is_supported(path: str) -> bool:
+    """
+    Check whether a file can be ingested.
+    Args:
+        path (str): Path or name of the file.
+    Returns:
+        bool: True if a loader handles it.
+    """
+    return get_loader(path) is not None
+
+
+def iter_documents(path: str, max_chars: int) -> Iterator[Document]:
+    """
+    Stream the documents of a file, with the ``object_name`` and
+    ``local_path`` metadata used by ``KGrag.process_documents``.
+    Args:
+        path (str): Path of the file.
+        max_chars (int): Maximum characters of a section, for the
+            formats split into sections.
+    Yields:
+        Document: The pages, records or sections of the file.
+    Raises:
+        ValueError: If the format is not supported.
+    """
+    loader = get_loader(path)
+    if loader is None:
+        ext = os.path.splitext(path)[1].lower()
+        raise ValueError(f"Unsupported file extension: {ext}")
+
+    metadata = {
+        "object_name": os.path.basename(path),
+        "local_path": path
+    }
+    for doc in loader(path, max_chars):
+        doc.metadata.update(metadata)
+        yield doc
+
+
+def preload() -> None:
+    """
+    Import the libraries of every format, so that the first document of
+    a format does not pay for them.
+    """
+    from langchain_community.document_loaders import (  # noqa: F401
+        CSVLoader,
+        JSONLoader,
+        PyPDFLoader
+    )
+
+
+def _split(text: str, max_chars: int) -> Iterator[str]:
+    """
+    Split a paragraph longer than ``max_chars``, at whitespace if any.
+    """
+    while len(text) > max_chars:
+        cut = text.rfind(" ", 0, max_chars + 1)
+        if cut <= 0:
+            cut = max_chars
+        yield text[:cut].rstrip()
+        text = text[cut:].lstrip()
+    if text:
+        yield text
+
+
+def sections(
+    blocks: Iterable[tuple[str, bool]],
+    max_chars: int
+) -> Iterator[Document]:
+    """
+    Group a stream of paragraphs into sections: a heading starts a new
+    section, and a section is closed before it grows past ``max_chars``
+    (a heading is kept with the paragraph that follows it).
+    Args:
+        blocks (Iterable[tuple[str, bool]]): Paragraphs, with True for
+            the headings.
+        max_chars (int): Maximum characters of a section.
+    Yields:
+        Document: The sections, with their ``section`` index and the
+            ``title`` of the heading they belong to.
+    """
+    title = ""
+    parts: list[str] = []
+    size = 0
+    index = 0
+    for text, is_heading in blocks:
+        text = text.strip()
+        if not text:
+            continue
+        for piece in _split(text, max_chars):
+            # A heading stays with the paragraph that follows it
+            overflow = size + len(piece) > max_chars and parts != [title]
+            if parts and (is_heading or overflow):
+                yield Document(
+                    page_content="\n\n".join(parts),
+                    metadata={"section": index, "title": title}
+                )
+                index += 1
+                parts, size = [], 0
+            if is_heading:
+                title = piece
+                is_heading = False
+            parts.append(piece)
+            size += len(piece) + 2
+    if parts:
+        yield Document(
+            page_content="\n\n".join(parts),
+            metadata={"section": index, "title": title}
+        )
+
+
+@register_loader((".pdf",), ("application/pdf",))
+def load_pdf(path: str, max_chars: int) -> Iterator[Document]:
+    from langchain_community.document_loaders import PyPDFLoader
+    return PyPDFLoader(path).lazy_load()
+
+
+@register_loader((".csv",), ("text/csv",))
+def load_csv(path: str, max_chars: int) -> Iterator[Document]:
+    from langchain_community.document_loaders import CSVLoader
+    return CSVLoader(path).lazy_load()
+
+
+def _json_record(value: Any, path: str, seq_num: int) -> Document:
+    """
+    Build the document of a JSON record: strings are kept as they are,
+    other values are serialized.
+    """
+    text = value if isinstance(value, str) else json.dumps(
+        value,
+        ensure_ascii=False
+    )
+    return Document(
+        page_content=text,
+        metadata={"source": path, "seq_num": seq_num}
+    )
+
+
+@register_loader((".json",), ("application/json",))
+def load_json(path: str, max_chars: int) -> Iterator[Document]:
+    # The stdlib parses a JSON document whole: an array is split into
+    # one document per item, any other value is one document
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    records = data if isinstance(data, list) else [data]
+    for seq_num, value in enumerate(records, start=1):
+        yield _json_record(value, path, seq_num)
+
+
+@register_loader((".jsonl",), ("application/jsonl",))
+def load_jsonl(path: str, max_chars: int) -> Iterator[Document]:
+    seq_num = 0
+    with open(path, encoding="utf-8") as f:
+        for line_num, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                value = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(
+                    f"Invalid JSON on line {line_num} of {path}: {e}"
+                ) from e
+            seq_num += 1
+            yield _json_record(value, path, seq_num)
+
+
+def _paragraphs(path: str) -> Iterator[str]:
+    """
+    Read a text file paragraph by paragraph (blocks separated by blank
+    lines).
+    """
+    lines: list[str] = []
+    with open(path, encoding="utf-8", errors="replace") as f:
+        for line in f:
+            if line.strip():
+                lines.append(line.rstrip("\n"))
+            elif lines:
+                yield "\n".join(lines)
+                lines = []
+    if lines:
+        yield "\n".join(lines)
+
+
+@register_loader((".txt", ".text", ".log"), ("text/plain",))
+def load_text(path: str, max_chars: int) -> Iterator[Document]:
+    return sections(((p, False) for p in _paragraphs(path)), max_chars)
+
+
+_MD_HEADING = re.compile(r"^#{1,6}\s+\S")
+_MD_FENCE = re.compile(r"^\s*(```|~~~)")
+
+
+def _markdown_blocks(path: str) -> Iterator[tuple[str, bool]]:
+    """
+    Read a Markdown file as paragraphs and ATX headings. Fenced code
+    blocks are kept whole.
+    """
+    lines: list[str] = []
+    fenced = False
+    with open(path, encoding="utf-8", errors="replace") as f:
+        for line in f:
+            line = line.rstrip("\n")
+            if _MD_FENCE.match(line):
+                fenced = not fenced
+            if not fenced and _MD_HEADING.match(line):
+                if lines:
+                    yield "\n".join(lines), False
+                    lines = []
+                yield line.lstrip("#").strip(), True
+            elif not fenced and not line.strip():
+                if lines:
+                    yield "\n".join(lines), False
+                    lines = []
+            else:
+                lines.append(line)
+    if lines:
+        yield "\n".join(lines), False
+
+
+@register_loader((".md", ".markdown"), ("text/markdown",))
+def load_markdown(path: str, max_chars: int) -> Iterator[Document]:
+    return sections(_markdown_blocks(path), max_chars)
+
+
+class _HTMLBlocks(HTMLParser):
+    """
+    Incremental HTML parser collecting the text of block elements and
+    headings, without scripts and styles.
+    """
+
+    BLOCKS = {
+        "p", "div", "li", "tr", "br", "section", "article", "header",
+        "footer", "blockquote", "pre", "table", "ul", "ol", "dd", "dt",
+    }
+    HEADINGS = {"h1", "h2", "h3", "h4", "h5", "h6", "title"}
+    SKIP = {"script", "style", "noscript", "template", "svg"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.blocks: list[tuple[str, bool]] = []
+        self._text: list[str] = []
+        self._skip = 0
+        self._heading = False
+
+    def _flush(self) -> None:
+        text = " ".join("".join(self._text).split())
+        if text:
+            self.blocks.append((text, self._heading))
+        self._text = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP:
+            self._skip += 1
+        elif tag in self.HEADINGS:
+            self._flush()
+            self._heading = True
+        elif tag in self.BLOCKS:
+            self._flush()
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP:
+            self._skip = max(0, self._skip - 1)
+        elif tag in self.HEADINGS:
+            self._flush()
+            self._heading = False
+        elif tag in self.BLOCKS:
+            self._flush()
+
+    def handle_data(self, data):
+        if not self._skip:
+            self._text.append(data)
+
+    def close(self):
+        super().close()
+        self._flush()
+
+
+def _html_blocks(path: str) -> Iterator[tuple[str, bool]]:
+    parser = _HTMLBlocks()
+    with open(path, encoding="utf-8", errors="replace") as f:
+        for block in iter(lambda: f.read(READ_BLOCK_SIZE), ""):
+            parser.feed(block)
+            yield from parser.blocks
+            parser.blocks.clear()
+    parser.close()
+    yield from parser.blocks
+
+
+@register_loader((".html", ".htm", ".xhtml"), ("text/html",))
+def load_html(path: str, max_chars: int) -> Iterator[Document]:
+    return sections(_html_blocks(path), max_chars)
+
+
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+
+def _docx_blocks(path: str) -> Iterator[tuple[str, bool]]:
+    """
+    Stream the paragraphs of a DOCX file from its XML body, flagging the
+    ones styled as headings or title.
+    """
+    with zipfile.ZipFile(path) as archive:
+        with archive.open("word/document.xml") as xml:
+            for _, element in iterparse(xml, events=("end",)):
+                if element.tag != f"{_W}p":
+                    continue
+                text = "".join(t.text or "" for t in element.iter(f"{_W}t"))
+                style = element.find(f"{_W}pPr/{_W}pStyle")
+                name = style.get(f"{_W}val", "") if style is not None else ""
+                yield text, name.startswith(("Heading", "Title"))
+                element.clear()
+
+
+@register_loader(
+    (".docx",),
+    (
+        "application/vnd.openxmlformats-officedocument"
+        ".wordprocessingml.document",
+    )
+)
+def load_docx(path: str, max_chars: int) -> Iterator[Document]:
+    return sections(_docx_blocks(path), max_chars)
@@ -1,14 +1,241 @@
 """
 This module sets up a logger that sends logs to a Loki instance.
 Info: https://github.com/xente/loki-logger-handler
+
+Records are shipped off the request path: the handler only formats a
+record and puts it on a bounded queue, and a background thread sends
+gzip-compressed batches to Loki. When Loki is slow and the queue fills
+up, low-severity records are dropped instead of blocking the caller.
 """
 
+import gzip
 import logging
 import os
 import json
-from loki_logger_handler.loki_logger_handler import LokiLoggerHandler
+import queue
+import reprlib
+import threading
+import time
+import requests
+from loki_logger_handler.formatters.logger_formatter import LoggerFormatter
+from loki_logger_handler.stream import Stream
+from loki_logger_handler.streams import Streams
 from typing import Any
 
+# Maximum length of a log message or of a summarized payload
+LOG_PAYLOAD_MAX_CHARS = int(os.getenv("LOG_PAYLOAD_MAX_CHARS", "4096"))
+
+
+def truncate(text: str, max_chars: int | None = None) -> str:
+    """
+    Truncate a text for logging.
+    Args:
+        text (str): The text.
+        max_chars (int, optional): Maximum length. Defaults to
+            ``LOG_PAYLOAD_MAX_CHARS``.
+    Returns:
+        str: The text, cut with a marker of the omitted length.
+    """
+    max_chars = max_chars or LOG_PAYLOAD_MAX_CHARS
+    if len(text) <= max_chars:
+        return text
+    return f"{text[:max_chars]}... [{len(text) - max_chars} more chars]"
+
+
+_summary_repr = reprlib.Repr()
+_summary_repr.maxlevel = 3
+_summary_repr.maxdict = 20
+_summary_repr.maxlist = 20
+_summary_repr.maxstring = 200
+_summary_repr.maxother = 200
+
+
+def summarize(value: Any, max_chars: int | None = None) -> str:
+    """
+    Render a payload for logging without serializing all of it: only
+    the first items of containers and the start of long strings are
+    rendered.
+    Args:
+        value (Any): The payload.
+        max_chars (int, optional): Maximum length. Defaults to
+            ``LOG_PAYLOAD_MAX_CHARS``.
+    Returns:
+        str: The summary.
+    """
+    return truncate(_summary_repr.repr(value), max_chars)
+
+
+class LokiQueueHandler(logging.Handler):
+    """
+    Logging handler shipping records to Loki in batches from a
+    background thread.
+
+    ``emit`` never blocks: records go to a bounded queue that a flusher
+    thread drains, sending a batch when it reaches ``batch_size`` records
+    or every ``flush_interval`` seconds. Past 80% of the queue capacity
+    only warnings and errors are kept; when the queue is full records
+    are dropped. Dropped records are counted and reported in the next
+    batch.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        labels: dict[str, Any],
+        loki_metadata: dict[str, Any] | None = None,
+        loki_metadata_keys: list[str] | None = None,
+        batch_size: int = 500,
+        flush_interval: float = 2.0,
+        queue_size: int = 10000,
+        timeout: float = 5.0,
+        max_message_chars: int | None = None
+    ):
+        """
+        Args:
+            url (str): The Loki push URL.
+            labels (dict): Labels of the log stream.
+            loki_metadata (dict, optional): Structured metadata added
+                to every record.
+            loki_metadata_keys (list[str], optional): Record attributes
+                sent as structured metadata.
+            batch_size (int): Maximum number of records of a push.
+            flush_interval (float): Maximum delay before a push, in
+                seconds.
+            queue_size (int): Maximum number of queued records.
+            timeout (float): Timeout of a push request, in seconds.
+            max_message_chars (int, optional): Messages are truncated
+                past this length. Defaults to ``LOG_PAYLOAD_MAX_CHARS``.
+        """
+        super().__init__()
+        self.url = url
+        self.labels = labels
+        self.loki_metadata = loki_metadata
+        self.loki_metadata_keys = loki_metadata_keys or []
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.timeout = timeout
+        self.max_message_chars = max_message_chars
+        self.loki_formatter = LoggerFormatter()
+        self.queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.high_watermark = int(queue_size * 0.8)
+        self.dropped = 0
+        self.failed_batches = 0
+        self.session = requests.Session()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run,
+            name="loki-flusher",
+            daemon=True
+        )
+        self._thread.start()
+
+    def emit(self, record: logging.LogRecord) -> None:
+        """
+        Queue a record, or drop it under backpressure.
+        Args:
+            record (logging.LogRecord): The record.
+        """
+        try:
+            if (
+                record.levelno < logging.WARNING
+                and self.queue.qsize() >= self.high_watermark
+            ):
+                self.dropped += 1
+                return
+            line, metadata = self.loki_formatter.format(record)
+            line["message"] = truncate(
+                line["message"],
+                self.max_message_chars
+            )
+            for key in self.loki_metadata_keys:
+                if key in line:
+                    metadata[key] = line.pop(key)
+            self.queue.put_nowait((line, metadata))
+        except queue.Full:
+            self.dropped += 1
+        except Exception:
+            self.handleError(record)
+
+    def _run(self) -> None:
+        """
+        Drain the queue and push batches until the handler is closed.
+        """
+        while not self._stop.is_set():
+            batch = self._collect()
+            if batch:
+                self._send(batch)
+        # Push what is left, without waiting for more records
+        while not self.queue.empty():
+            self._send(self._collect(wait=False))
+
+    def _collect(self, wait: bool = True) -> list:
+        """
+        Collect a batch of records.
+        Args:
+            wait (bool): Wait up to ``flush_interval`` for the batch
+                to fill.
+        Returns:
+            list: The ``(line, metadata)`` pairs of the batch.
+        """
+        batch: list = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if wait and remaining > 0 and not self._stop.is_set():
+                    batch.append(self.queue.get(timeout=min(remaining, 0.5)))
+                else:
+                    batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                if not wait or remaining <= 0 or self._stop.is_set():
+                    break
+        return batch
+
+    def _send(self, batch: list) -> None:
+        """
+        Push a batch to Loki as a gzip-compressed request.
+        Args:
+            batch (list): The ``(line, metadata)`` pairs of the batch.
+        """
+        stream = Stream(self.labels, self.loki_metadata)
+        if self.dropped:
+            dropped, self.dropped = self.dropped, 0
+            stream.append_value({
+                "message": f"{dropped} log records dropped under backpressure",
+                "timestamp": time.time(),
+                "level": "WARNING",
+            })
+        for line, metadata in batch:
+            try:
+                stream.append_value(line, metadata)
+            except (TypeError, ValueError):
+                line = {k: str(v) for k, v in line.items()}
+                stream.append_value(line, metadata)
+        try:
+            response = self.session.post(
+                self.url,
+                data=gzip.compress(
+                    Streams([stream]).serialize().encode("utf-8")
+                ),
+                headers={
+                    "Content-Type": "application/json",
+                    "Content-Encoding": "gzip",
+                },
+                timeout=self.timeout
+            )
+            response.raise_for_status()
+        except requests.RequestException:
+            self.failed_batches += 1
+
+    def close(self) -> None:
+        """
+        Stop the flusher thread after pushing the queued records.
+        """
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join(self.timeout * 2)
+        super().close()
+
 
 def get_logger(**kwargs) -> logging.Logger:
     """
@@ -79,14 +306,15 @@ def get_logger(**kwargs) -> logging.Logger:
         logger.addHandler(console_handler)
     else:
         # Create an instance of the custom handler
-        agent_logger_handler = LokiLoggerHandler(
+        agent_logger_handler = LokiQueueHandler(
             url=loki_url,
             labels=labels,
-            label_keys={},
-            timeout=10,
-            enable_structured_loki_metadata=True,
             loki_metadata=metadata_default,
-            loki_metadata_keys=["thread_id"]
+            loki_metadata_keys=["thread_id", "trace_id"],
+            batch_size=int(os.getenv("LOKI_BATCH_SIZE", "500")),
+            flush_interval=float(os.getenv("LOKI_FLUSH_INTERVAL", "2")),
+            queue_size=int(os.getenv("LOKI_QUEUE_SIZE", "10000")),
+            timeout=float(os.getenv("LOKI_TIMEOUT", "5"))
         )
         agent_logger_handler.setFormatter(formatter)
         agent_logger_handler.setLevel(level)
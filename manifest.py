@@ -0,0 +1,253 @@
+"""Incremental ingestion manifest.
+
+The manifest records, for every ingested document, its content hash,
+size, modification time and the hashes of the chunks that were written
+to the knowledge graph. It lives in the Redis instance configured in
+``kgrag_config.redis_config`` so that re-submitting an unchanged file is
+skipped in constant time and a changed file only reprocesses the chunks
+whose hashes differ. Documents downloaded from S3 are keyed by their URI
+and also record the ETag of the object.
+
+While a document is being ingested its entry is a checkpoint: the chunks
+committed so far and a ``checkpoint`` field with the progress of the
+ingestion, including the entities written for a chunk whose vectors are
+not stored yet. A checkpoint never matches as unchanged, so an interrupted
+or failed ingestion resumes from the last committed chunk when the
+document is submitted again.
+"""
+
+import asyncio
+import json
+import os
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Iterable
+from redis.asyncio import Redis
+from config import settings
+from parsing import hash_file
+
+
+class IngestionManifest:
+    """
+    Persistent manifest of ingested documents stored in Redis.
+    """
+
+    key_prefix: str = "kgrag:manifest"
+    # Keys read or written per Redis round-trip by the bulk operations
+    batch_size: int = 500
+
+    def __init__(
+        self,
+        redis_config: dict[str, Any],
+        collection_name: str | None = None
+    ):
+        """
+        Initialize the manifest.
+        Args:
+            redis_config (dict): Redis connection parameters
+                (host, port, db).
+            collection_name (str, optional): Collection the manifest
+                belongs to. Defaults to ``settings.COLLECTION_NAME``.
+        """
+        self.collection_name = collection_name or settings.COLLECTION_NAME
+        self.redis = Redis(**redis_config, decode_responses=True)
+
+    def _key(self, path: str) -> str:
+        """
+        Get the Redis key of a document.
+        Args:
+            path (str): Path of the document.
+        Returns:
+            str: The Redis key.
+        """
+        return f"{self.key_prefix}:{self.collection_name}:{path}"
+
+    async def get(self, path: str) -> dict[str, Any] | None:
+        """
+        Get the manifest entry of a document.
+        Args:
+            path (str): Path of the document.
+        Returns:
+            dict | None: The entry, with ``chunks`` decoded to a list and
+                the ``checkpoint`` of an unfinished ingestion to a dict,
+                or None if the document was never ingested.
+        """
+        data = await self.redis.hgetall(self._key(path))
+        if not data:
+            return None
+        data["size"] = int(data.get("size", -1))
+        data["mtime"] = float(data.get("mtime", -1))
+        data["chunks"] = json.loads(data.get("chunks", "[]"))
+        if "checkpoint" in data:
+            data["checkpoint"] = json.loads(data["checkpoint"])
+        return data
+
+    async def save(
+        self,
+        path: str,
+        sha256: str,
+        size: int,
+        mtime: float,
+        chunks: list[str],
+        etag: str = ""
+    ) -> None:
+        """
+        Store the manifest entry of a document, replacing its checkpoint.
+        Args:
+            path (str): Path of the document.
+            sha256 (str): Content hash of the document.
+            size (int): Size of the document in bytes.
+            mtime (float): Modification time of the document.
+            chunks (list[str]): Hashes of the ingested chunks.
+            etag (str): ETag of the S3 object the document was
+                downloaded from, empty for a local file.
+        """
+        pipe = self.redis.pipeline()
+        pipe.hset(self._key(path), mapping={
+            "sha256": sha256,
+            "size": size,
+            "mtime": mtime,
+            "chunks": json.dumps(chunks),
+            "etag": etag,
+            "update_at": datetime.now(timezone.utc).isoformat(),
+        })
+        pipe.hdel(self._key(path), "checkpoint")
+        await pipe.execute()
+
+    async def checkpoint(
+        self,
+        path: str,
+        chunks: list[str],
+        progress: dict[str, Any]
+    ) -> None:
+        """
+        Store the progress of a document being ingested. The entry keeps
+        the committed chunks but never matches as unchanged, so the next
+        attempt only processes the missing ones.
+        Args:
+            path (str): Path of the document.
+            chunks (list[str]): Hashes of the chunks committed so far.
+            progress (dict): Progress of the ingestion, stored as the
+                ``checkpoint`` of the entry.
+        """
+        await self.redis.hset(self._key(path), mapping={
+            "sha256": "",
+            "size": -1,
+            "mtime": -1,
+            "chunks": json.dumps(chunks),
+            "etag": "",
+            "checkpoint": json.dumps(progress),
+            "update_at": datetime.now(timezone.utc).isoformat(),
+        })
+
+    async def delete(self, path: str) -> None:
+        """
+        Remove the manifest entry of a document.
+        Args:
+            path (str): Path of the document.
+        """
+        await self.redis.delete(self._key(path))
+
+    async def _scan(self) -> AsyncIterator[list[str]]:
+        """
+        Iterate over the keys of the collection, in batches.
+        """
+        batch: list[str] = []
+        async for key in self.redis.scan_iter(
+            match=f"{self._key('')}*",
+            count=self.batch_size
+        ):
+            batch.append(key)
+            if len(batch) == self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    async def entries(self) -> AsyncIterator[tuple[str, dict[str, str]]]:
+        """
+        Iterate over the stored entries of the collection, as saved.
+        Yields:
+            tuple: The path of a document and its entry.
+        """
+        prefix = self._key("")
+        async for keys in self._scan():
+            pipe = self.redis.pipeline(transaction=False)
+            for key in keys:
+                pipe.hgetall(key)
+            for key, data in zip(keys, await pipe.execute()):
+                if data:
+                    yield key[len(prefix):], data
+
+    async def restore(self, entries: Iterable[tuple[str, dict]]) -> int:
+        """
+        Write entries read with ``entries``, replacing existing ones.
+        Args:
+            entries (Iterable[tuple[str, dict]]): Paths and entries.
+        Returns:
+            int: The number of entries written.
+        """
+        written = 0
+        pipe = self.redis.pipeline(transaction=False)
+        for path, data in entries:
+            pipe.delete(self._key(path))
+            pipe.hset(self._key(path), mapping=data)
+            written += 1
+            if written % self.batch_size == 0:
+                await pipe.execute()
+        await pipe.execute()
+        return written
+
+    async def clear(self) -> int:
+        """
+        Remove every entry of the collection.
+        Returns:
+            int: The number of removed entries.
+        """
+        removed = 0
+        async for keys in self._scan():
+            removed += await self.redis.delete(*keys)
+        return removed
+
+    async def etag_matches(self, path: str, etag: str) -> bool:
+        """
+        Check whether an S3 object was ingested with the same ETag, so
+        that it can be skipped without downloading it.
+        Args:
+            path (str): URI of the object.
+            etag (str): Current ETag of the object.
+        Returns:
+            bool: True if the object can be skipped.
+        """
+        stored = await self.redis.hget(self._key(path), "etag")
+        return bool(etag) and stored == etag
+
+    async def is_unchanged(self, path: str) -> bool:
+        """
+        Check whether a document is unchanged since its last ingestion.
+
+        Size and modification time are compared first, so an untouched
+        file is recognized without reading it. When they differ the
+        content hash decides, and a matching hash only refreshes the
+        stored modification time.
+        Args:
+            path (str): Path of the document.
+        Returns:
+            bool: True if the document can be skipped.
+        """
+        entry = await self.get(path)
+        if entry is None:
+            return False
+
+        stat = os.stat(path)
+        if entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime:
+            return True
+
+        sha256 = await asyncio.to_thread(hash_file, path)
+        if sha256 != entry.get("sha256"):
+            return False
+
+        await self.redis.hset(self._key(path), mapping={
+            "size": stat.st_size,
+            "mtime": stat.st_mtime,
+        })
+        return True
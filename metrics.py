@@ -0,0 +1,413 @@
+"""Prometheus metrics.
+
+A minimal registry of counters, gauges and histograms rendered in the
+Prometheus text exposition format by the ``/metrics`` route. Tools are
+instrumented with ``track_tool`` and the stages of the KGrag pipelines
+with ``instrument_kgrag``, which wraps the methods of the KGrag instance
+that parse, embed, extract, write to Neo4j, upsert to Qdrant, search
+and generate. Tools and stages are also traced (see ``tracing``).
+"""
+
+import functools
+import inspect
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator
+from tracing import Span, correlate_logs, span
+
+DEFAULT_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0
+)
+
+
+def _escape(value: str) -> str:
+    return (
+        value.replace("\\", "\\\\")
+        .replace('"', '\\"')
+        .replace("\n", "\\n")
+    )
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(
+        f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)
+    )
+    return "{" + pairs + "}"
+
+
+class _Metric:
+    """
+    Base class of the metrics: a name, a help text and label names.
+    """
+
+    type_name: str = "untyped"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = ()
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        REGISTRY.register(self)
+
+    def _key(self, labels: dict[str, str]) -> tuple[str, ...]:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def header(self) -> list[str]:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type_name}",
+        ]
+
+
+class Counter(_Metric):
+    """
+    Monotonically increasing value.
+    """
+
+    type_name = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, value: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + value
+
+    def set(self, value: float, **labels: str) -> None:
+        """
+        Set the total, for counters mirrored from another source.
+        """
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def samples(self) -> list[str]:
+        with self._lock:
+            return [
+                f"{self.name}{_format_labels(self.labelnames, k)} {v}"
+                for k, v in self._values.items()
+            ]
+
+
+class Gauge(Counter):
+    """
+    Value that can go up and down.
+    """
+
+    type_name = "gauge"
+
+    def dec(self, value: float = 1.0, **labels: str) -> None:
+        self.inc(-value, **labels)
+
+
+class Histogram(_Metric):
+    """
+    Distribution of observed values in cumulative buckets.
+    """
+
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._counts: dict[tuple[str, ...], list[int]] = {}
+        self._sums: dict[tuple[str, ...], float] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            counts = self._counts.setdefault(
+                key,
+                [0] * (len(self.buckets) + 1)
+            )
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            counts[-1] += 1
+            self._sums[key] = self._sums.get(key, 0.0) + value
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        """
+        Observe the duration of the enclosed block.
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def snapshot(self) -> dict[tuple[str, ...], tuple[int, float]]:
+        """
+        Get the count and sum of the observations of every label set.
+        Returns:
+            dict: ``(count, sum)`` by label values.
+        """
+        with self._lock:
+            return {
+                key: (counts[-1], self._sums[key])
+                for key, counts in self._counts.items()
+            }
+
+    def samples(self) -> list[str]:
+        lines: list[str] = []
+        names = self.labelnames + ("le",)
+        with self._lock:
+            for key, counts in self._counts.items():
+                for bound, count in zip(self.buckets, counts):
+                    labels = _format_labels(names, key + (repr(bound),))
+                    lines.append(f"{self.name}_bucket{labels} {count}")
+                labels = _format_labels(names, key + ("+Inf",))
+                lines.append(f"{self.name}_bucket{labels} {counts[-1]}")
+                labels = _format_labels(self.labelnames, key)
+                lines.append(f"{self.name}_sum{labels} {self._sums[key]}")
+                lines.append(f"{self.name}_count{labels} {counts[-1]}")
+        return lines
+
+
+class Registry:
+    """
+    Collection of the metrics exposed by ``/metrics``.
+    """
+
+    def __init__(self):
+        self._metrics: list[_Metric] = []
+
+    def register(self, metric: _Metric) -> None:
+        self._metrics.append(metric)
+
+    def render(self) -> str:
+        """
+        Render every metric in the Prometheus text format.
+        Returns:
+            str: The exposition.
+        """
+        lines: list[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.header())
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+TOOL_REQUESTS = Counter(
+    "kgrag_tool_requests_total",
+    "MCP tool calls.",
+    ("tool",)
+)
+TOOL_ERRORS = Counter(
+    "kgrag_tool_errors_total",
+    "MCP tool calls that raised an error.",
+    ("tool",)
+)
+TOOL_IN_FLIGHT = Gauge(
+    "kgrag_tool_in_flight",
+    "MCP tool calls in progress.",
+    ("tool",)
+)
+TOOL_LATENCY = Histogram(
+    "kgrag_tool_latency_seconds",
+    "Latency of the MCP tool calls.",
+    ("tool",)
+)
+STAGE_LATENCY = Histogram(
+    "kgrag_stage_latency_seconds",
+    "Latency of the stages of the ingestion and query pipelines.",
+    ("stage",)
+)
+STAGE_ERRORS = Counter(
+    "kgrag_stage_errors_total",
+    "Pipeline stages that raised an error.",
+    ("stage",)
+)
+ANSWER_CACHE_REQUESTS = Counter(
+    "kgrag_answer_cache_requests_total",
+    "Answer cache lookups by result.",
+    ("result",)
+)
+
+
+def track_tool(name: str) -> Callable:
+    """
+    Decorate an async MCP tool to count its calls and errors, track
+    the calls in flight and observe its latency. Every call starts a
+    trace.
+    Args:
+        name (str): The tool name used as label.
+    Returns:
+        Callable: The decorator.
+    """
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            TOOL_REQUESTS.inc(tool=name)
+            TOOL_IN_FLIGHT.inc(tool=name)
+            started = time.perf_counter()
+            try:
+                with span(name, root=True, tool=name):
+                    return await func(*args, **kwargs)
+            except BaseException:
+                TOOL_ERRORS.inc(tool=name)
+                raise
+            finally:
+                TOOL_IN_FLIGHT.dec(tool=name)
+                TOOL_LATENCY.observe(
+                    time.perf_counter() - started,
+                    tool=name
+                )
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def stage(name: str, **attributes: Any) -> Iterator[Span]:
+    """
+    Observe the latency and errors of a pipeline stage, traced as a
+    span of the current request.
+    Args:
+        name (str): The stage name used as label.
+        **attributes: Attributes of the span.
+    Yields:
+        Span: The span of the stage.
+    """
+    started = time.perf_counter()
+    try:
+        with span(name, **attributes) as current:
+            yield current
+    except BaseException:
+        STAGE_ERRORS.inc(stage=name)
+        raise
+    finally:
+        STAGE_LATENCY.observe(time.perf_counter() - started, stage=name)
+
+
+def _arg(args: tuple, kwargs: dict, index: int, name: str) -> Any:
+    return args[index] if len(args) > index else kwargs.get(name)
+
+
+def _size(value: Any) -> int:
+    return len(value) if hasattr(value, "__len__") else 0
+
+
+# Span attributes of a stage, from the arguments and result of the call
+STAGE_ATTRIBUTES: dict[str, Callable[[tuple, dict, Any], dict]] = {
+    "llm_extract": lambda args, kwargs, result: {
+        "prompt_chars": _size(_arg(args, kwargs, 0, "raw_data")),
+        "nodes": _size(result[0]),
+        "relationships": _size(result[1]),
+    },
+    "neo4j_write": lambda args, kwargs, result: {
+        "nodes": _size(_arg(args, kwargs, 0, "nodes")),
+        "relationships": _size(_arg(args, kwargs, 1, "relationships")),
+    },
+    "embed": lambda args, kwargs, result: {
+        "vectors": _size(result),
+    },
+    "embed_query": lambda args, kwargs, result: {
+        "query_chars": _size(_arg(args, kwargs, 0, "query")),
+    },
+    "vector_search": lambda args, kwargs, result: {
+        "results": _size(result),
+    },
+    "graph_lookup": lambda args, kwargs, result: {
+        "entities": _size(_arg(args, kwargs, 0, "entity_ids")),
+    },
+    "llm_generate": lambda args, kwargs, result: {
+        "context_chars": _size(str(kwargs.get("graph_context", ""))),
+        "answer_chars": _size(result),
+    },
+    "qdrant_upsert": lambda args, kwargs, result: {
+        "points": _size(kwargs.get("points")),
+    },
+}
+
+
+def _describe(current: Span, name: str, args, kwargs, result) -> None:
+    describe = STAGE_ATTRIBUTES.get(name)
+    if describe is None or not current.recording:
+        return
+    try:
+        current.set_attributes(**describe(args, kwargs, result))
+    except Exception:
+        # Attributes are best effort: never fail the stage for them
+        pass
+
+
+def _wrap_stage(obj: Any, attr: str, name: str) -> None:
+    """
+    Replace a method of an object with a version timed as a stage.
+    Args:
+        obj (Any): The object.
+        attr (str): The method name.
+        name (str): The stage name.
+    """
+    func = getattr(obj, attr, None)
+    if func is None:
+        return
+
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with stage(name) as current:
+                result = await func(*args, **kwargs)
+                _describe(current, name, args, kwargs, result)
+                return result
+    else:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name) as current:
+                result = func(*args, **kwargs)
+                _describe(current, name, args, kwargs, result)
+                return result
+
+    setattr(obj, attr, wrapper)
+
+
+# Methods of the KGrag instance (or of its clients) timed as stages
+KGRAG_STAGES: tuple[tuple[str, str], ...] = (
+    ("extract_graph_components", "llm_extract"),
+    ("ingest_to_neo4j", "neo4j_write"),
+    ("embeddings", "embed"),
+    ("embed_query", "embed_query"),
+    ("retriever_search", "vector_search"),
+    ("_fetch_related_graph", "graph_lookup"),
+    ("_run", "llm_generate"),
+)
+
+
+def instrument_kgrag(kgrag: Any) -> Any:
+    """
+    Time and trace the stages of the ingestion and query pipelines of a
+    KGrag instance, and tag its log records with the current trace.
+    Args:
+        kgrag (Any): The KGrag instance.
+    Returns:
+        Any: The same instance, instrumented.
+    """
+    for attr, name in KGRAG_STAGES:
+        _wrap_stage(kgrag, attr, name)
+    qdrant_client_async = getattr(kgrag, "qdrant_client_async", None)
+    if qdrant_client_async is not None:
+        _wrap_stage(qdrant_client_async, "upsert", "qdrant_upsert")
+    kgrag_logger = getattr(kgrag, "logger", None)
+    if isinstance(kgrag_logger, logging.Logger):
+        correlate_logs(kgrag_logger)
+    return kgrag
@@ -0,0 +1,120 @@
+"""Document parsing and chunking.
+
+Loading a document (see ``loaders``) and hashing its chunks is
+CPU-bound, so ingestion runs ``parse_document`` in a pool of worker
+processes (see ``ingestion.parse``). The chunks are streamed to a spill
+file as they are loaded, and only their hashes are sent back, so
+neither process holds every chunk of a large file: ingestion reads them
+back one at a time with ``read_chunks``.
+This module is imported by the workers: it must stay free of server
+state (settings, logging handlers, connections).
+"""
+
+import hashlib
+import os
+import pickle
+import tempfile
+import time
+from typing import Any, Iterator
+
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def hash_text(text: str) -> str:
+    """
+    Compute the content hash of a chunk of text.
+    Args:
+        text (str): The text to hash.
+    Returns:
+        str: The hex encoded SHA-256 digest.
+    """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def hash_file(path: str) -> str:
+    """
+    Compute the content hash of a file, reading it in blocks.
+    Args:
+        path (str): Path of the file.
+    Returns:
+        str: The hex encoded SHA-256 digest.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def preload(_: Any = None) -> None:
+    """
+    Import the document loaders and their libraries ahead of the first
+    parse (see ``ingestion.start_parse_pool``).
+    """
+    from loaders import preload as preload_loaders
+    preload_loaders()
+
+
+def parse_document(
+    path: str,
+    max_chars: int
+) -> tuple[str, list[str], str, dict[str, float]]:
+    """
+    Hash a file, stream its chunks from the loader of its format, hash
+    them and write them to a spill file as plain ``(text, metadata)``
+    pairs, cheaper to pickle than ``Document`` objects.
+    Args:
+        path (str): Path of the file.
+        max_chars (int): Maximum characters of a section (see
+            ``loaders.sections``).
+    Returns:
+        tuple: The content hash of the file, the hashes of its chunks
+            in order, the path of the spill file (see ``read_chunks``,
+            to be deleted by the caller) and the duration of the
+            ``parse`` (hashing the file) and ``chunk`` (loading,
+            splitting and hashing its chunks) stages in seconds.
+    """
+    # The document libraries are loaded by the first parse
+    from loaders import iter_documents
+
+    started = time.perf_counter()
+    sha256 = hash_file(path)
+    hashed = time.perf_counter()
+    hashes = []
+    fd, spill = tempfile.mkstemp(prefix="kgrag-chunks-", suffix=".pkl")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for doc in iter_documents(path, max_chars):
+                chunk_hash = hash_text(doc.page_content)
+                doc.metadata["chunk_hash"] = chunk_hash
+                pickle.dump(
+                    (doc.page_content, doc.metadata),
+                    f,
+                    protocol=pickle.HIGHEST_PROTOCOL
+                )
+                hashes.append(chunk_hash)
+    except BaseException:
+        os.remove(spill)
+        raise
+    timings = {
+        "parse": hashed - started,
+        "chunk": time.perf_counter() - hashed,
+    }
+    return sha256, hashes, spill, timings
+
+
+def read_chunks(spill: str) -> Iterator[tuple[str, dict[str, Any]]]:
+    """
+    Read back the chunks written by ``parse_document``, one at a time.
+    Args:
+        spill (str): Path of the spill file.
+    Yields:
+        tuple: The text of a chunk and its metadata, with
+            ``chunk_hash``.
+    """
+    with open(spill, "rb") as f:
+        while True:
+            try:
+                yield pickle.load(f)
+            except EOFError:
+                return
@@ -0,0 +1,190 @@
+"""Retries of transient LLM errors.
+
+A rate limit, a timeout or a restarting LLM endpoint fails a graph
+extraction that would succeed a few seconds later, and failing it fails
+the whole document it belongs to. ``with_llm_retries`` retries the
+extraction calls of a KGrag instance with exponential backoff and jitter
+when the error is transient (``is_transient``), honouring the
+``Retry-After`` header of a rate-limited response. Other errors are
+raised at once.
+
+Errors are recognized by status code and class name, so the OpenAI,
+Ollama and httpx clients are handled without importing them.
+"""
+
+import asyncio
+import functools
+import random
+from typing import Any, Iterator
+from config import settings
+from log import logger
+from metrics import Counter
+
+# HTTP statuses worth retrying: timeouts, conflicts, rate limits and
+# unavailable servers
+TRANSIENT_STATUS_CODES = frozenset({408, 409, 425, 429, 500, 502, 503, 504})
+TRANSIENT_ERROR_NAMES = frozenset({
+    "APIConnectionError",
+    "APITimeoutError",
+    "ConnectError",
+    "ConnectTimeout",
+    "InternalServerError",
+    "RateLimitError",
+    "ReadError",
+    "ReadTimeout",
+    "RemoteProtocolError",
+    "ServiceUnavailableError",
+})
+
+LLM_RETRIES = Counter(
+    "kgrag_llm_retries_total",
+    "LLM calls retried after a transient error.",
+    ("method",)
+)
+
+
+def _chain(error: BaseException) -> Iterator[BaseException]:
+    """
+    Iterate over an error and the errors it was raised from.
+    """
+    seen: set[int] = set()
+    current: BaseException | None = error
+    while current is not None and id(current) not in seen:
+        seen.add(id(current))
+        yield current
+        current = current.__cause__ or current.__context__
+
+
+def _status_code(error: BaseException) -> int | None:
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def is_transient(error: BaseException) -> bool:
+    """
+    Check whether an error may not happen again on a new attempt.
+    Args:
+        error (BaseException): The error.
+    Returns:
+        bool: True for timeouts, connection errors, rate limits and
+            server errors, also when wrapped in another error.
+    """
+    for e in _chain(error):
+        if isinstance(e, (TimeoutError, ConnectionError)):
+            return True
+        if _status_code(e) in TRANSIENT_STATUS_CODES:
+            return True
+        if type(e).__name__ in TRANSIENT_ERROR_NAMES:
+            return True
+    return False
+
+
+def _retry_after(error: BaseException) -> float | None:
+    """
+    Get the delay asked by a ``Retry-After`` header, in seconds.
+    """
+    for e in _chain(error):
+        headers = getattr(getattr(e, "response", None), "headers", None)
+        try:
+            value = headers.get("retry-after") if headers else None
+            if value is not None:
+                return float(value)
+        except (AttributeError, TypeError, ValueError):
+            continue
+    return None
+
+
+def backoff_delay(
+    attempt: int,
+    base: float,
+    maximum: float,
+    error: BaseException | None = None
+) -> float:
+    """
+    Delay before a new attempt: exponential with full jitter, or the
+    ``Retry-After`` of the error when it asks for longer.
+    Args:
+        attempt (int): The failed attempt, from 1.
+        base (float): Delay after the first attempt, in seconds.
+        maximum (float): Upper bound of the delay, in seconds.
+        error (BaseException, optional): The error of the attempt.
+    Returns:
+        float: The delay in seconds.
+    """
+    delay = random.uniform(0, min(maximum, base * 2 ** (attempt - 1)))
+    retry_after = _retry_after(error) if error is not None else None
+    if retry_after is not None:
+        delay = max(delay, min(maximum, retry_after))
+    return delay
+
+
+def _with_retries(
+    obj: Any,
+    attr: str,
+    attempts: int,
+    base: float,
+    maximum: float
+) -> None:
+    """
+    Replace a coroutine method of an object with a version retrying it
+    on transient errors.
+    """
+    method = getattr(obj, attr, None)
+    if method is None:
+        return
+
+    @functools.wraps(method)
+    async def call(*args, **kwargs):
+        attempt = 1
+        while True:
+            try:
+                return await method(*args, **kwargs)
+            except Exception as e:
+                if attempt >= attempts or not is_transient(e):
+                    raise
+                delay = backoff_delay(attempt, base, maximum, e)
+                logger.warning(
+                    f"{attr} failed ({type(e).__name__}: {e}), "
+                    f"retry {attempt}/{attempts - 1} in {delay:.1f}s"
+                )
+                LLM_RETRIES.inc(method=attr)
+                await asyncio.sleep(delay)
+                attempt += 1
+    setattr(obj, attr, call)
+
+
+def with_llm_retries(
+    kgrag: Any,
+    attempts: int | None = None,
+    base: float | None = None,
+    maximum: float | None = None
+) -> Any:
+    """
+    Retry the graph extraction calls of a KGrag instance on transient
+    errors. Apply it over ``with_llm_priority``, so that the slot of the
+    LLM pool is given back while waiting.
+    Args:
+        kgrag (Any): The KGrag instance.
+        attempts (int, optional): Attempts per call, 1 disables retries.
+            Defaults to ``settings.LLM_RETRY_ATTEMPTS``.
+        base (float, optional): Delay after the first attempt, in
+            seconds. Defaults to ``settings.LLM_RETRY_BASE_SECONDS``.
+        maximum (float, optional): Upper bound of a delay, in seconds.
+            Defaults to ``settings.LLM_RETRY_MAX_SECONDS``.
+    Returns:
+        Any: The same instance.
+    """
+    if attempts is None:
+        attempts = settings.LLM_RETRY_ATTEMPTS
+    if attempts <= 1:
+        return kgrag
+    _with_retries(
+        kgrag,
+        "extract_graph_components",
+        attempts,
+        settings.LLM_RETRY_BASE_SECONDS if base is None else base,
+        settings.LLM_RETRY_MAX_SECONDS if maximum is None else maximum
+    )
+    return kgrag
@@ -0,0 +1,222 @@
+"""Retrieval without generation.
+
+``retrieve`` runs the first half of ``KGrag.query``: embed the prompt,
+search Qdrant and expand the graph around the entities found, and returns
+the ranked results instead of asking the LLM for an answer. Qdrant points
+carry the id of a graph entity and the metadata of the chunk it was
+extracted from (file, page, row or section, ``chunk_hash`` and the
+``text`` excerpt stored at ingestion), so a chunk is returned as its text,
+source and entities; graph facts are scored after the chunk that reached
+them, divided by their number of hops.
+"""
+
+import asyncio
+import json
+from typing import Any
+from qdrant_client.http import models
+from metrics import stage
+from tracing import current_span
+
+# Rough token estimate, without depending on the tokenizer of the model
+CHARS_PER_TOKEN = 4
+
+# Points fetched per requested chunk: several entities share a chunk
+OVERFETCH = 4
+
+FACTS_QUERY = """
+MATCH (e:Entity)-[r]-(:Entity)
+WHERE e.id IN $ids
+RETURN e.id AS seed, startNode(r).name AS source, r.type AS type,
+       endNode(r).name AS target, 1 AS hops
+LIMIT $limit
+UNION ALL
+MATCH (e:Entity)-[]-(:Entity)-[r]-(n:Entity)
+WHERE e.id IN $ids AND n <> e
+RETURN e.id AS seed, startNode(r).name AS source, r.type AS type,
+       endNode(r).name AS target, 2 AS hops
+LIMIT $limit
+"""
+NAMES_QUERY = """
+MATCH (e:Entity)
+WHERE e.id IN $ids
+RETURN e.id AS id, e.name AS name
+"""
+
+
+def estimate_tokens(value: Any) -> int:
+    """
+    Estimate the tokens of a value once serialized as JSON.
+    Args:
+        value (Any): The value.
+    Returns:
+        int: The estimated number of tokens.
+    """
+    return len(json.dumps(value, default=str)) // CHARS_PER_TOKEN + 1
+
+
+def build_filter(filters: dict[str, Any] | None) -> models.Filter | None:
+    """
+    Build a Qdrant filter from payload conditions.
+    Args:
+        filters (dict, optional): Payload keys and the value they must
+            match, or a list of accepted values, e.g.
+            ``{"object_name": ["a.pdf", "b.pdf"], "page": 3}``.
+    Returns:
+        Filter | None: The filter, None without conditions.
+    """
+    if not filters:
+        return None
+    conditions: list[Any] = []
+    for key, value in filters.items():
+        if isinstance(value, (list, tuple)):
+            match: Any = models.MatchAny(any=list(value))
+        else:
+            match = models.MatchValue(value=value)
+        conditions.append(models.FieldCondition(key=key, match=match))
+    return models.Filter(must=conditions)
+
+
+def _graph_lookup(
+    driver: Any,
+    entity_ids: list[str],
+    limit: int
+) -> tuple[dict[str, str], list[dict[str, Any]]]:
+    """
+    Fetch the names of entities and the facts around them, up to two
+    hops, in one session.
+    """
+    with driver.session() as session:
+        names = {
+            record["id"]: record["name"]
+            for record in session.run(NAMES_QUERY, ids=entity_ids)
+        }
+        facts = [
+            dict(record)
+            for record in session.run(
+                FACTS_QUERY,
+                ids=entity_ids,
+                limit=limit
+            )
+        ]
+    return names, facts
+
+
+async def retrieve(
+    kgrag: Any,
+    prompt: str,
+    top_k: int,
+    max_tokens: int,
+    max_facts: int,
+    filters: dict[str, Any] | None = None
+) -> dict[str, Any]:
+    """
+    Retrieve the chunks and graph facts relevant to a prompt.
+    Args:
+        kgrag (Any): The KGrag instance.
+        prompt (str): The prompt.
+        top_k (int): Maximum number of chunks.
+        max_tokens (int): Token budget of the returned chunks and facts.
+        max_facts (int): Maximum number of facts fetched from the graph.
+        filters (dict, optional): Payload conditions on the chunks (see
+            ``build_filter``).
+    Returns:
+        dict: The ``chunks`` (score, text excerpt, source metadata and
+            entities) and ``facts`` (score, source, type, target) by
+            decreasing score, the estimated ``tokens`` and whether
+            results were ``truncated`` to fit the budget.
+    """
+    collection_name = kgrag._get_collection_name()
+    client = kgrag.qdrant_client_async
+    empty = {"chunks": [], "facts": [], "tokens": 0, "truncated": False}
+    if not await client.collection_exists(collection_name):
+        return empty
+
+    vector = await asyncio.to_thread(kgrag.embed_query, prompt)
+    with stage("vector_search", filtered=bool(filters)) as current:
+        result = await client.query_points(
+            collection_name=collection_name,
+            query=vector,
+            query_filter=build_filter(filters),
+            limit=top_k * OVERFETCH,
+            with_payload=True
+        )
+        current.set_attributes(points=len(result.points))
+
+    # Group the points of a chunk, keeping the best score
+    chunks: dict[str, dict[str, Any]] = {}
+    seed_scores: dict[str, float] = {}
+    for point in result.points:
+        payload = dict(point.payload or {})
+        entity_id = payload.pop("id", None)
+        key = payload.get("chunk_hash") or str(point.id)
+        chunk = chunks.get(key)
+        if chunk is None:
+            if len(chunks) == top_k:
+                continue
+            chunk = chunks[key] = {
+                "score": point.score,
+                "text": payload.pop("text", ""),
+                "source": payload,
+                "entities": [],
+            }
+        if entity_id is not None:
+            chunk["entities"].append(entity_id)
+            seed_scores[entity_id] = max(
+                seed_scores.get(entity_id, 0.0),
+                point.score
+            )
+    if not chunks:
+        return empty
+
+    facts: dict[tuple[str, str, str], dict[str, Any]] = {}
+    if seed_scores:
+        with stage("graph_lookup", entities=len(seed_scores)) as current:
+            names, records = await asyncio.to_thread(
+                _graph_lookup,
+                kgrag.neo4j_driver,
+                list(seed_scores),
+                max_facts
+            )
+            current.set_attributes(facts=len(records), round_trips=2)
+        for chunk in chunks.values():
+            chunk["entities"] = [
+                names.get(entity_id, entity_id)
+                for entity_id in chunk["entities"]
+            ]
+        for record in records:
+            score = seed_scores.get(record["seed"], 0.0) / record["hops"]
+            fact = (record["source"], record["type"], record["target"])
+            if fact not in facts or facts[fact]["score"] < score:
+                facts[fact] = {
+                    "score": score,
+                    "source": record["source"],
+                    "type": record["type"],
+                    "target": record["target"],
+                }
+
+    # Fill the token budget with the best results of either kind
+    ranked = sorted(
+        [("chunks", c) for c in chunks.values()]
+        + [("facts", f) for f in facts.values()],
+        key=lambda item: item[1]["score"],
+        reverse=True
+    )
+    output: dict[str, Any] = {"chunks": [], "facts": []}
+    tokens = 0
+    truncated = False
+    for kind, item in ranked:
+        cost = estimate_tokens(item)
+        if tokens + cost > max_tokens:
+            truncated = True
+            continue
+        output[kind].append(item)
+        tokens += cost
+    output["tokens"] = tokens
+    output["truncated"] = truncated
+    current_span().set_attributes(
+        chunks=len(output["chunks"]),
+        facts=len(output["facts"]),
+        tokens=tokens,
+        truncated=truncated
+    )
+    return output
@@ -0,0 +1,231 @@
+"""S3 sources for batch ingestion.
+
+``s3://bucket/prefix`` paths are expanded into the objects under the
+prefix (or matching a glob such as ``s3://bucket/docs/*.pdf``), listed
+page by page. Globs match keys segment by segment, like local paths:
+``*`` and ``?`` stop at ``/`` and ``**/`` spans any number of
+"directories". Objects are downloaded into ``settings.PATH_DOWNLOAD`` with
+the boto3 transfer manager, which splits large objects into ranged GETs
+run in parallel, and their ETag is recorded in the ingestion manifest so
+that an unchanged object is skipped without being downloaded again.
+"""
+
+import glob
+import os
+import re
+import threading
+from typing import Any, Callable
+from config import settings
+from kgrag_config import aws_config
+
+S3_SCHEME = "s3://"
+
+_client: Any = None
+_client_lock = threading.Lock()
+
+
+class S3Object:
+    """
+    An object of a bucket to ingest.
+    """
+
+    def __init__(self, bucket: str, key: str, size: int, etag: str):
+        """
+        Args:
+            bucket (str): The bucket.
+            key (str): The object key.
+            size (int): Size of the object in bytes.
+            etag (str): ETag of the object, without quotes.
+        """
+        self.bucket = bucket
+        self.key = key
+        self.size = size
+        self.etag = etag
+
+    @property
+    def uri(self) -> str:
+        return f"{S3_SCHEME}{self.bucket}/{self.key}"
+
+    @property
+    def local_path(self) -> str:
+        """
+        Download destination, under ``settings.PATH_DOWNLOAD``.
+        Raises:
+            ValueError: If the key escapes the download directory.
+        """
+        root = os.path.normpath(
+            os.path.join(settings.PATH_DOWNLOAD, "s3", self.bucket)
+        )
+        path = os.path.normpath(os.path.join(root, self.key))
+        if not path.startswith(root + os.sep):
+            raise ValueError(f"Invalid object key: {self.key}")
+        return path
+
+    def __repr__(self) -> str:
+        return f"S3Object({self.uri!r}, etag={self.etag!r})"
+
+
+def is_s3_uri(path: str) -> bool:
+    """
+    Check whether a path is an S3 URI.
+    Args:
+        path (str): The path.
+    Returns:
+        bool: True for ``s3://`` paths.
+    """
+    return path.lower().startswith(S3_SCHEME)
+
+
+def parse_s3_uri(uri: str) -> tuple[str, str]:
+    """
+    Split an S3 URI into bucket and key.
+    Args:
+        uri (str): The URI, e.g. ``s3://bucket/prefix``.
+    Returns:
+        tuple[str, str]: The bucket and the key (or prefix).
+    Raises:
+        ValueError: If the URI has no bucket.
+    """
+    # Not urlparse: "?" and "#" are glob and key characters here
+    bucket, _, key = uri[len(S3_SCHEME):].partition("/")
+    if not is_s3_uri(uri) or not bucket:
+        raise ValueError(f"Invalid S3 URI: {uri}")
+    return bucket, key.lstrip("/")
+
+
+def get_client() -> Any:
+    """
+    Get the S3 client shared by the process, built from
+    ``kgrag_config.aws_config``. Missing credentials and region fall back
+    to the default boto3 chain, and ``AWS_ENDPOINT_URL`` points the
+    client to an S3-compatible store such as MinIO.
+    Returns:
+        Any: The boto3 S3 client.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                # boto3 is only needed for s3:// paths
+                import boto3
+                _client = boto3.client(
+                    "s3",
+                    aws_access_key_id=aws_config["access_key_id"],
+                    aws_secret_access_key=aws_config["secret_access_key"],
+                    region_name=aws_config["region"]
+                )
+    return _client
+
+
+def glob_to_regex(pattern: str) -> re.Pattern:
+    """
+    Compile a glob into a regex matching whole keys, segment by segment.
+    Args:
+        pattern (str): The glob, e.g. ``docs/**/*.pdf``.
+    Returns:
+        re.Pattern: The compiled regex.
+    """
+    parts = []
+    i, n = 0, len(pattern)
+    while i < n:
+        c = pattern[i]
+        if pattern.startswith("**/", i):
+            parts.append("(?:[^/]*/)*")
+            i += 3
+            continue
+        if pattern.startswith("**", i):
+            parts.append(".*")
+            i += 2
+            continue
+        if c == "*":
+            parts.append("[^/]*")
+        elif c == "?":
+            parts.append("[^/]")
+        elif c == "[":
+            end = pattern.find("]", i + 2)
+            if end < 0:
+                parts.append(re.escape(c))
+            else:
+                chars = pattern[i + 1:end].replace("\\", "\\\\")
+                if chars.startswith("!"):
+                    chars = "^" + chars[1:]
+                elif chars.startswith("^"):
+                    chars = "\\" + chars
+                parts.append(f"(?!/)[{chars}]")
+                i = end
+        else:
+            parts.append(re.escape(c))
+        i += 1
+    return re.compile("".join(parts) + r"\Z")
+
+
+def list_objects(
+    uri: str,
+    supported: Callable[[str], bool]
+) -> list[S3Object]:
+    """
+    List the objects of an S3 URI, following the pagination.
+    Args:
+        uri (str): An object (``s3://bucket/key``), a prefix
+            (``s3://bucket/docs/``) or a glob (``s3://bucket/**/*.pdf``),
+            see ``glob_to_regex``.
+        supported (Callable[[str], bool]): Whether an object listed
+            from a prefix or a glob is kept, by key; an exact key is
+            always returned.
+    Returns:
+        list[S3Object]: The objects, sorted by key.
+    """
+    bucket, key = parse_s3_uri(uri)
+    pattern = glob_to_regex(key) if glob.has_magic(key) else None
+    prefix = key
+    if pattern is not None:
+        # List from the literal part of the pattern, then match
+        prefix = re.split(r"[*?[]", key, maxsplit=1)[0]
+
+    objects = []
+    paginator = get_client().get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        for item in page.get("Contents", []):
+            obj = S3Object(
+                bucket,
+                item["Key"],
+                item["Size"],
+                item["ETag"].strip('"')
+            )
+            if pattern is None and obj.key == key:
+                return [obj]
+            if obj.key.endswith("/"):
+                continue
+            if pattern is not None and not pattern.match(obj.key):
+                continue
+            if supported(obj.key):
+                objects.append(obj)
+    return sorted(objects, key=lambda o: o.key)
+
+
+def download_object(obj: S3Object) -> str:
+    """
+    Download an object into ``settings.PATH_DOWNLOAD``. Objects larger
+    than ``S3_MULTIPART_CHUNK_MB`` are fetched as ranged GETs, up to
+    ``S3_MAX_CONCURRENCY`` at a time, and streamed to disk.
+    Args:
+        obj (S3Object): The object.
+    Returns:
+        str: The local path.
+    """
+    from boto3.s3.transfer import TransferConfig
+
+    chunk_size = settings.S3_MULTIPART_CHUNK_MB * 1024 * 1024
+    path = obj.local_path
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    get_client().download_file(
+        obj.bucket,
+        obj.key,
+        path,
+        Config=TransferConfig(
+            multipart_threshold=chunk_size,
+            multipart_chunksize=chunk_size,
+            max_concurrency=settings.S3_MAX_CONCURRENCY
+        )
+    )
+    return path
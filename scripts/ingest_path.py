@@ -1,3 +1,4 @@
+import argparse
 import asyncio
 import os
 import sys
@@ -7,34 +8,81 @@ ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if ROOT not in sys.path:
     sys.path.insert(0, ROOT)
 
-from config import settings  # noqa: E402 (import after sys.path manipulation)
-
-# Select kgrag impl based on env (same logic as server.py)
-if settings.LLM_MODEL_TYPE == "ollama":
-    from kgrag_ollama import kgrag_ollama as kgrag
-elif settings.LLM_MODEL_TYPE == "openai":
-    from kgrag_openai import kgrag_openai as kgrag
-else:
-    raise RuntimeError(
-        f"Unsupported LLM_MODEL_TYPE: {settings.LLM_MODEL_TYPE!r}"
-    )
+# Project imports must follow the sys.path manipulation above
+from backend import create_kgrag  # noqa: E402
+from ingestion import (  # noqa: E402
+    collect_files,
+    ingest_paths,
+    shutdown_parse_pool
+)
+from kgrag_config import redis_config  # noqa: E402
+from manifest import IngestionManifest  # noqa: E402
+from metrics import instrument_kgrag  # noqa: E402
+from retries import with_llm_retries  # noqa: E402
+from tracing import span, start_tracing, stop_tracing  # noqa: E402
 
 
-async def run(path: str):
-    if not os.path.exists(path):
+async def run(path: str, workers: int | None = None, force: bool = False):
+    files = collect_files(path)
+    if not files:
         print(f"ERROR: file not found: {path}")
         sys.exit(1)
 
-    async for d in kgrag.process_documents(path=path, force=True):
-        print(d)
-    print(f"DONE: {path}")
+    # Select kgrag impl based on env (same logic as server.py), with
+    # its stages traced and extraction retried on transient errors
+    kgrag = with_llm_retries(instrument_kgrag(create_kgrag()))
+    failed: list[str] = []
+    manifest = IngestionManifest(redis_config)
+    start_tracing()
+    try:
+        with span("ingest_path", root=True, path=path, files=len(files)):
+            async for event in ingest_paths(
+                kgrag,
+                files,
+                workers=workers,
+                manifest=manifest,
+                force=force
+            ):
+                prefix = f"[{event['index']}/{event['total']}] {event['path']}"
+                if event["status"] == "progress":
+                    print(f"{prefix}: {event['message']}")
+                elif event["status"] == "skipped":
+                    print(f"SKIPPED (unchanged): {event['path']}")
+                elif event["status"] == "error":
+                    failed.append(event["path"])
+                    print(f"{prefix}: ERROR: {event['message']}")
+                elif event["status"] == "done":
+                    print(f"DONE: {event['path']}")
+    finally:
+        shutdown_parse_pool()
+        stop_tracing()
+
+    print(f"DONE: {len(files) - len(failed)}/{len(files)} from {path}")
+    if failed:
+        sys.exit(1)
 
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print(
-            "Usage: python scripts/ingest_path.py "
-            "/absolute/path/to/file.pdf"
+    parser = argparse.ArgumentParser(
+        description=(
+            "Ingest a file, a directory or a glob pattern, local or on "
+            "S3, into the KGraph system."
         )
-        sys.exit(2)
-    target = sys.argv[1]
-    asyncio.run(run(target))
+    )
+    parser.add_argument(
+        "path",
+        help="file, directory or quoted glob, e.g. '/data/**/*.pdf' "
+        "or 's3://bucket/prefix/'"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="documents ingested concurrently (default: INGESTION_WORKERS)"
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="reprocess documents even if unchanged since last ingestion"
+    )
+    args = parser.parse_args()
+    asyncio.run(run(args.path, workers=args.workers, force=args.force))
@@ -0,0 +1,110 @@
+import argparse
+import os
+import re
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Phases of the startup, each timed in a fresh interpreter: the settings,
+# then the ASGI app, that serves /healthz as soon as it is imported
+PHASES: tuple[tuple[str, str], ...] = (
+    ("settings", "import config"),
+    ("server", "import server"),
+)
+BACKEND_PHASE = (
+    "backend",
+    "import asyncio, server; asyncio.run(server.backend.get())",
+)
+
+_IMPORT_TIME = re.compile(
+    r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$"
+)
+
+
+def profile_phase(statement: str) -> tuple[float, list[tuple[str, int]]]:
+    """
+    Run a statement in a fresh interpreter with ``-X importtime``.
+    Args:
+        statement (str): The Python statement.
+    Returns:
+        tuple: The wall time in seconds and the self time of every
+            imported module, in microseconds.
+    """
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        cwd=ROOT,
+        capture_output=True,
+        text=True
+    )
+    seconds = time.perf_counter() - started
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+
+    modules = []
+    for line in result.stderr.splitlines():
+        match = _IMPORT_TIME.match(line)
+        if match:
+            modules.append((match.group(4), int(match.group(1))))
+    return seconds, modules
+
+
+def report(
+    name: str,
+    seconds: float,
+    modules: list[tuple[str, int]],
+    top: int
+) -> None:
+    packages: dict[str, int] = defaultdict(int)
+    for module, self_us in modules:
+        packages[module.split(".")[0]] += self_us
+
+    print(f"{name}: {seconds:.2f}s, {len(modules)} modules")
+    print("  packages by import time:")
+    for package, self_us in sorted(
+        packages.items(),
+        key=lambda item: item[1],
+        reverse=True
+    )[:top]:
+        print(f"    {self_us / 1e6:8.3f}s  {package}")
+    print("  modules by self time:")
+    for module, self_us in sorted(
+        modules,
+        key=lambda item: item[1],
+        reverse=True
+    )[:top]:
+        print(f"    {self_us / 1e6:8.3f}s  {module}")
+
+
+def run(top: int, backend: bool) -> None:
+    phases = PHASES + ((BACKEND_PHASE,) if backend else ())
+    for name, statement in phases:
+        seconds, modules = profile_phase(statement)
+        report(name, seconds, modules, top)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=(
+            "Report where the startup time of the server goes: import "
+            "time per phase, package and module. The startup budget is "
+            "checked by `python server.py --profile-startup`."
+        )
+    )
+    parser.add_argument(
+        "--top",
+        type=int,
+        default=15,
+        help="packages and modules listed per phase (default: 15)"
+    )
+    parser.add_argument(
+        "--backend",
+        action="store_true",
+        help="also time building the KGrag backend (connects to the "
+        "configured services)"
+    )
+    args = parser.parse_args()
+    run(args.top, args.backend)
@@ -0,0 +1,66 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+
+# Ensure project root is on sys.path BEFORE imports from project
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+# Project imports must follow the sys.path manipulation above
+from backend import create_kgrag  # noqa: E402
+from kgrag_config import redis_config  # noqa: E402
+from manifest import IngestionManifest  # noqa: E402
+from snapshot import export_snapshot, import_snapshot  # noqa: E402
+
+
+async def run(args: argparse.Namespace):
+    # Select kgrag impl based on env (same logic as server.py)
+    kgrag = create_kgrag()
+    manifest = IngestionManifest(redis_config)
+    if args.command == "export":
+        result = await export_snapshot(kgrag, manifest, args.directory)
+    else:
+        if not os.path.isfile(args.bundle):
+            print(f"ERROR: file not found: {args.bundle}")
+            sys.exit(1)
+        result = await import_snapshot(
+            kgrag,
+            manifest,
+            args.bundle,
+            replace=args.replace,
+            force=args.force
+        )
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=(
+            "Export the vector collection, the knowledge graph and the "
+            "ingestion manifest to a snapshot bundle, or import one. "
+            "Stop ingestion while exporting."
+        )
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    export_parser = commands.add_parser("export", help="write a bundle")
+    export_parser.add_argument(
+        "--directory",
+        default=None,
+        help="where the bundle is written (default: SNAPSHOT_PATH)"
+    )
+    import_parser = commands.add_parser("import", help="restore a bundle")
+    import_parser.add_argument("bundle", help="path of the bundle")
+    import_parser.add_argument(
+        "--replace",
+        action="store_true",
+        help="overwrite a knowledge base that is not empty"
+    )
+    import_parser.add_argument(
+        "--force",
+        action="store_true",
+        help="accept a bundle embedded with another MODEL_EMBEDDING"
+    )
+    asyncio.run(run(parser.parse_args()))
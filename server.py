@@ -1,33 +1,96 @@
+import asyncio
+import json
 import os
+import subprocess
+import sys
+from contextlib import asynccontextmanager
 from mcp.server.fastmcp import FastMCP, Context
 from starlette.applications import Starlette
 from starlette.routing import Mount
 from starlette.responses import (
+    JSONResponse,
     PlainTextResponse,
 )
 from starlette.routing import Route
+from admission import Admission
+from answer_cache import create_answer_cache, normalize_prompt
+from backend import Backend
 from config import settings
+from extraction import extract_graph
+from graph_writer import write_graph
+from ingestion import collect_files, ingest_paths, shutdown_parse_pool
+from jobs import JobQueue
+from kgrag_config import neo4j_auth, redis_config
+from log import logger, summarize, truncate
+from manifest import IngestionManifest
+from metrics import ANSWER_CACHE_REQUESTS, REGISTRY, stage, track_tool
+from parsing import hash_text
+from singleflight import SingleFlight
+from streaming import stream_answer
+from tracing import (
+    correlate_logs,
+    current_span,
+    start_tracing,
+    stop_tracing
+)
 
-# Initialize FastMCP server
-mcp = FastMCP("KGraph MCP Server")
+# Initialize FastMCP server. In stateless HTTP mode every request is
+# self-contained, so any worker or replica can serve it.
+mcp = FastMCP(
+    "KGraph MCP Server",
+    stateless_http=settings.MCP_STATELESS_HTTP
+)
 
-# Register KGrag instance based on LLM model type
-# Import into a temporary name and then assign
-# to `kgrag` so the variable is always defined,
-# and raise a clear error for unsupported configuration.
-_kgrag = None
+# The KGrag instance for the configured LLM_MODEL_TYPE is built lazily
+# in the ASGI lifespan; tools get it with `await backend.get()`.
+backend = Backend(redis_config)
+manifest = IngestionManifest(redis_config)
+answer_cache = create_answer_cache(
+    redis_config,
+    embed=lambda text: backend.kgrag.embed_query(text)
+)
+# Identical concurrent query and extract calls share one computation
+inflight = SingleFlight()
+# Per-tool concurrency limits with bounded wait queues
+admission = Admission(settings.ADMISSION_LIMITS, settings.ADMISSION_QUEUE_SIZE)
+# Log records emitted within a traced request carry its trace id
+correlate_logs(logger)
 
-if settings.LLM_MODEL_TYPE == "ollama":
-    from kgrag_ollama import kgrag_ollama as _kgrag
-elif settings.LLM_MODEL_TYPE == "openai":
-    from kgrag_openai import kgrag_openai as _kgrag
-else:
-    raise RuntimeError(
-        "Unsupported LLM_MODEL_TYPE: "
-        + f"{settings.LLM_MODEL_TYPE!r}. Expected 'ollama' or 'openai'."
-    )
 
-kgrag = _kgrag
+async def invalidate_answers(event: dict) -> None:
+    """
+    Invalidate the cached answers once a document has been ingested.
+    Args:
+        event (dict): An ingestion event.
+    """
+    if answer_cache is not None and event["status"] == "done":
+        await answer_cache.invalidate()
+
+
+async def run_ingestion_job(params: dict):
+    """
+    Execute a background ingestion job.
+    Args:
+        params (dict): The job parameters (path, workers, force).
+    Yields:
+        dict: The ingestion events of the job.
+    """
+    files = await asyncio.to_thread(collect_files, params["path"])
+    if not files:
+        raise FileNotFoundError(f"File {params['path']} does not exist.")
+    kgrag = await backend.get()
+    async for event in ingest_paths(
+        kgrag,
+        files,
+        workers=params.get("workers"),
+        manifest=manifest,
+        force=params.get("force", False)
+    ):
+        await invalidate_answers(event)
+        yield event
+
+
+jobs = JobQueue(redis_config, handler=run_ingestion_job)
 
 
 async def health(_):
@@ -39,29 +102,85 @@ async def health(_):
     return PlainTextResponse("ok")
 
 
+async def ready(_):
+    """
+    Readiness endpoint.
+    Returns:
+        JSONResponse: The status of every dependency, with HTTP 200
+            when all of them are reachable and 503 otherwise.
+    """
+    report = await backend.readiness()
+    report["warm_up"] = backend.warm_up_status
+    return JSONResponse(report, status_code=200 if report["ready"] else 503)
+
+
+async def metrics(_):
+    """
+    Prometheus metrics endpoint.
+    Returns:
+        PlainTextResponse: The metrics in the Prometheus text format.
+    """
+    if answer_cache is not None:
+        for result, value in answer_cache.stats().items():
+            ANSWER_CACHE_REQUESTS.set(value, result=result)
+    return PlainTextResponse(
+        REGISTRY.render(),
+        media_type="text/plain; version=0.0.4"
+    )
+
+
 @mcp.tool(
     title="Extract Graph Data",
     name="extract",
     description="Extract graph data from a document using the KGraph system."
 )
+@track_tool("extract")
+@admission.admit("extract")
 async def extract(
     text: str,
-    ctx: Context
+    ctx: Context,
+    persist: bool = False
 ) -> dict:
     """
     Extract graph data from a document using the KGraph system.
+    Large texts are split into overlapping chunks extracted
+    concurrently, and the partial graphs are merged.
     Args:
         raw_data (str): Raw data to be processed.
         ctx (Context): Context for logging and reporting progress.
+        persist (bool): Also write the graph to Neo4j.
     Returns:
-        tuple: A tuple containing a dictionary of nodes and a list of edges.
+        dict: The nodes, the relationships and the ``failed_chunks``
+            whose graph is missing from them.
     """
     if not isinstance(text, str):
         return {}, []
 
-    nodes, relationships = await kgrag.extract_graph_components(text)
-    await ctx.info(f"Extracted Graph Data: {nodes}, {relationships}")
-    return {"nodes": nodes, "relationships": relationships}
+    kgrag = await backend.get()
+    nodes, relationships, failed = await extract_text(kgrag, text)
+    await ctx.info(
+        f"Extracted Graph Data: {len(nodes)} nodes, "
+        f"{len(relationships)} relationships: "
+        f"{summarize({'nodes': nodes, 'relationships': relationships})}"
+    )
+    if failed:
+        await ctx.warning(
+            f"Graph extraction failed on {len(failed)} chunks: the graph "
+            "is partial"
+        )
+    result = {
+        "nodes": nodes,
+        "relationships": relationships,
+        "failed_chunks": failed_chunks(failed),
+    }
+    if persist:
+        result["persisted"] = await persist_graph(
+            kgrag,
+            nodes,
+            relationships,
+            ctx
+        )
+    return result
 
 
 @mcp.tool(
@@ -69,6 +188,8 @@ async def extract(
     name="query",
     description="Query the KGraph system with a specific query string."
 )
+@track_tool("query")
+@admission.admit("query")
 async def query(
     prompt: str,
     ctx: Context
@@ -83,55 +204,719 @@ async def query(
     if not prompt.strip():
         return "query cannot be an empty string."
 
-    await ctx.info(f"Querying KGraph: {prompt}")
-    return await kgrag.query(prompt)
+    return await answer_query(prompt, ctx, stream=settings.QUERY_STREAM)
+
+
+def failed_chunks(indexes: list[int]) -> dict:
+    """
+    Describe the chunks of an extraction that failed.
+    Args:
+        indexes (list[int]): 0-based indexes of the chunks.
+    Returns:
+        dict: Their ``count`` and ``indexes``.
+    """
+    return {"count": len(indexes), "indexes": indexes}
+
+
+async def extract_text(kgrag, text: str) -> tuple:
+    """
+    Extract the graph of a text, sharing the computation with identical
+    extractions in flight.
+    Args:
+        kgrag (Any): The KGrag instance.
+        text (str): The text.
+    Returns:
+        tuple: The nodes, the relationships and the indexes of the
+            chunks that failed (see ``extraction.extract_graph``).
+    """
+    return await inflight.do(
+        ("extract", hash_text(text)),
+        lambda: extract_graph(kgrag, text)
+    )
+
+
+@mcp.tool(
+    title="Retrieve Context",
+    name="retrieve",
+    description=(
+        "Retrieve the chunks and graph facts relevant to a query, ranked "
+        "by score, without generating an answer."
+    )
+)
+@track_tool("retrieve")
+@admission.admit("retrieve")
+async def retrieve(
+    prompt: str,
+    ctx: Context,
+    top_k: int | None = None,
+    filters: dict | None = None,
+    max_tokens: int | None = None
+) -> dict:
+    """
+    Retrieve the context of a query, skipping the LLM generation.
+    Args:
+        prompt (str): The query.
+        ctx (Context): Context for logging.
+        top_k (int, optional): Maximum number of chunks
+            (default ``RETRIEVE_TOP_K``).
+        filters (dict, optional): Metadata the chunks must match, e.g.
+            ``{"object_name": "report.pdf"}``; a list accepts any of
+            its values.
+        max_tokens (int, optional): Token budget of the result
+            (default ``RETRIEVE_MAX_TOKENS``).
+    Returns:
+        dict: The ranked ``chunks`` and ``facts``, the estimated
+            ``tokens`` and whether results were ``truncated``.
+    """
+    if not isinstance(prompt, str) or not prompt.strip():
+        return {"error": "query must be a non-empty string."}
+
+    from retrieval import retrieve as retrieve_context
+
+    kgrag = await backend.get()
+    result = await retrieve_context(
+        kgrag,
+        prompt,
+        top_k=top_k or settings.RETRIEVE_TOP_K,
+        max_tokens=max_tokens or settings.RETRIEVE_MAX_TOKENS,
+        max_facts=settings.RETRIEVE_MAX_FACTS,
+        filters=filters
+    )
+    await ctx.info(
+        f"Retrieved {len(result['chunks'])} chunks and "
+        f"{len(result['facts'])} facts ({result['tokens']} tokens): "
+        f"{truncate(prompt)}"
+    )
+    return result
+
+
+async def persist_graph(
+    kgrag,
+    nodes: dict,
+    relationships: list,
+    ctx: Context
+) -> dict:
+    """
+    Write extracted graph components to the Neo4j database of
+    ``kgrag_config.neo4j_auth`` in batched transactions.
+    Args:
+        kgrag (Any): The KGrag instance.
+        nodes (dict): Node names and ids.
+        relationships (list): The relationships.
+        ctx (Context): Context for logging.
+    Returns:
+        dict: Created nodes and relationships, transactions and seconds.
+    """
+    with stage("neo4j_write"):
+        stats = await asyncio.to_thread(
+            write_graph,
+            kgrag.neo4j_driver,
+            nodes,
+            relationships,
+            neo4j_auth["database"]
+        )
+    await ctx.info(
+        f"Persisted graph: {stats['nodes']} nodes and "
+        f"{stats['relationships']} relationships created in "
+        f"{stats['transactions']} transactions ({stats['seconds']}s)"
+    )
+    return stats
+
+
+async def send_delta(ctx: Context, delta: str, size: int) -> None:
+    """
+    Send a part of an answer being generated: as a progress notification
+    if the client asked for progress, as a log notification of the
+    ``answer`` logger otherwise. A failed notification does not stop the
+    generation.
+    Args:
+        ctx (Context): Context of the request.
+        delta (str): The new part of the answer.
+        size (int): Characters of the answer generated so far.
+    """
+    try:
+        meta = ctx.request_context.meta
+        if meta is not None and meta.progressToken is not None:
+            await ctx.report_progress(size, message=delta)
+        else:
+            await ctx.log("info", delta, logger_name="answer")
+    except Exception as e:
+        logger.warning(f"Answer delta not sent: {e}")
+
+
+async def answer_query(
+    prompt: str,
+    ctx: Context,
+    stream: bool = False
+) -> str:
+    """
+    Answer a prompt, going through the answer cache. Identical prompts
+    in flight share one KGraph query.
+    Args:
+        prompt (str): The prompt.
+        ctx (Context): Context for logging.
+        stream (bool): Send the answer to the client while it is
+            generated (see ``send_delta``). Calls sharing the query of
+            another one only get the final answer.
+    Returns:
+        str: The answer.
+    """
+    kgrag = await backend.get()
+    version = None
+    current_span().set_attributes(prompt_chars=len(prompt), stream=stream)
+    if answer_cache is not None:
+        version = await answer_cache.version()
+        answer = await answer_cache.get(prompt)
+        current_span().set_attributes(cache_hit=answer is not None)
+        if answer is not None:
+            await ctx.info(f"Answer cache hit: {truncate(prompt)}")
+            return answer
+
+    async def compute() -> str:
+        if stream:
+            answer = await stream_answer(
+                kgrag,
+                prompt,
+                lambda delta, size: send_delta(ctx, delta, size)
+            )
+        else:
+            answer = await kgrag.query(prompt)
+        if answer_cache is not None:
+            await answer_cache.set(prompt, answer, version=version)
+        return answer
+
+    await ctx.info(f"Querying KGraph: {truncate(prompt)}")
+    return await inflight.do(("query", normalize_prompt(prompt)), compute)
+
+
+async def run_batch(items: list, worker) -> list[dict]:
+    """
+    Run a coroutine function on every item of a batch with at most
+    ``BATCH_CONCURRENCY`` items in flight.
+    Args:
+        items (list): The inputs of the batch.
+        worker (Callable): Coroutine function returning the result
+            of one item as a dict.
+    Returns:
+        list[dict]: The results in input order; a failed item is
+            reported as ``{"error": ...}``.
+    """
+    semaphore = asyncio.Semaphore(settings.BATCH_CONCURRENCY)
+
+    async def run(item) -> dict:
+        async with semaphore:
+            try:
+                return await worker(item)
+            except Exception as e:
+                return {"error": str(e)}
+
+    return await asyncio.gather(*(run(item) for item in items))
+
+
+@mcp.tool(
+    title="Extract Graph Data (batch)",
+    name="extract_many",
+    description=(
+        "Extract graph data from a list of texts in one call. "
+        "Results are returned in input order."
+    )
+)
+@track_tool("extract_many")
+@admission.admit("extract_many")
+async def extract_many(
+    texts: list[str],
+    ctx: Context,
+    persist: bool = False
+) -> list[dict]:
+    """
+    Extract graph data from a batch of texts.
+    Args:
+        texts (list[str]): Texts to extract the graph from.
+        ctx (Context): Context for logging and reporting progress.
+        persist (bool): Also write each graph to Neo4j.
+    Returns:
+        list[dict]: For each text, its nodes and relationships
+            or an ``error``.
+    """
+    if len(texts) > settings.BATCH_MAX_ITEMS:
+        return [{"error": f"At most {settings.BATCH_MAX_ITEMS} texts."}]
+
+    kgrag = await backend.get()
+
+    async def extract_one(text) -> dict:
+        if not isinstance(text, str) or not text.strip():
+            return {"error": "text must be a non-empty string."}
+        nodes, relationships, failed = await extract_text(kgrag, text)
+        result = {
+            "nodes": nodes,
+            "relationships": relationships,
+            "failed_chunks": failed_chunks(failed),
+        }
+        if persist:
+            result["persisted"] = await persist_graph(
+                kgrag,
+                nodes,
+                relationships,
+                ctx
+            )
+        return result
+
+    results = await run_batch(texts, extract_one)
+    await ctx.info(f"Extracted graph data from {len(texts)} texts")
+    return results
+
+
+@mcp.tool(
+    title="Query KGraph (batch)",
+    name="query_many",
+    description=(
+        "Query the KGraph system with a list of query strings in one call. "
+        "Answers are returned in input order."
+    )
+)
+@track_tool("query_many")
+@admission.admit("query_many")
+async def query_many(
+    prompts: list[str],
+    ctx: Context
+) -> list[dict]:
+    """
+    Answer a batch of prompts.
+    Args:
+        prompts (list[str]): The prompts.
+        ctx (Context): Context for logging and reporting progress.
+    Returns:
+        list[dict]: For each prompt, its ``answer`` or an ``error``.
+    """
+    if len(prompts) > settings.BATCH_MAX_ITEMS:
+        return [{"error": f"At most {settings.BATCH_MAX_ITEMS} prompts."}]
+
+    kgrag = await backend.get()
+    valid = [p for p in prompts if isinstance(p, str) and p.strip()]
+    if answer_cache is not None and valid:
+        # One embedding request for the semantic lookups of the batch
+        await answer_cache.prime(valid, kgrag.model_embedding.embed_documents)
+
+    async def query_one(prompt) -> dict:
+        if not isinstance(prompt, str) or not prompt.strip():
+            return {"error": "query must be a non-empty string."}
+        return {"answer": await answer_query(prompt, ctx)}
+
+    return await run_batch(prompts, query_one)
 
 
 @mcp.tool(
     title="Ingest",
     name="ingestion",
-    description="Ingest a path of file into the KGraph system."
+    description=(
+        "Ingest a file, a directory or a glob pattern of files "
+        "into the KGraph system."
+    )
 )
+@track_tool("ingestion")
+@admission.admit("ingestion")
 async def ingestion(
     path: str,
-    ctx: Context
+    ctx: Context,
+    workers: int | None = None,
+    force: bool = False
 ):
     """
-    Ingest a document into the KGraph system.
+    Ingest one or more documents into the KGraph system.
     Args:
-        args (dict): Arguments containing the path to the document.
-            - path (str): Path to the document file to be ingested.
+        path (str): Path to a document, a directory (walked recursively),
+            a glob pattern such as ``/data/**/*.pdf``, or the same on S3
+            (``s3://bucket/prefix/``).
         ctx (Context): Context for logging and reporting progress.
+        workers (int, optional): Number of documents ingested
+            concurrently. Defaults to ``INGESTION_WORKERS``.
+        force (bool): Reprocess documents even if the ingestion
+            manifest reports them as unchanged.
     Returns:
-        str: Confirmation message indicating successful ingestion.
+        str: Confirmation message, or a summary of the batch
+            with the files that failed.
     """
 
     if not isinstance(path, str):
         return "path_file must be a string."
     if not path.strip():
         return "path_file cannot be an empty string."
-    if not os.path.exists(path):
+
+    files = await asyncio.to_thread(collect_files, path)
+    if not files:
         return f"File {path} does not exist."
 
-    async for d in kgrag.process_documents(
-        path=path,
-        force=True
+    kgrag = await backend.get()
+    total = len(files)
+    failed: list[str] = []
+    skipped = 0
+    completed = 0
+    async for event in ingest_paths(
+        kgrag,
+        files,
+        workers=workers,
+        manifest=manifest,
+        force=force
     ):
-        if d == "ERROR":
+        await invalidate_answers(event)
+        status = event["status"]
+        prefix = f"[{event['index']}/{total}] {event['path']}"
+        if status == "progress":
+            await ctx.info(f"{prefix}: {event['message']}")
+        elif status == "skipped":
+            skipped += 1
+            await ctx.info(f"{prefix}: unchanged, skipped")
+        elif status == "error":
+            failed.append(event["path"])
+            await ctx.error(f"{prefix}: {event['message']}")
+        if status in ("done", "skipped", "error"):
+            completed += 1
+            await ctx.report_progress(completed, total)
+
+    if total == 1:
+        if failed:
             return f"Error processing document {path}."
-        await ctx.info(f"{d}")
-    return f"Document {path} ingested successfully."
+        if skipped:
+            return f"Document {path} is unchanged, skipped."
+        return f"Document {path} ingested successfully."
 
-# Mount the SSE server to the existing ASGI server
-app = Starlette(
-    routes=[
-        Route(
-            "/healthz",
-            endpoint=health
-        ),
+    ingested = total - len(failed) - skipped
+    summary = (
+        f"Ingested {ingested}/{total} documents from {path} "
+        f"({skipped} unchanged)."
+    )
+    if failed:
+        summary += " Failed: " + ", ".join(failed)
+    return summary
+
+
+@mcp.tool(
+    title="Submit Ingestion Job",
+    name="submit_ingestion",
+    description=(
+        "Submit the ingestion of a file, a directory or a glob pattern "
+        "as a background job and return its id immediately."
+    )
+)
+async def submit_ingestion(
+    path: str,
+    ctx: Context,
+    workers: int | None = None,
+    force: bool = False
+) -> dict:
+    """
+    Submit a background ingestion job.
+    Args:
+        path (str): Path to a document, a directory or a glob pattern,
+            local or on S3 (``s3://bucket/prefix/``).
+        ctx (Context): Context for logging and reporting progress.
+        workers (int, optional): Number of documents ingested
+            concurrently by the job.
+        force (bool): Reprocess documents even if unchanged.
+    Returns:
+        dict: The job id and status, or an error message.
+    """
+    if not isinstance(path, str) or not path.strip():
+        return {"error": "path must be a non-empty string."}
+    if not await asyncio.to_thread(collect_files, path):
+        return {"error": f"File {path} does not exist."}
+
+    job_id = await jobs.submit(
+        "ingestion",
+        {"path": path, "workers": workers, "force": force}
+    )
+    await ctx.info(f"Submitted ingestion job {job_id} for {path}")
+    return {"job_id": job_id, "status": "queued"}
+
+
+@mcp.tool(
+    title="Job Status",
+    name="job_status",
+    description="Get the status and per-file progress of an ingestion job."
+)
+async def job_status(job_id: str) -> dict:
+    """
+    Get the status of a background job.
+    Args:
+        job_id (str): The job id returned by ``submit_ingestion``.
+    Returns:
+        dict: The job, or an error message if unknown.
+    """
+    job = await jobs.get(job_id)
+    if job is None:
+        return {"error": f"Job {job_id} not found."}
+    return job
+
+
+@mcp.tool(
+    title="List Jobs",
+    name="list_jobs",
+    description="List the most recent ingestion jobs."
+)
+async def list_jobs(
+    status: str | None = None,
+    limit: int = 20
+) -> list[dict]:
+    """
+    List background jobs.
+    Args:
+        status (str, optional): Only return jobs in this status
+            (queued, running, done, failed, cancelled).
+        limit (int): Maximum number of jobs returned.
+    Returns:
+        list[dict]: The jobs, newest first.
+    """
+    return await jobs.list_jobs(status=status, limit=limit)
+
+
+@mcp.tool(
+    title="Cancel Job",
+    name="cancel_job",
+    description="Cancel a queued or running ingestion job."
+)
+async def cancel_job(job_id: str) -> dict:
+    """
+    Cancel a background job.
+    Args:
+        job_id (str): The job id.
+    Returns:
+        dict: The job after the cancellation request,
+            or an error message if unknown.
+    """
+    job = await jobs.cancel(job_id)
+    if job is None:
+        return {"error": f"Job {job_id} not found."}
+    return job
+
+
+@mcp.tool(
+    title="Export Snapshot",
+    name="export_snapshot",
+    description=(
+        "Export the vector collection, the knowledge graph and the "
+        "ingestion manifest to a snapshot bundle on the server, to "
+        "bootstrap another environment without ingesting again."
+    )
+)
+@track_tool("export_snapshot")
+@admission.admit("snapshot")
+async def export_snapshot(ctx: Context) -> dict:
+    """
+    Export the knowledge base to a bundle in ``SNAPSHOT_PATH``.
+    Args:
+        ctx (Context): Context for logging.
+    Returns:
+        dict: The path of the bundle and its descriptor (format,
+            embedding model, counts, checksums), or an error message.
+    """
+    for status in ("queued", "running"):
+        if await jobs.list_jobs(status=status, limit=1):
+            return {
+                "error": "Ingestion jobs are active: export once they "
+                "are done for a consistent snapshot."
+            }
+
+    from snapshot import export_snapshot as export_bundle
+
+    kgrag = await backend.get()
+    result = await export_bundle(kgrag, manifest)
+    await ctx.info(f"Exported snapshot {result['path']}: {result['counts']}")
+    return result
+
+
+@mcp.tool(
+    title="Import Snapshot",
+    name="import_snapshot",
+    description=(
+        "Restore the vector collection, the knowledge graph and the "
+        "ingestion manifest from a snapshot bundle on the server."
+    )
+)
+@track_tool("import_snapshot")
+@admission.admit("snapshot")
+async def import_snapshot(
+    path: str,
+    ctx: Context,
+    replace: bool = False,
+    force: bool = False
+) -> dict:
+    """
+    Import a bundle written by ``export_snapshot``.
+    Args:
+        path (str): Path of the bundle on the server.
+        ctx (Context): Context for logging.
+        replace (bool): Overwrite a knowledge base that is not empty.
+        force (bool): Accept a bundle embedded with another model.
+    Returns:
+        dict: The descriptor of the bundle and the restored counts, or
+            an error message.
+    """
+    if not isinstance(path, str) or not os.path.isfile(path):
+        return {"error": f"Snapshot {path} does not exist."}
+
+    from snapshot import import_snapshot as import_bundle
+
+    kgrag = await backend.get()
+    result = await import_bundle(
+        kgrag,
+        manifest,
+        path,
+        replace=replace,
+        force=force
+    )
+    if answer_cache is not None:
+        await answer_cache.invalidate()
+    await ctx.info(
+        f"Imported snapshot {path} in {result['seconds']}s: "
+        f"{result['counts']}"
+    )
+    return result
+
+
+MCP_TRANSPORTS = ("sse", "streamable-http", "all")
+if settings.MCP_TRANSPORT not in MCP_TRANSPORTS:
+    raise RuntimeError(
+        f"Unsupported MCP_TRANSPORT: {settings.MCP_TRANSPORT!r}. "
+        "Expected 'sse', 'streamable-http' or 'all'."
+    )
+streamable_http = settings.MCP_TRANSPORT in ("streamable-http", "all")
+sse = settings.MCP_TRANSPORT in ("sse", "all")
+
+
+@asynccontextmanager
+async def lifespan(_):
+    """
+    Warm up the KGrag backend in the background and start the span
+    exporter, the job workers and the streamable HTTP session manager
+    with the ASGI server; stop them and the parse pool on shutdown.
+    """
+    settings.log_summary()
+    start_tracing()
+    backend.start_warm_up()
+    await jobs.start()
+    try:
+        if streamable_http:
+            async with mcp.session_manager.run():
+                yield
+        else:
+            yield
+    finally:
+        await jobs.stop()
+        await backend.stop()
+        await asyncio.to_thread(shutdown_parse_pool)
+        await asyncio.to_thread(stop_tracing)
+
+routes = [
+    Route(
+        "/healthz",
+        endpoint=health
+    ),
+    Route(
+        "/readyz",
+        endpoint=ready
+    ),
+    Route(
+        "/metrics",
+        endpoint=metrics
+    ),
+]
+if streamable_http:
+    # Streamable HTTP endpoint at /mcp
+    routes.extend(mcp.streamable_http_app().routes)
+if sse:
+    # Mount the SSE server (/sse and /messages/) to the existing ASGI server
+    routes.append(
         Mount(
             "/",
             app=mcp.sse_app()
-        ),
-    ]
+        )
+    )
+
+app = Starlette(
+    lifespan=lifespan,
+    routes=routes
 )
+
+
+# Run by profile_startup in a fresh interpreter: each phase up to the
+# first /healthz response, printed as JSON
+PROFILE_STARTUP = """
+import asyncio, json, os, time
+started = time.perf_counter()
+import config
+phases = {"settings": time.perf_counter() - started}
+mark = time.perf_counter()
+import server
+phases["server"] = time.perf_counter() - mark
+
+async def first_health():
+    import httpx
+    mark = time.perf_counter()
+    async with server.lifespan(server.app):
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(
+            transport=transport,
+            base_url="http://startup"
+        ) as client:
+            (await client.get("/healthz")).raise_for_status()
+        phases["lifespan"] = time.perf_counter() - mark
+        print(json.dumps(phases), flush=True)
+        # The warm-up may still wait on the services: skip the shutdown
+        os._exit(0)
+
+asyncio.run(first_health())
+"""
+
+
+def profile_startup() -> int:
+    """
+    Time the startup of the server in a fresh interpreter, up to the
+    first ``/healthz`` response: loading the ``settings``, importing the
+    ``server`` and setting up its routes, then starting the
+    ``lifespan`` and answering ``/healthz``.
+    Returns:
+        int: The exit status, 1 if the startup is over
+            ``STARTUP_BUDGET_SECONDS``.
+    """
+    result = subprocess.run(
+        [sys.executable, "-c", PROFILE_STARTUP],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True,
+        text=True
+    )
+    lines = [
+        line for line in result.stdout.splitlines() if line.startswith("{")
+    ]
+    if result.returncode != 0 or not lines:
+        print(result.stderr.strip(), file=sys.stderr)
+        return 1
+    phases = json.loads(lines[-1])
+    for name, seconds in phases.items():
+        print(f"{name:>10}: {seconds:.3f}s")
+    total = sum(phases.values())
+    print(f"{'total':>10}: {total:.3f}s")
+    if total > settings.STARTUP_BUDGET_SECONDS:
+        print(
+            f"WARNING: /healthz answered after {total:.2f}s, over the "
+            f"budget of {settings.STARTUP_BUDGET_SECONDS}s"
+        )
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="KGraph MCP Server, served with `uvicorn server:app`."
+    )
+    parser.add_argument(
+        "--profile-startup",
+        action="store_true",
+        help="time the startup phases up to the first /healthz response "
+        "and exit, with status 1 over STARTUP_BUDGET_SECONDS"
+    )
+    args = parser.parse_args()
+    if not args.profile_startup:
+        parser.error("nothing to do: serve the app with uvicorn server:app")
+    sys.exit(profile_startup())
@@ -0,0 +1,94 @@
+"""Coalescing of identical in-flight requests.
+
+Concurrent calls with the same key share one computation: the first call
+starts it as a task and every caller, including later duplicates, awaits
+that task and receives its result or its exception. Each caller is
+counted as a waiter; a caller that is cancelled stops waiting without
+affecting the others, and the computation is cancelled only when no
+waiter is left.
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Hashable
+from metrics import Counter
+
+COALESCED_REQUESTS = Counter(
+    "kgrag_coalesced_requests_total",
+    "Calls served by an identical computation already in flight.",
+    ("kind",)
+)
+
+
+class _Call:
+    """
+    A computation in flight and the number of callers waiting for it.
+    """
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Registry of in-flight computations keyed by request.
+    """
+
+    def __init__(self):
+        self._calls: dict[Hashable, _Call] = {}
+
+    def waiters(self, key: Hashable) -> int:
+        """
+        Get the number of callers waiting for a computation.
+        Args:
+            key (Hashable): The request key.
+        Returns:
+            int: The waiters, 0 if nothing is in flight for the key.
+        """
+        call = self._calls.get(key)
+        return call.waiters if call is not None else 0
+
+    def in_flight(self) -> int:
+        """
+        Get the number of computations in flight.
+        Returns:
+            int: The computations.
+        """
+        return len(self._calls)
+
+    def _forget(self, key: Hashable, call: _Call) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    async def do(
+        self,
+        key: Hashable,
+        func: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        """
+        Run ``func`` once for all the concurrent callers of ``key``.
+        Args:
+            key (Hashable): The request key. The first element is used
+                as the ``kind`` label of the metrics if it is a tuple.
+            func (Callable): Coroutine function computing the result.
+        Returns:
+            Any: The result of the shared computation.
+        """
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.ensure_future(func()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _: self._forget(key, call))
+        else:
+            kind = key[0] if isinstance(key, tuple) else "default"
+            COALESCED_REQUESTS.inc(kind=str(kind))
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                # The last caller gave up: nobody needs the result
+                self._forget(key, call)
+                call.task.cancel()
@@ -0,0 +1,349 @@
+"""Knowledge base snapshots.
+
+Bringing up a replica by ingesting the corpus again repeats every LLM
+extraction and embedding. ``export_snapshot`` writes what ingestion produced
+for the collection to one versioned bundle instead: a Qdrant snapshot of the
+collection, the Neo4j graph as compressed JSON Lines and the entries of the
+ingestion manifest, described by a ``snapshot.json`` (format version,
+embedding model, counts and checksums). ``import_snapshot`` restores a
+bundle with bulk loaders: the Qdrant snapshot is uploaded as is, the graph
+is loaded with batched ``UNWIND ... CREATE`` statements and the manifest
+with pipelined Redis writes, so that the documents of the bundle are then
+skipped as unchanged.
+
+The manifest entries are exported first: a document recorded there has its
+chunks in the graph and the collection even if an ingestion runs during the
+export. The server refuses to export while ingestion jobs are active.
+"""
+
+import asyncio
+import gzip
+import json
+import os
+import shutil
+import tarfile
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Any, Iterable, Iterator
+import httpx
+from config import settings
+from graph_writer import clear_graph, ensure_graph_schema, load_graph
+from log import logger
+from manifest import IngestionManifest
+from metrics import stage
+from parsing import hash_file
+
+FORMAT_VERSION = 1
+
+DESCRIPTOR = "snapshot.json"
+COLLECTION_FILE = "collection.snapshot"
+NODES_FILE = "nodes.jsonl.gz"
+RELATIONSHIPS_FILE = "relationships.jsonl.gz"
+MANIFEST_FILE = "manifest.jsonl.gz"
+BUNDLE_FILES = (COLLECTION_FILE, NODES_FILE, RELATIONSHIPS_FILE, MANIFEST_FILE)
+
+NODES_QUERY = "MATCH (n:Entity) RETURN n.id AS id, n.name AS name"
+RELATIONSHIPS_QUERY = """
+MATCH (a:Entity)-[r:RELATIONSHIP]->(b:Entity)
+RETURN a.id AS source, b.id AS target, r.type AS type
+"""
+COUNT_QUERY = "MATCH (n:Entity) RETURN count(n) AS count"
+
+# Snapshot transfers can take minutes: only connecting is bounded
+HTTP_TIMEOUT = httpx.Timeout(30.0, read=None, write=None)
+
+
+def _write_jsonl(path: str, rows: Iterable[dict]) -> int:
+    count = 0
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        for row in rows:
+            f.write(json.dumps(row, default=str) + "\n")
+            count += 1
+    return count
+
+
+def _read_jsonl(path: str) -> Iterator[dict]:
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _export_graph(driver: Any, query: str, path: str) -> int:
+    """
+    Stream the records of a read query to a JSON Lines file.
+    """
+    with driver.session() as session:
+        return _write_jsonl(path, (dict(r) for r in session.run(query)))
+
+
+def _count_entities(driver: Any) -> int:
+    with driver.session() as session:
+        return session.run(COUNT_QUERY).single()["count"]
+
+
+def _collection_url(collection_name: str) -> str:
+    return f"{settings.QDRANT_URL.rstrip('/')}/collections/{collection_name}"
+
+
+def _download_collection(collection_name: str, path: str) -> None:
+    """
+    Create a snapshot of a Qdrant collection, download it and delete it
+    from the Qdrant server.
+    """
+    url = f"{_collection_url(collection_name)}/snapshots"
+    with httpx.Client(timeout=HTTP_TIMEOUT) as client:
+        response = client.post(url, params={"wait": "true"})
+        response.raise_for_status()
+        name = response.json()["result"]["name"]
+        try:
+            with client.stream("GET", f"{url}/{name}") as response:
+                response.raise_for_status()
+                with open(path, "wb") as f:
+                    for block in response.iter_bytes(1 << 20):
+                        f.write(block)
+        finally:
+            client.delete(f"{url}/{name}")
+
+
+def _upload_collection(collection_name: str, path: str) -> None:
+    """
+    Restore a Qdrant collection from a snapshot file, replacing its
+    points; the collection is created if missing.
+    """
+    url = f"{_collection_url(collection_name)}/snapshots/upload"
+    with httpx.Client(timeout=HTTP_TIMEOUT) as client:
+        with open(path, "rb") as f:
+            response = client.post(
+                url,
+                params={"wait": "true", "priority": "snapshot"},
+                files={"snapshot": (COLLECTION_FILE, f)}
+            )
+        response.raise_for_status()
+
+
+async def export_snapshot(
+    kgrag: Any,
+    manifest: IngestionManifest,
+    directory: str | None = None
+) -> dict[str, Any]:
+    """
+    Export the collection, the graph and the ingestion manifest to a
+    bundle.
+    Args:
+        kgrag (Any): The KGrag instance.
+        manifest (IngestionManifest): The ingestion manifest.
+        directory (str, optional): Where the bundle is written. Defaults
+            to ``settings.SNAPSHOT_PATH``.
+    Returns:
+        dict: The ``path`` of the bundle and its descriptor.
+    """
+    started = time.perf_counter()
+    collection_name = kgrag._get_collection_name()
+    directory = directory or settings.SNAPSHOT_PATH
+    os.makedirs(directory, exist_ok=True)
+    created_at = datetime.now(timezone.utc)
+    bundle = os.path.join(
+        directory,
+        f"{collection_name}-{created_at:%Y%m%dT%H%M%SZ}.tar"
+    )
+
+    with tempfile.TemporaryDirectory(dir=directory) as work:
+        # Manifest first, see the module docstring
+        with stage("snapshot_manifest"):
+            entries = [
+                {"path": path, "entry": entry}
+                async for path, entry in manifest.entries()
+            ]
+            documents = await asyncio.to_thread(
+                _write_jsonl,
+                os.path.join(work, MANIFEST_FILE),
+                entries
+            )
+        with stage("snapshot_graph"):
+            nodes = await asyncio.to_thread(
+                _export_graph,
+                kgrag.neo4j_driver,
+                NODES_QUERY,
+                os.path.join(work, NODES_FILE)
+            )
+            relationships = await asyncio.to_thread(
+                _export_graph,
+                kgrag.neo4j_driver,
+                RELATIONSHIPS_QUERY,
+                os.path.join(work, RELATIONSHIPS_FILE)
+            )
+        with stage("snapshot_collection"):
+            points = await kgrag.qdrant_client_async.count(
+                collection_name,
+                exact=True
+            )
+            await asyncio.to_thread(
+                _download_collection,
+                collection_name,
+                os.path.join(work, COLLECTION_FILE)
+            )
+
+        descriptor = {
+            "format": FORMAT_VERSION,
+            "created_at": created_at.isoformat(),
+            "app_version": settings.APP_VERSION,
+            "collection_name": collection_name,
+            "embedding_model": settings.MODEL_EMBEDDING,
+            "counts": {
+                "points": points.count,
+                "nodes": nodes,
+                "relationships": relationships,
+                "documents": documents,
+            },
+            "sha256": {
+                name: await asyncio.to_thread(
+                    hash_file,
+                    os.path.join(work, name)
+                )
+                for name in BUNDLE_FILES
+            },
+        }
+        with open(os.path.join(work, DESCRIPTOR), "w") as f:
+            json.dump(descriptor, f, indent=2)
+
+        # Write next to the bundle and rename, so that a bundle on disk
+        # is always complete
+        partial = f"{bundle}.partial"
+        with tarfile.open(partial, "w") as tar:
+            for name in (DESCRIPTOR,) + BUNDLE_FILES:
+                tar.add(os.path.join(work, name), arcname=name)
+        os.replace(partial, bundle)
+
+    logger.info(
+        f"Exported snapshot {bundle} in "
+        f"{time.perf_counter() - started:.1f}s: {descriptor['counts']}"
+    )
+    return {"path": bundle, **descriptor}
+
+
+def _unpack(bundle: str, work: str) -> dict[str, Any]:
+    """
+    Extract the files of a bundle and check their checksums.
+    Returns:
+        dict: The descriptor of the bundle.
+    Raises:
+        ValueError: If the bundle is not a supported snapshot.
+    """
+    with tarfile.open(bundle) as tar:
+        for name in (DESCRIPTOR,) + BUNDLE_FILES:
+            # Only the known members are extracted, to paths of our own
+            try:
+                source = tar.extractfile(name)
+            except KeyError:
+                source = None
+            if source is None:
+                raise ValueError(f"{bundle} is not a snapshot: no {name}.")
+            with source, open(os.path.join(work, name), "wb") as f:
+                shutil.copyfileobj(source, f, 1 << 20)
+
+    with open(os.path.join(work, DESCRIPTOR)) as f:
+        descriptor = json.load(f)
+    if descriptor.get("format") != FORMAT_VERSION:
+        raise ValueError(
+            f"Unsupported snapshot format {descriptor.get('format')!r}, "
+            f"expected {FORMAT_VERSION}."
+        )
+    for name in BUNDLE_FILES:
+        if hash_file(os.path.join(work, name)) != descriptor["sha256"][name]:
+            raise ValueError(f"Checksum mismatch on {name} of {bundle}.")
+    return descriptor
+
+
+async def import_snapshot(
+    kgrag: Any,
+    manifest: IngestionManifest,
+    bundle: str,
+    replace: bool = False,
+    force: bool = False
+) -> dict[str, Any]:
+    """
+    Restore a bundle written by ``export_snapshot`` into the collection,
+    the graph and the ingestion manifest.
+    Args:
+        kgrag (Any): The KGrag instance.
+        manifest (IngestionManifest): The ingestion manifest.
+        bundle (str): Path of the bundle.
+        replace (bool): Replace the current graph and manifest; without
+            it the knowledge base must be empty.
+        force (bool): Import a bundle embedded with another model than
+            ``MODEL_EMBEDDING``.
+    Returns:
+        dict: The descriptor of the bundle, the restored ``counts`` and
+            the duration in ``seconds``.
+    Raises:
+        ValueError: If the bundle is invalid or was embedded with
+            another model.
+        RuntimeError: If the knowledge base is not empty.
+    """
+    started = time.perf_counter()
+    collection_name = kgrag._get_collection_name()
+    client = kgrag.qdrant_client_async
+    driver = kgrag.neo4j_driver
+    work_dir = os.path.dirname(os.path.abspath(bundle))
+
+    with tempfile.TemporaryDirectory(dir=work_dir) as work:
+        descriptor = await asyncio.to_thread(_unpack, bundle, work)
+        if descriptor["embedding_model"] != settings.MODEL_EMBEDDING:
+            if not force:
+                raise ValueError(
+                    f"The snapshot was embedded with "
+                    f"{descriptor['embedding_model']}, the server uses "
+                    f"{settings.MODEL_EMBEDDING}."
+                )
+            logger.warning(
+                f"Importing vectors of {descriptor['embedding_model']} "
+                f"into a server using {settings.MODEL_EMBEDDING}"
+            )
+
+        if replace:
+            await asyncio.to_thread(clear_graph, driver)
+            await manifest.clear()
+        elif (
+            await asyncio.to_thread(_count_entities, driver)
+            or await client.collection_exists(collection_name)
+            and (await client.count(collection_name)).count
+        ):
+            raise RuntimeError(
+                "The knowledge base is not empty: import with replace "
+                "to overwrite it."
+            )
+        await asyncio.to_thread(ensure_graph_schema, driver)
+
+        with stage("snapshot_collection"):
+            await asyncio.to_thread(
+                _upload_collection,
+                collection_name,
+                os.path.join(work, COLLECTION_FILE)
+            )
+            points = await client.count(collection_name, exact=True)
+        with stage("snapshot_graph"):
+            graph = await asyncio.to_thread(
+                load_graph,
+                driver,
+                _read_jsonl(os.path.join(work, NODES_FILE)),
+                _read_jsonl(os.path.join(work, RELATIONSHIPS_FILE))
+            )
+        # Manifest last: an interrupted import leaves the documents to be
+        # ingested again rather than skipped
+        with stage("snapshot_manifest"):
+            documents = await manifest.restore(
+                (row["path"], row["entry"])
+                for row in _read_jsonl(os.path.join(work, MANIFEST_FILE))
+            )
+
+    seconds = round(time.perf_counter() - started, 1)
+    counts = {
+        "points": points.count,
+        "nodes": graph["nodes"],
+        "relationships": graph["relationships"],
+        "documents": documents,
+    }
+    logger.info(f"Imported snapshot {bundle} in {seconds}s: {counts}")
+    return {**descriptor, "counts": counts, "seconds": seconds}
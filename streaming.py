@@ -0,0 +1,65 @@
+"""Streamed answers.
+
+``KGrag.query`` returns the answer once the LLM is done. ``stream_answer``
+runs the same pipeline with ``KGrag._stream`` instead, and hands the
+answer to a callback as sentence-sized deltas while it is generated, so
+that a client sees the first sentence after the time-to-first-token
+rather than after the full generation.
+"""
+
+import asyncio
+import re
+from typing import Any, Awaitable, Callable
+from metrics import stage
+
+# A delta is sent at the end of a sentence or line, or once it is this long
+MAX_DELTA_CHARS = 200
+
+_BOUNDARY = re.compile(r"[.!?;:]\s*$|\n\s*$")
+
+
+async def stream_answer(
+    kgrag: Any,
+    prompt: str,
+    send: Callable[[str, int], Awaitable[None]]
+) -> str:
+    """
+    Answer a prompt, sending the answer while it is generated.
+    Args:
+        kgrag (Any): The KGrag instance.
+        prompt (str): The prompt.
+        send (Callable): Coroutine function called with each delta and
+            the number of characters generated so far.
+    Returns:
+        str: The full answer.
+    """
+    graph_context = await asyncio.to_thread(kgrag._get_graph_context, prompt)
+
+    parts: list[str] = []
+    pending = ""
+    size = 0
+    deltas = 0
+    with stage("llm_generate") as current:
+        async for token in kgrag._stream(
+            graph_context=graph_context,
+            user_query=prompt
+        ):
+            if not token:
+                continue
+            parts.append(token)
+            pending += token
+            size += len(token)
+            if len(pending) >= MAX_DELTA_CHARS or _BOUNDARY.search(pending):
+                await send(pending, size)
+                deltas += 1
+                pending = ""
+        if pending:
+            await send(pending, size)
+            deltas += 1
+        current.set_attributes(
+            context_chars=len(str(graph_context)),
+            tokens=len(parts),
+            answer_chars=size,
+            deltas=deltas
+        )
+    return "".join(parts)
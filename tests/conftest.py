@@ -0,0 +1,59 @@
+"""Shared fixtures.
+
+The tests run offline: the KGrag instance is the benchmark stand-in
+(``benchmarks.fakes``) with an in-memory Qdrant and graph, and Redis is
+replaced by fakeredis.
+"""
+
+import os
+import sys
+
+# Parse in a thread: the parse pool would re-import the test modules
+os.environ.setdefault("PARSE_WORKERS", "0")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import fakeredis  # noqa: E402
+import pytest  # noqa: E402
+from benchmarks.fakes import BenchKGrag  # noqa: E402
+from graph_writer import with_batched_graph_writes  # noqa: E402
+from kgrag_config import redis_config  # noqa: E402
+from manifest import IngestionManifest  # noqa: E402
+
+
+@pytest.fixture
+def kgrag():
+    return with_batched_graph_writes(BenchKGrag())
+
+
+@pytest.fixture
+def manifest():
+    manifest = IngestionManifest(redis_config)
+    manifest.redis = fakeredis.aioredis.FakeRedis(decode_responses=True)
+    return manifest
+
+
+async def collect(agen) -> list:
+    """
+    Run an async generator to completion and return what it yielded.
+    """
+    return [item async for item in agen]
+
+
+def points(kgrag, **payload) -> list:
+    """
+    Get the Qdrant points of the collection, with the given payload.
+    """
+    if not kgrag.qdrant_client.collection_exists(kgrag.collection_name):
+        return []
+    found, _ = kgrag.qdrant_client.scroll(
+        kgrag.collection_name,
+        limit=10000,
+        with_payload=True
+    )
+    return [
+        p for p in found
+        if all(p.payload.get(k) == v for k, v in payload.items())
+    ]
@@ -0,0 +1,121 @@
+import asyncio
+import pytest
+from admission import BULK, INTERACTIVE, Admission, Busy, PriorityLimiter
+
+
+def within(aw, seconds: float = 1.0):
+    """
+    Bound a wait, so that a leaked slot fails the test instead of
+    hanging it.
+    """
+    return asyncio.wait_for(aw, seconds)
+
+
+async def settle() -> None:
+    """
+    Let the tasks scheduled so far run until they block.
+    """
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_bulk_waiters_are_served_after_interactive_ones():
+    async def scenario():
+        limiter = PriorityLimiter("llm", 1)
+        served = []
+
+        async def call(name, priority):
+            async with limiter.slot(priority):
+                served.append(name)
+
+        await limiter.acquire()
+        tasks = [
+            asyncio.create_task(call("bulk-1", BULK)),
+            asyncio.create_task(call("bulk-2", BULK)),
+            asyncio.create_task(call("query", INTERACTIVE)),
+        ]
+        await settle()
+        assert limiter.waiting == 3
+        limiter.release()
+        await within(asyncio.gather(*tasks))
+        return served, limiter
+
+    served, limiter = asyncio.run(scenario())
+    assert served == ["query", "bulk-1", "bulk-2"]
+    assert (limiter.active, limiter.waiting) == (0, 0)
+
+
+def test_cancelled_waiter_gives_up_its_place():
+    async def scenario():
+        limiter = PriorityLimiter("llm", 1)
+        await limiter.acquire()
+        waiter = asyncio.create_task(limiter.acquire(BULK))
+        await settle()
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        state = (
+            limiter.active,
+            limiter.waiting,
+            list(limiter._waiters.get(BULK, ()))
+        )
+        limiter.release()
+        return state, limiter
+
+    state, limiter = asyncio.run(scenario())
+    assert state == (1, 0, [])
+    assert (limiter.active, limiter.waiting) == (0, 0)
+
+
+def test_waiter_cancelled_once_granted_passes_the_slot_on():
+    async def scenario():
+        limiter = PriorityLimiter("llm", 1)
+        await limiter.acquire()
+        granted = asyncio.create_task(limiter.acquire())
+        later = asyncio.create_task(limiter.acquire())
+        await settle()
+        # The slot goes to the first waiter, cancelled before it resumes
+        limiter.release()
+        granted.cancel()
+        results = await within(
+            asyncio.gather(granted, later, return_exceptions=True)
+        )
+        state = (limiter.active, limiter.waiting)
+        limiter.release()
+        return results, state, limiter
+
+    results, state, limiter = asyncio.run(scenario())
+    assert isinstance(results[0], asyncio.CancelledError)
+    assert results[1] is None
+    # Neither leaked (2) nor freed twice (0)
+    assert state == (1, 0)
+    assert (limiter.active, limiter.waiting) == (0, 0)
+
+
+def test_full_queue_rejects_with_retry_after():
+    admission = Admission({"query": 1, "snapshot": 0}, max_waiting=1)
+    limiter = admission.limiters["query"]
+    release = asyncio.Event()
+
+    @admission.admit("query")
+    async def query():
+        await release.wait()
+        return "answer"
+
+    async def scenario():
+        # One call of 10s makes the service time 2s (moving average)
+        await limiter.acquire()
+        limiter.release(service_time=10)
+        running = asyncio.create_task(query())
+        waiting = asyncio.create_task(query())
+        await settle()
+        with pytest.raises(Busy) as rejected:
+            await query()
+        release.set()
+        return rejected.value, await within(asyncio.gather(running, waiting))
+
+    busy, answers = asyncio.run(scenario())
+    assert busy.pool == "query"
+    # One call waiting and one to run, at 2s per round of one slot
+    assert busy.retry_after == 4
+    assert answers == ["answer", "answer"]
+    assert "snapshot" not in admission.limiters
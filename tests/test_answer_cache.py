@@ -0,0 +1,89 @@
+import asyncio
+import fakeredis
+from answer_cache import AnswerCache, MemoryAnswerBackend, RedisAnswerBackend
+from kgrag_config import redis_config
+
+VECTORS = {
+    "who founded acme?": [1.0, 0.0, 0.0],
+    "who is the founder of acme?": [0.99, 0.1, 0.0],
+    "where is acme?": [0.0, 1.0, 0.0],
+    "what does acme sell?": [0.0, 0.0, 1.0],
+}
+
+
+def embed(text: str) -> list[float]:
+    return VECTORS[text]
+
+
+def redis_cache(server) -> AnswerCache:
+    backend = RedisAnswerBackend(redis_config, max_size=100, ttl=60)
+    backend.redis = fakeredis.aioredis.FakeRedis(
+        server=server,
+        decode_responses=True
+    )
+    return AnswerCache(backend, embed=embed, similarity=0.95)
+
+
+def test_semantic_hit_from_memory():
+    cache = AnswerCache(
+        MemoryAnswerBackend(max_size=10, ttl=60),
+        embed=embed,
+        similarity=0.95
+    )
+
+    async def scenario():
+        await cache.set("Who founded Acme?", "Ada")
+        return (
+            await cache.get("Who is the founder of  ACME?"),
+            await cache.get("Where is Acme?"),
+        )
+
+    assert asyncio.run(scenario()) == ("Ada", None)
+    assert cache.stats() == {"hits_exact": 0, "hits_semantic": 1, "misses": 1}
+
+
+def test_misses_do_not_read_every_entry():
+    server = fakeredis.FakeServer()
+    writer, reader = redis_cache(server), redis_cache(server)
+    reads: list[int] = []
+    mget = reader.backend.redis.mget
+
+    async def counted_mget(keys, *args):
+        reads.append(len(keys))
+        return await mget(keys, *args)
+    reader.backend.redis.mget = counted_mget
+
+    async def scenario():
+        await writer.set("Where is Acme?", "Bari")
+        await writer.set("What does Acme sell?", "Anvils")
+        assert await reader.get("Who founded Acme?") is None
+        assert await reader.get("Who founded Acme?") is None
+        # Stored by another process, read at the next refresh
+        await writer.set("Who founded Acme?", "Ada")
+        reader._index.refreshed_at -= reader.refresh_seconds
+        answer = await reader.get("Who is the founder of Acme?")
+        await writer.invalidate()
+        stale = await reader.get("Who is the founder of Acme?")
+        return answer, stale
+
+    assert asyncio.run(scenario()) == ("Ada", None)
+    # The index is loaded once, then only with the new entry
+    assert reads == [2, 1]
+
+
+def test_evicted_entry_is_dropped_from_the_index():
+    cache = AnswerCache(
+        MemoryAnswerBackend(max_size=1, ttl=60),
+        embed=embed,
+        similarity=0.95
+    )
+
+    async def scenario():
+        assert await cache.get("What does Acme sell?") is None
+        await cache.set("Who founded Acme?", "Ada")
+        await cache.set("Where is Acme?", "Bari")
+        indexed = len(cache._index)
+        return indexed, await cache.get("Who is the founder of Acme?")
+
+    assert asyncio.run(scenario()) == (2, None)
+    assert len(cache._index) == 1
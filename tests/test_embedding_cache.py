@@ -0,0 +1,86 @@
+import types
+import fakeredis
+import pytest
+import embedding_cache
+from benchmarks.fakes import FakeEmbeddings
+from embedding_cache import CachedEmbeddings, pack_vector, unpack_vector
+
+
+@pytest.fixture
+def server():
+    return fakeredis.FakeServer()
+
+
+def cached(server, model_name: str = "model-a", max_size: int = 2):
+    """
+    A cache of ``max_size`` LRU entries in front of a fake model, with
+    its Redis tier on ``server``.
+    """
+    cache = CachedEmbeddings(
+        FakeEmbeddings(8),
+        model_name=model_name,
+        max_size=max_size
+    )
+    cache.redis = fakeredis.FakeRedis(server=server)
+    return cache
+
+
+def test_pack_vector_round_trips_as_float32():
+    vector = [0.5, -1.25, 3.0]
+    data = pack_vector(vector)
+    assert len(data) == 4 * len(vector)
+    assert unpack_vector(data) == vector
+    assert unpack_vector(pack_vector([0.1]))[0] == pytest.approx(0.1)
+
+
+def test_lookups_hit_the_lru_then_redis(server):
+    cache = cached(server)
+    first = cache.embed_query("alpha")
+    assert cache.embeddings.calls == 1
+
+    assert cache.embed_query("alpha") == first
+    assert cache.embeddings.calls == 1
+
+    # Evict "alpha" from the LRU, not from Redis
+    cache.embed_documents(["beta", "gamma"])
+    assert cache._key("alpha") not in cache._lru
+    calls = cache.embeddings.calls
+    assert cache.embed_query("alpha") == pytest.approx(first)
+    assert cache.embeddings.calls == calls
+    assert cache._key("alpha") in cache._lru
+
+
+def test_keys_depend_on_the_model_and_the_text(server):
+    cache = cached(server)
+    key = cache._key("alpha")
+    assert key != cache._key("beta")
+    assert key != cached(server, "model-b")._key("alpha")
+
+    cache.embed_query("alpha")
+    other = cached(server, "model-b")
+    other.embed_query("alpha")
+    assert other.embeddings.calls == 1
+
+
+def test_a_failing_redis_falls_through_to_the_model(server, monkeypatch):
+    clock = types.SimpleNamespace(now=100.0)
+    monkeypatch.setattr(
+        embedding_cache.time,
+        "monotonic",
+        lambda: clock.now
+    )
+    cache = cached(server)
+    server.connected = False
+    vectors = cache.embed_documents(["alpha", "beta"])
+    assert vectors == FakeEmbeddings(8).embed_documents(["alpha", "beta"])
+    assert cache.embeddings.calls == 1
+
+    # Redis is skipped during the back-off, even once it is back
+    server.connected = True
+    clock.now += 29
+    cache.embed_query("gamma")
+    assert not cache.redis.exists(cache._key("gamma"))
+
+    clock.now += 2
+    cache.embed_query("delta")
+    assert cache.redis.exists(cache._key("delta"))
@@ -0,0 +1,38 @@
+import asyncio
+import pytest
+from extraction import extract_graph
+
+
+class FlakyKGrag:
+    """
+    Extracts one node per chunk and fails on the chunks containing
+    ``fail``.
+    """
+
+    async def extract_graph_components(self, text):
+        if "fail" in text:
+            raise ValueError("unparsable LLM output")
+        name = text.split()[0]
+        return {name: f"id-{name}"}, []
+
+
+def test_failed_chunks_are_reported():
+    chunks = ["Alpha " * 20, "fail " * 20, "Gamma " * 20, "fail " * 20]
+    nodes, relationships, failed = asyncio.run(extract_graph(
+        FlakyKGrag(),
+        "\n\n".join(chunks),
+        chunk_size=130,
+        overlap=0
+    ))
+    assert set(nodes) == {"Alpha", "Gamma"}
+    assert failed == [1, 3]
+
+
+def test_every_chunk_failing_raises():
+    with pytest.raises(ValueError):
+        asyncio.run(extract_graph(
+            FlakyKGrag(),
+            "fail " * 100,
+            chunk_size=130,
+            overlap=0
+        ))
@@ -0,0 +1,115 @@
+import pytest
+from config import settings
+from graph_writer import (
+    MERGE_NODES,
+    MERGE_RELATIONSHIPS,
+    with_batched_graph_writes,
+    write_graph,
+    written_entities,
+)
+
+
+class FakeResult:
+    def __init__(self, records: list[dict], **counters: int):
+        self.records = records
+        self.counters = self
+        self.nodes_created = counters.get("nodes_created", 0)
+        self.relationships_created = counters.get(
+            "relationships_created",
+            0
+        )
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def consume(self) -> "FakeResult":
+        return self
+
+
+class FakeSession:
+    """
+    Session recording the batches it runs. Entities listed in
+    ``existing`` are merged into rather than created, as ``ON CREATE``
+    does, and the batch at index ``fail_at`` raises.
+    """
+
+    def __init__(self, existing=(), fail_at: int | None = None):
+        self.existing = set(existing)
+        self.fail_at = fail_at
+        self.batches: list[tuple[str, list[dict]]] = []
+
+    def session(self, **kwargs) -> "FakeSession":
+        return self
+
+    def __enter__(self) -> "FakeSession":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        return None
+
+    def run(self, query: str, rows: list[dict]) -> FakeResult:
+        if len(self.batches) == self.fail_at:
+            raise RuntimeError("transaction failed")
+        self.batches.append((query, rows))
+        if query == MERGE_NODES:
+            created = [r for r in rows if r["id"] not in self.existing]
+            self.existing.update(r["id"] for r in created)
+            return FakeResult(
+                [{"id": r["id"]} for r in created],
+                nodes_created=len(created)
+            )
+        return FakeResult([], relationships_created=len(rows))
+
+    def execute_write(self, func, *args):
+        return func(self, *args)
+
+
+NODES = {f"Entity{i}": f"e{i}" for i in range(5)}
+RELATIONSHIPS = [
+    {"source": "e0", "target": f"e{i}", "type": "RELATED_TO"}
+    for i in range(1, 5)
+]
+
+
+def test_rows_are_split_in_batches_of_the_batch_size(monkeypatch):
+    monkeypatch.setattr(settings, "NEO4J_WRITE_BATCH_SIZE", 2)
+    driver = FakeSession()
+    stats = write_graph(driver, NODES, RELATIONSHIPS)
+    assert [(q, len(rows)) for q, rows in driver.batches] == [
+        (MERGE_NODES, 2),
+        (MERGE_NODES, 2),
+        (MERGE_NODES, 1),
+        (MERGE_RELATIONSHIPS, 2),
+        (MERGE_RELATIONSHIPS, 2),
+    ]
+    assert [r["id"] for _, rows in driver.batches[:3] for r in rows] == (
+        list(NODES.values())
+    )
+    assert stats["transactions"] == 5
+    assert stats["nodes"] == 5
+    assert stats["relationships"] == 4
+
+    driver = FakeSession()
+    write_graph(driver, NODES, RELATIONSHIPS, batch_size=10)
+    assert len(driver.batches) == 2
+
+
+def test_only_created_entities_reach_written_entities():
+    driver = FakeSession(existing={"e1", "e3"})
+    kgrag = with_batched_graph_writes(
+        type("KGrag", (), {"neo4j_driver": driver})()
+    )
+    token = written_entities.set([])
+    try:
+        kgrag.ingest_to_neo4j(NODES, RELATIONSHIPS)
+        assert written_entities.get() == ["e0", "e2", "e4"]
+    finally:
+        written_entities.reset(token)
+
+
+def test_created_ids_are_recorded_as_their_batch_commits():
+    driver = FakeSession(fail_at=2)
+    created: list[str] = []
+    with pytest.raises(RuntimeError):
+        write_graph(driver, NODES, [], batch_size=2, created=created)
+    assert created == ["e0", "e1", "e2", "e3"]
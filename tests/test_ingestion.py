@@ -0,0 +1,141 @@
+import asyncio
+from conftest import collect, points
+from ingestion import ingest_file
+
+BOILERPLATE = (
+    "# Notice\n\n"
+    "Alice Smith approved this report for Acme Corp.\n\n"
+)
+
+
+def write(path, body: str) -> str:
+    path.write_text(BOILERPLATE + body)
+    return str(path)
+
+
+def test_purge_keeps_chunks_shared_with_other_documents(
+    tmp_path, kgrag, manifest
+):
+    first = write(tmp_path / "first.md", "# Sales\n\nBob Jones sold Rome.\n")
+    second = write(
+        tmp_path / "second.md",
+        "# Costs\n\nCarol White paid Paris.\n"
+    )
+
+    async def scenario():
+        await collect(ingest_file(kgrag, first, manifest))
+        await collect(ingest_file(kgrag, second, manifest))
+        shared = (await manifest.get(second))["chunks"][0]
+        kept = {p.payload["id"] for p in points(kgrag, document=second)}
+
+        # The first document drops the shared chunk, then is forced
+        with open(first, "w") as f:
+            f.write("# Sales\n\nBob Jones sold Oslo.\n")
+        await collect(ingest_file(kgrag, first, manifest))
+        await collect(ingest_file(kgrag, first, manifest, force=True))
+        return shared, kept
+
+    shared, kept = asyncio.run(scenario())
+    assert points(kgrag, document=second, chunk_hash=shared)
+    assert not points(kgrag, document=first, chunk_hash=shared)
+    assert kept == {p.payload["id"] for p in points(kgrag, document=second)}
+    assert kept <= set(kgrag.neo4j_driver.graph.nodes)
+
+
+def test_purge_matches_points_written_without_document(kgrag):
+    from qdrant_client import models
+    from ingestion import purge_chunks
+
+    async def scenario():
+        await kgrag.create_collection_async(
+            kgrag.collection_name,
+            kgrag.collection_dim
+        )
+        kgrag.qdrant_client.upsert(kgrag.collection_name, points=[
+            models.PointStruct(
+                id=i,
+                vector=kgrag.embed_query(path),
+                payload={"id": f"e{i}", "chunk_hash": "c", **payload}
+            )
+            for i, (path, payload) in enumerate([
+                ("/a.md", {"local_path": "/a.md"}),
+                ("/b.md", {"local_path": "/b.md"}),
+                ("/c.md", {"local_path": "/a.md", "document": "/c.md"}),
+            ])
+        ])
+        return await purge_chunks(kgrag, ["c"], "/a.md")
+
+    assert asyncio.run(scenario()) == 1
+    assert sorted(p.payload["id"] for p in points(kgrag)) == ["e1", "e2"]
+
+
+def test_ingest_file_streams_chunks_from_a_spill_file(
+    tmp_path, kgrag, manifest, monkeypatch
+):
+    import tempfile
+    spills = tmp_path / "spills"
+    spills.mkdir()
+    monkeypatch.setattr(tempfile, "tempdir", str(spills))
+    path = write(
+        tmp_path / "report.md",
+        "".join(f"# Part {i}\n\nBob Jones sold Rome.\n\n" for i in range(5))
+    )
+
+    messages = asyncio.run(collect(ingest_file(kgrag, path, manifest)))
+
+    chunks = asyncio.run(manifest.get(path))["chunks"]
+    assert "Ingesting 6/6 changed chunks" in messages
+    assert {p.payload["chunk_hash"] for p in points(kgrag)} == set(chunks)
+    assert not list(spills.iterdir())
+
+
+def with_stable_ids(kgrag):
+    """
+    Derive entity ids from names, so that documents share entities.
+    """
+    extract = kgrag.extract_graph_components
+
+    async def extract_graph_components(raw_data):
+        nodes, relationships = await extract(raw_data)
+        ids = {i: f"id-{name}" for name, i in nodes.items()}
+        return (
+            {name: ids[i] for name, i in nodes.items()},
+            [
+                {**r, "source": ids[r["source"]], "target": ids[r["target"]]}
+                for r in relationships
+            ]
+        )
+
+    kgrag.extract_graph_components = extract_graph_components
+    return kgrag
+
+
+def test_resume_after_graph_write_keeps_existing_entities(
+    tmp_path, kgrag, manifest
+):
+    graph = with_stable_ids(kgrag).neo4j_driver.graph
+    first = str(tmp_path / "first.md")
+    second = str(tmp_path / "second.md")
+    with open(first, "w") as f:
+        f.write("# Sales\n\nAlice sold Rome.\n")
+    with open(second, "w") as f:
+        f.write("# Visits\n\nAlice met Carol.\n")
+
+    async def scenario():
+        await collect(ingest_file(kgrag, first, manifest))
+        # Stop between the graph write and the vector upsert
+        steps = ingest_file(kgrag, second, manifest)
+        async for step in steps:
+            if step.startswith("Vectorizing"):
+                break
+        await steps.aclose()
+        checkpoint = (await manifest.get(second))["checkpoint"]
+        await collect(ingest_file(kgrag, second, manifest))
+        return checkpoint
+
+    checkpoint = asyncio.run(scenario())
+    assert checkpoint["entities"] == ["id-Carol"]
+    assert ("RELATED_TO", "id-Rome") in graph.edges["id-Alice"]
+    assert ("RELATED_TO", "id-Carol") in graph.edges["id-Alice"]
+    assert points(kgrag, document=first) and points(kgrag, document=second)
+    assert not points(kgrag, document=second, id="id-Rome")
@@ -0,0 +1,73 @@
+import asyncio
+import fakeredis
+from jobs import JobQueue
+from kgrag_config import redis_config
+
+
+def make_queue(handler=None) -> JobQueue:
+    queue = JobQueue(redis_config, handler or (lambda params: None))
+    queue.redis = fakeredis.aioredis.FakeRedis(decode_responses=True)
+    return queue
+
+
+async def ingest_three(params):
+    for index, path in enumerate(("a", "b", "c"), start=1):
+        yield {
+            "status": "done",
+            "path": path,
+            "index": index,
+            "total": 3,
+            "message": "",
+        }
+
+
+def test_resumed_job_counts_progress_again():
+    queue = make_queue(ingest_three)
+
+    async def scenario():
+        job = await queue.get(await queue.submit("ingestion", {}))
+        await queue._run(job)
+        # Resumed after a lease expiry: the files are reported again
+        job["status"] = "queued"
+        await queue._run(job)
+        return await queue.get(job["id"])
+
+    job = asyncio.run(scenario())
+    assert job["status"] == "done"
+    assert job["progress"] == {
+        "total": 3,
+        "completed": 3,
+        "skipped": 0,
+        "failed": 0,
+    }
+
+
+def test_recover_requeues_jobs_left_behind():
+    queue = make_queue()
+
+    async def scenario():
+        leased, orphan, queued = [
+            await queue.submit("ingestion", {}) for _ in range(3)
+        ]
+        await queue.redis.delete(queue._queue_key)
+        for job_id in (leased, orphan):
+            job = await queue.get(job_id)
+            job["status"] = "running"
+            await queue._save(job)
+        await queue.redis.set(queue._lease_key(leased), "other", ex=30)
+
+        await queue.recover()
+        return (
+            await queue.redis.lrange(queue._queue_key, 0, -1),
+            (await queue.get(orphan))["status"],
+            (await queue.get(leased))["status"],
+            queued,
+            orphan,
+        )
+
+    in_queue, orphan_status, leased_status, queued, orphan = asyncio.run(
+        scenario()
+    )
+    assert sorted(in_queue) == sorted([orphan, queued])
+    assert orphan_status == "queued"
+    assert leased_status == "running"
@@ -0,0 +1,30 @@
+import json
+import pytest
+from loaders import is_supported, iter_documents
+
+
+def test_json_array_items_become_documents(tmp_path):
+    path = tmp_path / "records.json"
+    path.write_text(json.dumps(["plain text", {"name": "Alice"}]))
+
+    docs = list(iter_documents(str(path), 4000))
+
+    assert [d.page_content for d in docs] == [
+        "plain text",
+        '{"name": "Alice"}',
+    ]
+    assert [d.metadata["seq_num"] for d in docs] == [1, 2]
+    assert docs[0].metadata["object_name"] == "records.json"
+
+
+def test_jsonl_is_streamed_by_line(tmp_path):
+    path = tmp_path / "records.jsonl"
+    path.write_text('{"name": "Alice"}\n\n{"name": "Bob"}\n{broken\n')
+    assert is_supported(str(path))
+
+    docs = iter_documents(str(path), 4000)
+
+    assert next(docs).page_content == '{"name": "Alice"}'
+    assert next(docs).metadata["seq_num"] == 2
+    with pytest.raises(ValueError, match="line 4"):
+        next(docs)
@@ -0,0 +1,35 @@
+import asyncio
+from conftest import collect
+from config import settings
+from ingestion import ingest_file
+from retrieval import estimate_tokens, retrieve
+
+
+def ingest(kgrag, tmp_path, body: str) -> None:
+    path = tmp_path / "report.md"
+    path.write_text(body)
+    asyncio.run(collect(ingest_file(kgrag, str(path))))
+
+
+def test_retrieve_returns_chunk_excerpts(tmp_path, kgrag, monkeypatch):
+    monkeypatch.setattr(settings, "RETRIEVE_EXCERPT_CHARS", 40)
+    text = "Alice Smith sold Rome to Bob Jones for the Acme Corp."
+    ingest(kgrag, tmp_path, f"# Sales\n\n{text}\n")
+
+    result = asyncio.run(retrieve(kgrag, "Alice Smith", 1, 2000, 0))
+
+    [chunk] = result["chunks"]
+    assert chunk["text"] == f"Sales\n\n{text}"[:40]
+    assert "text" not in chunk["source"]
+    assert result["tokens"] == estimate_tokens(chunk)
+
+
+def test_retrieve_counts_excerpts_against_the_budget(tmp_path, kgrag):
+    ingest(kgrag, tmp_path, "# Sales\n\nAlice Smith sold Rome. " * 40)
+
+    full = asyncio.run(retrieve(kgrag, "Alice Smith", 1, 10000, 0))
+    cost = estimate_tokens(full["chunks"][0])
+    cut = asyncio.run(retrieve(kgrag, "Alice Smith", 1, cost - 1, 0))
+
+    assert cost > estimate_tokens({"text": ""}) + 200
+    assert cut["chunks"] == [] and cut["truncated"]
@@ -0,0 +1,99 @@
+import asyncio
+import os
+import pytest
+import s3
+from moto import mock_aws
+from conftest import collect
+from config import settings
+from ingestion import ingest_paths
+
+BUCKET = "kgrag-test"
+KEYS = (
+    "docs/a.md",
+    "docs/b.md",
+    "docs/old/c.md",
+    "docs/old/2020/d.md",
+    "other/e.md",
+)
+
+
+@pytest.fixture
+def bucket(tmp_path, monkeypatch):
+    """
+    A moto bucket holding ``KEYS``, downloaded under ``tmp_path``.
+    """
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "test")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "test")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    monkeypatch.setattr(settings, "PATH_DOWNLOAD", str(tmp_path))
+    monkeypatch.setattr(s3, "_client", None)
+    with mock_aws():
+        client = s3.get_client()
+        client.create_bucket(Bucket=BUCKET)
+        for key in KEYS:
+            name = os.path.basename(key).split(".")[0].title()
+            client.put_object(
+                Bucket=BUCKET,
+                Key=key,
+                Body=f"# {name}\n\n{name} Smith sold Rome.\n".encode()
+            )
+        yield client
+    monkeypatch.setattr(s3, "_client", None)
+
+
+def listed(uri: str) -> list[str]:
+    return [obj.key for obj in s3.list_objects(uri, lambda key: True)]
+
+
+def test_list_objects_matches_globs_by_segment(bucket):
+    assert listed(f"s3://{BUCKET}/docs/*.md") == ["docs/a.md", "docs/b.md"]
+    assert listed(f"s3://{BUCKET}/docs/**/*.md") == [
+        "docs/a.md",
+        "docs/b.md",
+        "docs/old/2020/d.md",
+        "docs/old/c.md",
+    ]
+    assert listed(f"s3://{BUCKET}/*/?.md") == [
+        "docs/a.md",
+        "docs/b.md",
+        "other/e.md",
+    ]
+    assert listed(f"s3://{BUCKET}/docs/old/") == [
+        "docs/old/2020/d.md",
+        "docs/old/c.md",
+    ]
+    assert listed(f"s3://{BUCKET}/docs/a.md") == ["docs/a.md"]
+
+
+def test_local_path_rejects_keys_outside_the_download_directory(bucket):
+    obj = s3.S3Object(BUCKET, "docs/../../../escape.md", 1, "etag")
+    with pytest.raises(ValueError):
+        obj.local_path
+    assert s3.S3Object(BUCKET, "docs/a.md", 1, "etag").local_path.startswith(
+        settings.PATH_DOWNLOAD
+    )
+
+
+def test_ingest_paths_skips_unchanged_objects_and_removes_downloads(
+    bucket, kgrag, manifest, monkeypatch
+):
+    downloaded = []
+
+    def download(obj):
+        downloaded.append(obj.key)
+        return s3.download_object(obj)
+
+    monkeypatch.setattr("ingestion.download_object", download)
+    objects = s3.list_objects(f"s3://{BUCKET}/docs/**", lambda key: True)
+
+    async def scenario():
+        first = await collect(ingest_paths(kgrag, objects, 2, manifest))
+        second = await collect(ingest_paths(kgrag, objects, 2, manifest))
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    done = sorted(e["path"] for e in first if e["status"] == "done")
+    assert done == sorted(obj.uri for obj in objects)
+    assert {e["status"] for e in second} == {"skipped"}
+    assert sorted(downloaded) == sorted(obj.key for obj in objects)
+    assert not [obj for obj in objects if os.path.exists(obj.local_path)]
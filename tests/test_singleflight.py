@@ -0,0 +1,86 @@
+import asyncio
+import pytest
+from singleflight import SingleFlight
+
+
+def within(aw, seconds: float = 1.0):
+    """
+    Bound a wait, so that a lost wake-up fails the test instead of
+    hanging it.
+    """
+    return asyncio.wait_for(aw, seconds)
+
+
+async def settle() -> None:
+    """
+    Let the tasks scheduled so far run until they block.
+    """
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_concurrent_identical_calls_run_once():
+    async def scenario():
+        flight = SingleFlight()
+        release = asyncio.Event()
+        runs = []
+
+        async def compute():
+            runs.append(1)
+            await release.wait()
+            return "answer"
+
+        callers = [
+            asyncio.create_task(flight.do(("query", "q"), compute))
+            for _ in range(5)
+        ]
+        await settle()
+        assert flight.in_flight() == 1
+        assert flight.waiters(("query", "q")) == 5
+        release.set()
+        results = await within(asyncio.gather(*callers))
+        assert results == ["answer"] * 5
+        assert runs == [1]
+        assert flight.in_flight() == 0
+
+    asyncio.run(scenario())
+
+
+def test_shared_task_is_cancelled_only_with_the_last_waiter():
+    async def scenario():
+        flight = SingleFlight()
+        release = asyncio.Event()
+        cancelled = asyncio.Event()
+        key = ("query", "q")
+
+        async def compute():
+            try:
+                await release.wait()
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+            return "answer"
+
+        first = asyncio.create_task(flight.do(key, compute))
+        second = asyncio.create_task(flight.do(key, compute))
+        await settle()
+        first.cancel()
+        await settle()
+        assert first.cancelled()
+        assert not cancelled.is_set()
+        assert flight.waiters(key) == 1
+        release.set()
+        assert await within(second) == "answer"
+
+        release.clear()
+        third = asyncio.create_task(flight.do(key, compute))
+        fourth = asyncio.create_task(flight.do(key, compute))
+        await settle()
+        third.cancel()
+        fourth.cancel()
+        await within(cancelled.wait())
+        with pytest.raises(asyncio.CancelledError):
+            await fourth
+        assert flight.in_flight() == 0
+
+    asyncio.run(scenario())
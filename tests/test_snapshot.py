@@ -0,0 +1,204 @@
+import asyncio
+import io
+import json
+import tarfile
+import pytest
+import snapshot
+from qdrant_client import models
+from benchmarks.fakes import BenchKGrag
+from conftest import collect, points
+from config import settings
+from graph_writer import with_batched_graph_writes
+from ingestion import ingest_file
+from parsing import hash_file
+
+DOCUMENTS = {
+    "sales.md": "# Sales\n\nAlice Smith sold Rome to Bob Jones.\n",
+    "costs.md": "# Costs\n\nCarol White paid Paris and Oslo.\n",
+}
+
+
+@pytest.fixture
+def qdrant_files(monkeypatch):
+    """
+    Stand in for the Qdrant snapshot endpoints: a collection snapshot is
+    the JSON of its points. The KGrag instance to read or restore is set
+    in the returned dictionary under ``kgrag``.
+    """
+    current = {}
+
+    def download(collection_name, path):
+        kgrag = current["kgrag"]
+        found, _ = kgrag.qdrant_client.scroll(
+            collection_name,
+            limit=10000,
+            with_payload=True,
+            with_vectors=True
+        )
+        with open(path, "w") as f:
+            json.dump(
+                [[str(p.id), p.vector, p.payload] for p in found],
+                f
+            )
+
+    def upload(collection_name, path):
+        kgrag = current["kgrag"]
+        with open(path) as f:
+            rows = json.load(f)
+        asyncio.run(kgrag.create_collection_async(
+            collection_name,
+            kgrag.collection_dim
+        ))
+        kgrag.qdrant_client.upsert(collection_name, points=[
+            models.PointStruct(id=id_, vector=vector, payload=payload)
+            for id_, vector, payload in rows
+        ])
+
+    monkeypatch.setattr(snapshot, "_download_collection", download)
+    monkeypatch.setattr(snapshot, "_upload_collection", upload)
+    return current
+
+
+@pytest.fixture
+def bundle(tmp_path, kgrag, manifest, qdrant_files):
+    """
+    A bundle exported from the ingestion of ``DOCUMENTS``.
+    """
+    qdrant_files["kgrag"] = kgrag
+
+    async def scenario():
+        for name, body in DOCUMENTS.items():
+            path = tmp_path / name
+            path.write_text(body)
+            await collect(ingest_file(kgrag, str(path), manifest))
+        return await snapshot.export_snapshot(
+            kgrag,
+            manifest,
+            str(tmp_path / "snapshots")
+        )
+
+    return asyncio.run(scenario())
+
+
+def rewrite(path: str, name: str, data: bytes) -> None:
+    """
+    Replace one member of a bundle, keeping the others.
+    """
+    with tarfile.open(path) as tar:
+        members = {
+            m.name: tar.extractfile(m).read() for m in tar.getmembers()
+        }
+    members[name] = data
+    with tarfile.open(path, "w") as tar:
+        for member, content in members.items():
+            info = tarfile.TarInfo(member)
+            info.size = len(content)
+            tar.addfile(info, io.BytesIO(content))
+
+
+def test_export_describes_the_bundle(tmp_path, kgrag, bundle):
+    graph = kgrag.neo4j_driver.graph
+    assert bundle["format"] == snapshot.FORMAT_VERSION
+    assert bundle["embedding_model"] == settings.MODEL_EMBEDDING
+    assert bundle["counts"] == {
+        "points": len(points(kgrag)),
+        "nodes": len(graph.nodes),
+        "relationships": len(graph.relationships),
+        "documents": len(DOCUMENTS),
+    }
+    work = tmp_path / "work"
+    work.mkdir()
+    with tarfile.open(bundle["path"]) as tar:
+        tar.extractall(work, filter="data")
+    assert sorted(bundle["sha256"]) == sorted(snapshot.BUNDLE_FILES)
+    for name, checksum in bundle["sha256"].items():
+        assert hash_file(str(work / name)) == checksum
+
+
+def test_import_restores_an_empty_knowledge_base(
+    kgrag, manifest, bundle, qdrant_files
+):
+    target = with_batched_graph_writes(BenchKGrag())
+    qdrant_files["kgrag"] = target
+
+    async def scenario():
+        await manifest.clear()
+        return await snapshot.import_snapshot(
+            target,
+            manifest,
+            bundle["path"]
+        )
+
+    restored = asyncio.run(scenario())
+    assert restored["counts"] == bundle["counts"]
+    assert target.neo4j_driver.graph.nodes == kgrag.neo4j_driver.graph.nodes
+    assert sorted(target.neo4j_driver.graph.relationships) == sorted(
+        kgrag.neo4j_driver.graph.relationships
+    )
+    assert sorted(p.payload["id"] for p in points(target)) == sorted(
+        p.payload["id"] for p in points(kgrag)
+    )
+
+
+def test_import_rejects_a_tampered_member(
+    manifest, bundle, qdrant_files
+):
+    rewrite(bundle["path"], snapshot.NODES_FILE, b"tampered")
+    target = BenchKGrag()
+    qdrant_files["kgrag"] = target
+    with pytest.raises(ValueError, match="Checksum mismatch"):
+        asyncio.run(snapshot.import_snapshot(target, manifest, bundle["path"]))
+    assert not target.neo4j_driver.graph.nodes
+
+
+def test_import_rejects_another_format_version(manifest, bundle):
+    descriptor = {k: v for k, v in bundle.items() if k != "path"}
+    descriptor["format"] = snapshot.FORMAT_VERSION + 1
+    rewrite(
+        bundle["path"],
+        snapshot.DESCRIPTOR,
+        json.dumps(descriptor).encode()
+    )
+    with pytest.raises(ValueError, match="Unsupported snapshot format"):
+        asyncio.run(
+            snapshot.import_snapshot(BenchKGrag(), manifest, bundle["path"])
+        )
+
+
+def test_import_checks_the_embedding_model(
+    manifest, bundle, qdrant_files, monkeypatch
+):
+    monkeypatch.setattr(settings, "MODEL_EMBEDDING", "another-model")
+    target = BenchKGrag()
+    qdrant_files["kgrag"] = target
+    with pytest.raises(ValueError, match="embedded with"):
+        asyncio.run(snapshot.import_snapshot(target, manifest, bundle["path"]))
+
+    async def forced():
+        await manifest.clear()
+        return await snapshot.import_snapshot(
+            target,
+            manifest,
+            bundle["path"],
+            force=True
+        )
+
+    assert asyncio.run(forced())["counts"] == bundle["counts"]
+
+
+def test_import_into_a_non_empty_knowledge_base_needs_replace(
+    kgrag, manifest, bundle
+):
+    nodes = dict(kgrag.neo4j_driver.graph.nodes)
+    with pytest.raises(RuntimeError, match="not empty"):
+        asyncio.run(snapshot.import_snapshot(kgrag, manifest, bundle["path"]))
+    assert kgrag.neo4j_driver.graph.nodes == nodes
+
+    restored = asyncio.run(snapshot.import_snapshot(
+        kgrag,
+        manifest,
+        bundle["path"],
+        replace=True
+    ))
+    assert restored["counts"] == bundle["counts"]
+    assert kgrag.neo4j_driver.graph.nodes == nodes
@@ -0,0 +1,29 @@
+import config
+
+
+def test_settings_neither_log_nor_create_directories(monkeypatch):
+    calls = []
+    monkeypatch.setattr(
+        config.os,
+        "makedirs",
+        lambda *args, **kwargs: calls.append(("makedirs", args))
+    )
+    monkeypatch.setattr(
+        config.logger,
+        "info",
+        lambda *args, **kwargs: calls.append(("info", args))
+    )
+
+    config.Settings()
+
+    assert calls == []
+
+
+def test_profile_startup_times_phases_to_healthz(monkeypatch, capsys):
+    import server
+    monkeypatch.setattr(server.settings, "STARTUP_BUDGET_SECONDS", 60)
+
+    assert server.profile_startup() == 0
+    out = capsys.readouterr().out
+    for phase in ("settings", "server", "lifespan", "total"):
+        assert f"{phase}:" in out
@@ -0,0 +1,21 @@
+import json
+import pytest
+from tracing import JsonlExporter, Span, SpanExporter
+
+
+def test_span_exporter_requires_write():
+    class Incomplete(SpanExporter):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_jsonl_exporter_writes_queued_spans_on_close(tmp_path):
+    path = tmp_path / "spans.jsonl"
+    exporter = JsonlExporter(str(path), flush_interval=60)
+    exporter.export(Span("ingest_file", "0" * 32, attributes={"n": 1}))
+    exporter.close()
+
+    [line] = path.read_text().splitlines()
+    assert json.loads(line)["name"] == "ingest_file"
@@ -0,0 +1,397 @@
+"""Request tracing.
+
+A call of an MCP tool, or a background job, opens a trace and every
+``metrics.stage`` run on its behalf opens a child span, so that the stage
+that made one request slow can be read from its trace instead of guessed
+from the histograms of ``/metrics``. The current span follows the request
+through asyncio tasks and ``asyncio.to_thread`` in a context variable, and
+carries attributes such as chunk, token and batch counts.
+
+Whether a trace is recorded is decided when it starts (head sampling with
+``TRACE_SAMPLE_RATIO``), so a trace is either complete or absent. Finished
+spans are exported in batches from a background thread to a JSONL file or
+to an OTLP collector over HTTP (``TRACE_EXPORTER``), and the log records
+emitted within a trace carry its id (see ``TraceLogFilter``).
+"""
+
+import abc
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Iterator
+import requests
+from config import settings
+from log import logger
+
+SERVICE_NAME = "kgrag-mcp-server"
+
+# OTLP span kinds and status codes
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+
+class Span:
+    """
+    A timed operation of a trace.
+    """
+
+    __slots__ = (
+        "name",
+        "trace_id",
+        "span_id",
+        "parent_id",
+        "attributes",
+        "start_ns",
+        "end_ns",
+        "error",
+        "recording",
+    )
+
+    def __init__(
+        self,
+        name: str,
+        trace_id: str,
+        parent_id: str | None = None,
+        attributes: dict[str, Any] | None = None,
+        recording: bool = True
+    ):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.attributes = dict(attributes or {})
+        self.start_ns = time.time_ns()
+        self.end_ns: int | None = None
+        self.error: str | None = None
+        self.recording = recording
+
+    def set_attributes(self, **attributes: Any) -> None:
+        """
+        Add attributes to the span; ignored if it is not recorded.
+        """
+        if self.recording:
+            self.attributes.update(attributes)
+
+    def to_dict(self) -> dict[str, Any]:
+        """
+        Returns:
+            dict: The span as a line of the JSONL export.
+        """
+        end_ns = self.end_ns or time.time_ns()
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start_ns / 1e9,
+            "duration_ms": round((end_ns - self.start_ns) / 1e6, 3),
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+    def to_otlp(self) -> dict[str, Any]:
+        """
+        Returns:
+            dict: The span in the OTLP/HTTP JSON encoding.
+        """
+        span: dict[str, Any] = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": (
+                SPAN_KIND_INTERNAL if self.parent_id else SPAN_KIND_SERVER
+            ),
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns or time.time_ns()),
+            "attributes": [
+                {"key": key, "value": _otlp_value(value)}
+                for key, value in self.attributes.items()
+            ],
+            "status": (
+                {"code": STATUS_ERROR, "message": self.error}
+                if self.error else {"code": STATUS_OK}
+            ),
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+def _otlp_value(value: Any) -> dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+# Current span of the context; traces that are not sampled hold this
+# span, so that their stages are not recorded either
+NOT_RECORDED = Span("not_recorded", "", recording=False)
+_current: ContextVar[Span | None] = ContextVar("kgrag_span", default=None)
+
+
+class SpanExporter(abc.ABC):
+    """
+    Export finished spans in batches from a background thread.
+
+    ``export`` never blocks: spans go to a bounded queue and are dropped
+    when it is full. Subclasses implement ``write``.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = 512,
+        flush_interval: float = 2.0,
+        queue_size: int = 10000
+    ):
+        """
+        Args:
+            batch_size (int): Maximum number of spans of a write.
+            flush_interval (float): Maximum delay before a write, in
+                seconds.
+            queue_size (int): Maximum number of queued spans.
+        """
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.dropped = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run,
+            name="span-exporter",
+            daemon=True
+        )
+        self._thread.start()
+
+    def export(self, span: Span) -> None:
+        try:
+            self.queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+
+    @abc.abstractmethod
+    def write(self, spans: list[Span]) -> None:
+        """
+        Write a batch of spans, from the exporter thread.
+        Args:
+            spans (list[Span]): The finished spans.
+        """
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._flush(wait=True)
+        # Write what is left, without waiting for more spans
+        while not self.queue.empty():
+            self._flush(wait=False)
+
+    def _flush(self, wait: bool) -> None:
+        batch: list[Span] = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if wait and remaining > 0 and not self._stop.is_set():
+                    batch.append(self.queue.get(timeout=min(remaining, 0.5)))
+                else:
+                    batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                if not wait or remaining <= 0 or self._stop.is_set():
+                    break
+        if not batch:
+            return
+        try:
+            self.write(batch)
+        except Exception as e:
+            logger.warning(f"Unable to export {len(batch)} spans: {e}")
+
+    def close(self, timeout: float = 5.0) -> None:
+        """
+        Stop the exporter after writing the queued spans.
+        """
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join(timeout)
+        if self.dropped:
+            logger.warning(f"{self.dropped} spans dropped by the exporter")
+
+
+class JsonlExporter(SpanExporter):
+    """
+    Append spans to a file, one JSON object per line.
+    """
+
+    def __init__(self, path: str, **kwargs: Any):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        super().__init__(**kwargs)
+
+    def write(self, spans: list[Span]) -> None:
+        with open(self.path, "a", encoding="utf-8") as f:
+            for span in spans:
+                f.write(json.dumps(span.to_dict(), default=str) + "\n")
+
+
+class OtlpExporter(SpanExporter):
+    """
+    Send spans to an OpenTelemetry collector with OTLP/HTTP in the JSON
+    encoding.
+    """
+
+    def __init__(self, endpoint: str, timeout: float = 5.0, **kwargs: Any):
+        self.endpoint = endpoint
+        self.timeout = timeout
+        self.session = requests.Session()
+        super().__init__(**kwargs)
+
+    def write(self, spans: list[Span]) -> None:
+        payload = {
+            "resourceSpans": [{
+                "resource": {
+                    "attributes": [{
+                        "key": "service.name",
+                        "value": {"stringValue": SERVICE_NAME},
+                    }],
+                },
+                "scopeSpans": [{
+                    "scope": {"name": "kgrag"},
+                    "spans": [span.to_otlp() for span in spans],
+                }],
+            }],
+        }
+        response = self.session.post(
+            self.endpoint,
+            json=payload,
+            timeout=self.timeout
+        )
+        response.raise_for_status()
+
+
+_exporter: SpanExporter | None = None
+
+
+def start_tracing() -> None:
+    """
+    Start exporting spans as configured by ``TRACE_EXPORTER``; tracing
+    stays disabled with ``none``.
+    Raises:
+        ValueError: If the exporter is unknown.
+    """
+    global _exporter
+    if _exporter is not None:
+        return
+    exporter = settings.TRACE_EXPORTER
+    if exporter == "none":
+        return
+    if exporter == "jsonl":
+        _exporter = JsonlExporter(settings.TRACE_FILE)
+    elif exporter == "otlp":
+        _exporter = OtlpExporter(settings.TRACE_OTLP_ENDPOINT)
+    else:
+        raise ValueError(f"Unknown trace exporter: {exporter}")
+    logger.info(
+        f"Tracing to {exporter}, "
+        f"sample ratio {settings.TRACE_SAMPLE_RATIO}"
+    )
+
+
+def stop_tracing() -> None:
+    """
+    Write the pending spans and stop the exporter.
+    """
+    global _exporter
+    if _exporter is not None:
+        _exporter.close()
+        _exporter = None
+
+
+def current_span() -> Span:
+    """
+    Returns:
+        Span: The current span, ``NOT_RECORDED`` outside a recorded
+            trace.
+    """
+    return _current.get() or NOT_RECORDED
+
+
+@contextmanager
+def span(name: str, root: bool = False, **attributes: Any) -> Iterator[Span]:
+    """
+    Trace a block as a span of the current trace.
+    Args:
+        name (str): The span name.
+        root (bool): Start a trace if there is none, as MCP tools and
+            jobs do; otherwise the block is only traced within one.
+        **attributes: Attributes of the span.
+    Yields:
+        Span: The span, ``NOT_RECORDED`` if the trace is not recorded.
+    """
+    parent = _current.get()
+    if parent is None:
+        if not root or _exporter is None:
+            yield NOT_RECORDED
+            return
+        if random.random() < settings.TRACE_SAMPLE_RATIO:
+            current = Span(name, os.urandom(16).hex(), None, attributes)
+        else:
+            current = NOT_RECORDED
+    elif not parent.recording:
+        yield parent
+        return
+    else:
+        current = Span(name, parent.trace_id, parent.span_id, attributes)
+
+    token = _current.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        if current.recording:
+            current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        try:
+            _current.reset(token)
+        except ValueError:
+            # Closed from another context, e.g. an async generator
+            # finalized by the event loop
+            pass
+        if current.recording and _exporter is not None:
+            current.end_ns = time.time_ns()
+            _exporter.export(current)
+
+
+class TraceLogFilter(logging.Filter):
+    """
+    Add the id of the current trace to log records as ``trace_id``, and
+    as ``thread_id`` when the record has none, so that the logs of a
+    request can be found from its trace in Loki.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        current = _current.get()
+        if current is not None and current.recording:
+            record.trace_id = current.trace_id
+            if not hasattr(record, "thread_id"):
+                record.thread_id = current.trace_id
+        return True
+
+
+def correlate_logs(target: logging.Logger) -> None:
+    """
+    Tag the records of a logger with the current trace.
+    Args:
+        target (logging.Logger): The logger.
+    """
+    if not any(isinstance(f, TraceLogFilter) for f in target.filters):
+        target.addFilter(TraceLogFilter())
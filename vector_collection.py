@@ -0,0 +1,205 @@
+"""Qdrant collection tuning.
+
+``memory_agent`` creates the collection with a fixed size and no index or
+storage options. The server creates it first, with the vector size of the
+embedding model actually configured, optional scalar or binary
+quantization, on-disk vectors and payloads and the HNSW parameters of the
+settings, and applies the search parameters (``ef``, rescoring) to every
+query of the KGrag Qdrant clients.
+"""
+
+import functools
+import inspect
+from typing import Any
+from qdrant_client.http import models
+from config import settings
+from log import logger
+
+QUANTIZATION_TYPES = ("none", "scalar", "binary")
+
+
+def quantization_config() -> models.QuantizationConfig | None:
+    """
+    Build the quantization of the collection from the settings.
+    Returns:
+        QuantizationConfig | None: The quantization, None if disabled.
+    Raises:
+        RuntimeError: If ``COLLECTION_QUANTIZATION`` is not supported.
+    """
+    kind = settings.COLLECTION_QUANTIZATION
+    always_ram = settings.COLLECTION_QUANTIZATION_ALWAYS_RAM
+    if kind == "scalar":
+        return models.ScalarQuantization(
+            scalar=models.ScalarQuantizationConfig(
+                type=models.ScalarType.INT8,
+                quantile=0.99,
+                always_ram=always_ram
+            )
+        )
+    if kind == "binary":
+        return models.BinaryQuantization(
+            binary=models.BinaryQuantizationConfig(always_ram=always_ram)
+        )
+    if kind != "none":
+        raise RuntimeError(
+            "Unsupported COLLECTION_QUANTIZATION: "
+            + f"{kind!r}. Expected one of {', '.join(QUANTIZATION_TYPES)}."
+        )
+    return None
+
+
+def collection_params(size: int) -> dict[str, Any]:
+    """
+    Build the parameters of ``create_collection`` from the settings.
+    Args:
+        size (int): The vector size.
+    Returns:
+        dict: The keyword arguments, without the collection name.
+    """
+    return {
+        "vectors_config": models.VectorParams(
+            size=size,
+            distance=models.Distance(settings.COLLECTION_DISTANCE),
+            on_disk=settings.COLLECTION_ON_DISK
+        ),
+        "hnsw_config": models.HnswConfigDiff(
+            m=settings.COLLECTION_HNSW_M,
+            ef_construct=settings.COLLECTION_HNSW_EF_CONSTRUCT
+        ),
+        "quantization_config": quantization_config(),
+        "on_disk_payload": settings.COLLECTION_ON_DISK_PAYLOAD,
+    }
+
+
+def search_params() -> models.SearchParams | None:
+    """
+    Build the search parameters from the settings.
+    Returns:
+        SearchParams | None: The parameters, None if Qdrant defaults
+            apply.
+    """
+    quantization = None
+    if settings.COLLECTION_QUANTIZATION != "none":
+        quantization = models.QuantizationSearchParams(
+            rescore=settings.COLLECTION_QUANTIZATION_RESCORE,
+            oversampling=settings.COLLECTION_QUANTIZATION_OVERSAMPLING
+        )
+    if not settings.COLLECTION_HNSW_EF and quantization is None:
+        return None
+    return models.SearchParams(
+        hnsw_ef=settings.COLLECTION_HNSW_EF or None,
+        quantization=quantization
+    )
+
+
+def detect_dimension(kgrag: Any) -> int:
+    """
+    Get the vector size: ``COLLECTION_DIMENSION`` if set, otherwise the
+    length of an embedding of the ingestion embedding model.
+    Args:
+        kgrag (Any): The KGrag instance.
+    Returns:
+        int: The vector size.
+    """
+    if settings.COLLECTION_DIMENSION:
+        return settings.COLLECTION_DIMENSION
+    return len(kgrag.model_embedding.embed_query("dimension"))
+
+
+def ensure_collection(
+    client: Any,
+    collection_name: str,
+    params: dict[str, Any]
+) -> bool:
+    """
+    Create the collection if it does not exist. An existing collection is
+    left untouched.
+    Args:
+        client (QdrantClient): The synchronous Qdrant client.
+        collection_name (str): The collection name.
+        params (dict): The parameters built by ``collection_params``.
+    Returns:
+        bool: True if the collection was created.
+    """
+    size = params["vectors_config"].size
+    if client.collection_exists(collection_name):
+        vectors = client.get_collection(collection_name).config.params.vectors
+        existing = getattr(vectors, "size", None)
+        if existing is not None and existing != size:
+            logger.error(
+                f"Collection '{collection_name}' has {existing}-dim vectors "
+                f"but the embedding model produces {size}: recreate it or "
+                "set COLLECTION_NAME to a new collection."
+            )
+        return False
+    client.create_collection(collection_name=collection_name, **params)
+    logger.info(
+        f"Collection '{collection_name}' created: size={size}, "
+        f"quantization={settings.COLLECTION_QUANTIZATION}, "
+        f"on_disk={settings.COLLECTION_ON_DISK}"
+    )
+    return True
+
+
+def _with_search_params(
+    client: Any,
+    attr: str,
+    params: models.SearchParams
+) -> None:
+    """
+    Replace a search method of a Qdrant client with a version that uses
+    ``params`` when the caller passes none.
+    Args:
+        client (Any): The Qdrant client.
+        attr (str): The method name.
+        params (SearchParams): The default search parameters.
+    """
+    func = getattr(client, attr, None)
+    if func is None:
+        return
+
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            kwargs.setdefault("search_params", params)
+            return await func(*args, **kwargs)
+    else:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            kwargs.setdefault("search_params", params)
+            return func(*args, **kwargs)
+
+    setattr(client, attr, wrapper)
+
+
+def configure_collection(kgrag: Any) -> Any:
+    """
+    Size the collection of a KGrag instance after its embedding model,
+    create it with the tuned parameters and apply the search parameters
+    to its Qdrant clients.
+    Args:
+        kgrag (Any): The KGrag instance.
+    Returns:
+        Any: The same instance.
+    Raises:
+        RuntimeError: If ``COLLECTION_QUANTIZATION`` is not supported.
+    """
+    size = detect_dimension(kgrag)
+    params = collection_params(size)
+    kgrag.collection_config["vectors_config"]["size"] = size
+    collection_name = kgrag.collection_config["collection_name"]
+    logger.info(f"Collection '{collection_name}' vector size: {size}")
+
+    try:
+        ensure_collection(kgrag.qdrant_client, collection_name, params)
+    except Exception as e:
+        # The collection is created on the first ingestion otherwise,
+        # with the right size but without the tuned parameters
+        logger.warning(f"Unable to create collection '{collection_name}': {e}")
+
+    defaults = search_params()
+    if defaults is not None:
+        for client in (kgrag.qdrant_client, kgrag.qdrant_client_async):
+            for attr in ("query_points", "search"):
+                _with_search_params(client, attr, defaults)
+    return kgrag